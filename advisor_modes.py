@@ -0,0 +1,363 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from artifact_store import ArtifactStore, make_artifact_key
+from company_index import canonical_company
+from course_extraction import KeyCourseStreamParser, extract_key_courses, request_key_courses
+from industry_chain_store import get_industry_chain_store, with_diagram
+from mermaid_repair import repair_message
+from pdf_extract import compact_text
+from web_prompts import (EXPLORATION_INTERIM_PROMPTS, EXPLORATION_REPORT_PROMPT, DECISION_PROMPT,
+                         COMMUNICATION_ROLE_PROMPT, COMMUNICATION_DEBRIEF_PROMPT, COMPANY_INFO_PROMPT,
+                         PANORAMIC_PROMPT, PANORAMIC_CACHED_CHAIN_PROMPT, CURRICULUM_ANALYSIS_PROMPT, CURRICULUM_PATH_PROMPT,
+                         CURRICULUM_COURSES_PROMPT, EXPLORATION_WELCOME, EXPLORATION_QUESTIONS,
+                         EXPLORATION_ACTION_PROMPT, EXPLORATION_FINAL_MESSAGE, COMMUNICATION_OPENING,
+                         PANORAMIC_PROFILE_FIELDS, format_exploration_answers, format_user_profile)
+
+# --- 無介面的模式流程 ---
+# The six advisor modes as plain state machines over a JSON-serializable
+# session dict, for the HTTP API. They follow the same stages and send the
+# same prompts as the Streamlit pages in web_test.py.
+#
+# start_session(mode, body) returns a new state. take_turn(llm, state, body)
+# validates the input and returns an async iterator of (event, data) pairs:
+# ("token", {"text"}) while the model streams and ("message", {...}) for
+# every finished message. The state is updated in place as the turn runs.
+
+MODES = ("exploration", "panoramic", "decision", "company_info", "communication", "curriculum_analysis")
+
+_artifacts = ArtifactStore()
+
+
+class ModeInputError(ValueError):
+    """The request body does not fit what the session's current stage expects."""
+
+
+def _require(body, *fields):
+    missing = [f for f in fields if not str(body.get(f) or "").strip()]
+    if missing:
+        raise ModeInputError(f"缺少字段: {', '.join(missing)}")
+    return [str(body[f]).strip() for f in fields]
+
+
+def _add(state, role, content):
+    message = {"role": role, "content": content}
+    state["history"].append(message)
+    return "message", message
+
+
+def _lc_messages(history):
+    return [HumanMessage(m["content"]) if m["role"] == "human" else AIMessage(m["content"]) for m in history]
+
+
+async def _ai_turn(state, chain, inputs, parser=None, finish=None):
+    """Streams one model reply as token events and appends it to the history.
+
+    `finish` (blocking, run in a thread) may rewrite the complete reply before it is stored.
+    """
+    parts = []
+    async for chunk in chain.astream(inputs):
+        text = getattr(chunk, "content", chunk)
+        if parser is not None:
+            text = parser.feed(text)
+        if text:
+            parts.append(text)
+            yield "token", {"text": text}
+    if parser is not None:
+        tail = parser.close()
+        if tail:
+            parts.append(tail)
+            yield "token", {"text": tail}
+    content = "".join(parts)
+    if finish is not None:
+        content = await asyncio.to_thread(finish, content)
+    yield _add(state, "ai", content)
+
+
+async def _artifact_turn(state, artifact_key, title, chain, inputs):
+    """Like _ai_turn, but a report generated before for the same inputs is served from the store."""
+    artifact = _artifacts.get(artifact_key)
+    if artifact is not None:
+        yield "token", {"text": artifact["content"]}
+        yield _add(state, "ai", artifact["content"])
+        return
+    async for event in _ai_turn(state, chain, inputs):
+        yield event
+    _artifacts.put(artifact_key, state["history"][-1]["content"], title, f"{title}.md")
+
+
+def _expect(state):
+    """Describes the input the current stage is waiting for."""
+    mode, stage = state["mode"], state["stage"]
+    if state.get("done"):
+        return None
+    if mode == "exploration":
+        if stage in EXPLORATION_QUESTIONS:
+            return {"answers": EXPLORATION_QUESTIONS[stage][1]}
+        return {"input": EXPLORATION_ACTION_PROMPT}
+    if mode == "panoramic":
+        if stage == 1:
+            return {"profile": {field: label for field, label, _ in PANORAMIC_PROFILE_FIELDS}}
+        return {"input": "请输入您的选择或想法"}
+    if mode == "decision":
+        return {"fields": ["offer_a", "offer_b", "priorities"]}
+    if mode == "company_info":
+        return {"fields": ["company_name"]}
+    if mode == "communication":
+        return {"input": "你的回应", "actions": ["debrief"] if len(state["history"]) > 2 else []}
+    if mode == "curriculum_analysis":
+        if stage == 1:
+            return {"fields": ["curriculum_content"]}
+        if stage == 2:
+            return {"input": "请输入您选择的职业方向"}
+        return {"fields": ["key_courses"], "key_courses": state["data"].get("key_courses")}
+
+
+def session_view(state, include_history=True):
+    view = {key: state[key] for key in ("session_id", "mode", "stage")}
+    view["done"] = bool(state.get("done"))
+    view["expect"] = _expect(state)
+    if include_history:
+        view["history"] = state["history"]
+    return view
+
+
+def start_session(mode, body):
+    if mode not in MODES:
+        raise ModeInputError(f"未知模式: {mode}")
+    state = {"mode": mode, "stage": 1, "history": [], "data": {}}
+    if mode == "exploration":
+        _add(state, "ai", EXPLORATION_WELCOME)
+    elif mode == "communication":
+        my_choice, family_concern = _require(body, "my_choice", "family_concern")
+        state["data"].update(my_choice=my_choice, family_concern=family_concern)
+        _add(state, "ai", COMMUNICATION_OPENING.format(my_choice=my_choice, family_concern=family_concern))
+    return state
+
+
+# --- 模式一: 职业目标探索 ---
+def _exploration(llm, state, body):
+    stage = state["stage"]
+    if stage in EXPLORATION_QUESTIONS:
+        answers = body.get("answers")
+        questions = EXPLORATION_QUESTIONS[stage][1]
+        if not isinstance(answers, list) or len(answers) != len(questions) or not all(
+                str(a).strip() for a in answers):
+            raise ModeInputError(f"请完整填写所有问题的回答 (需要 {len(questions)} 个回答)。")
+        return _exploration_answers(llm, state, [str(a).strip() for a in answers])
+    (action,) = _require(body, "input")
+    return _exploration_action(state, action)
+
+
+async def _exploration_answers(llm, state, answers):
+    stage = state["stage"]
+    user_input = format_exploration_answers(stage, answers)
+    yield _add(state, "human", user_input)
+    chain = ChatPromptTemplate.from_template(EXPLORATION_INTERIM_PROMPTS[stage + 1]) | llm
+    async for event in _ai_turn(state, chain, {"user_input": user_input}):
+        yield event
+    if stage + 2 in EXPLORATION_QUESTIONS:
+        state["stage"] = stage + 2
+        return
+    full_conversation = "\n\n".join(m["content"] for m in state["history"] if m["role"] == "human")
+    chain = ChatPromptTemplate.from_template(EXPLORATION_REPORT_PROMPT) | llm
+    async for event in _ai_turn(state, chain, {"conversation_history": full_conversation}):
+        yield event
+    state["stage"] = 8
+
+
+async def _exploration_action(state, action):
+    yield _add(state, "human", f"我的最终行动计划是：{action}")
+    yield _add(state, "ai", EXPLORATION_FINAL_MESSAGE)
+    state["stage"], state["done"] = 9, True
+
+
+# --- 模式五: 职业路径全景规划 ---
+def _panoramic(llm, state, body):
+    data = state["data"]
+    if state["stage"] == 1:
+        profile = body.get("profile")
+        if not isinstance(profile, dict):
+            raise ModeInputError("profile 必须是包含五个维度的对象。")
+        values = dict(zip([f for f, _, _ in PANORAMIC_PROFILE_FIELDS],
+                          _require(profile, *[f for f, _, _ in PANORAMIC_PROFILE_FIELDS])))
+        data["user_profile"] = format_user_profile(values)
+        user_message = f"这是我的能力画像：\n{data['user_profile']}"
+    else:
+        (user_message,) = _require(body, "input")
+        data["chosen_professions" if state["stage"] == 2 else "chosen_region"] = user_message
+    return _panoramic_turn(llm, state, user_message)
+
+
+async def _panoramic_turn(llm, state, user_message):
+    data = state["data"]
+    yield _add(state, "human", user_message)
+    current_stage = state["stage"] + 1
+    inputs = {"current_stage": current_stage, "user_profile": data["user_profile"],
+              "chosen_professions": data.get("chosen_professions", "N/A"),
+              "chosen_region": data.get("chosen_region", "N/A")}
+    chain = ChatPromptTemplate.from_template(PANORAMIC_PROMPT) | llm
+    finish = None
+    if current_stage == 4:
+        store = get_industry_chain_store()
+        professions = data.get("chosen_professions", "")
+        stored_chain = store.lookup(professions)
+        if stored_chain:
+            # The stored diagram goes out first; the model writes the rest from its outline.
+            inputs["industry_chain"] = stored_chain["outline"]
+            chain = ChatPromptTemplate.from_template(PANORAMIC_CACHED_CHAIN_PROMPT) | llm
+            prefix = with_diagram("", stored_chain)
+            yield "token", {"text": prefix}
+
+            def finish(content):
+                return prefix + content
+        else:
+            def finish(content):
+                content = repair_message(content, llm)
+                store.record_reply(professions, content)
+                return content
+    async for event in _ai_turn(state, chain, inputs, finish=finish):
+        yield event
+    state["stage"] = current_stage
+    state["done"] = current_stage == 4
+
+
+# --- 模式二: Offer 决策分析 ---
+def _decision(llm, state, body):
+    offer_a, offer_b = _require(body, "offer_a", "offer_b")
+    priorities = body.get("priorities") or []
+    if isinstance(priorities, str):
+        priorities = [p.strip() for p in priorities.split(",") if p.strip()]
+    inputs = {"offer_a_details": offer_a, "offer_b_details": offer_b,
+              "user_priorities_sorted_list": ", ".join(priorities) if priorities else "用户未指定"}
+    return _single_report(state, make_artifact_key("decision", *inputs.values()), "Offer对比分析报告",
+                          ChatPromptTemplate.from_template(DECISION_PROMPT) | llm, inputs)
+
+
+# --- 模式四: 企业信息速览 ---
+def _company_info(llm, state, body):
+    company_key, company_name = canonical_company(_require(body, "company_name")[0])
+    return _single_report(state, make_artifact_key("company_info", company_key), f"{company_name}-核心信息速览",
+                          ChatPromptTemplate.from_template(COMPANY_INFO_PROMPT) | llm,
+                          {"company_name": company_name})
+
+
+async def _single_report(state, artifact_key, title, chain, inputs):
+    async for event in _artifact_turn(state, artifact_key, title, chain, inputs):
+        yield event
+    # One-shot modes stay open: each further request is a new report in the same session.
+    state["stage"] += 1
+
+
+# --- 模式三: 家庭沟通模拟 ---
+def _communication(llm, state, body):
+    if state["stage"] == 2:
+        raise ModeInputError("模拟已结束。")
+    if body.get("action") == "debrief":
+        if len(state["history"]) <= 2:
+            raise ModeInputError("请至少进行一轮对话后再申请复盘。")
+        return _communication_debrief(llm, state)
+    (user_input,) = _require(body, "input")
+    return _communication_reply(llm, state, user_input)
+
+
+async def _communication_reply(llm, state, user_input):
+    data = state["data"]
+    prompt = ChatPromptTemplate.from_messages([("system", COMMUNICATION_ROLE_PROMPT),
+                                               MessagesPlaceholder(variable_name="history"),
+                                               ("human", "{input}")])
+    inputs = {"history": _lc_messages(state["history"]), "input": user_input,
+              "my_choice": data["my_choice"], "family_concern": data["family_concern"]}
+    yield _add(state, "human", user_input)
+    async for event in _ai_turn(state, prompt | llm, inputs):
+        yield event
+
+
+async def _communication_debrief(llm, state):
+    data = state["data"]
+    full_conversation = "\n".join(f"{'我' if m['role'] == 'human' else '家人'}: {m['content']}"
+                                  for m in state["history"])
+    inputs = {"my_choice": data["my_choice"], "family_concern": data["family_concern"],
+              "conversation_history": full_conversation}
+    chain = ChatPromptTemplate.from_template(COMMUNICATION_DEBRIEF_PROMPT) | llm
+    async for event in _artifact_turn(state, make_artifact_key("communication", *inputs.values()),
+                                      "沟通表现复盘报告", chain, inputs):
+        yield event
+    state["stage"], state["done"] = 2, True
+
+
+# --- 模式六: 专业培养方案解析 ---
+def _curriculum(llm, state, body):
+    stage, data = state["stage"], state["data"]
+    if stage == 1:
+        (content,) = _require(body, "curriculum_content")
+        data["curriculum_content"] = compact_text(content)
+        return _curriculum_analysis(llm, state)
+    if stage == 2:
+        (career,) = _require(body, "input")
+        return _curriculum_path(llm, state, career)
+    key_courses = body.get("key_courses") or data.get("key_courses")
+    if not key_courses:
+        raise ModeInputError("未能识别出核心课程列表，请在 key_courses 中提供课程列表。")
+    if isinstance(key_courses, str):
+        key_courses = [c.strip() for c in key_courses.split(",") if c.strip()]
+    return _curriculum_courses(llm, state, key_courses)
+
+
+async def _curriculum_analysis(llm, state):
+    yield _add(state, "human", "这是我的专业培养方案，请帮我分析。")
+    chain = ChatPromptTemplate.from_template(CURRICULUM_ANALYSIS_PROMPT) | llm
+    async for event in _ai_turn(state, chain, {"curriculum_content": state["data"]["curriculum_content"]}):
+        yield event
+    state["stage"] = 2
+
+
+async def _curriculum_path(llm, state, career):
+    data = state["data"]
+    data["chosen_career"] = career
+    yield _add(state, "human", career)
+    chain = ChatPromptTemplate.from_template(CURRICULUM_PATH_PROMPT) | llm
+    parser = KeyCourseStreamParser()
+    inputs = {"career_path": career, "curriculum_content": data["curriculum_content"]}
+    async for event in _ai_turn(state, chain, inputs, parser=parser,
+                                finish=lambda content: repair_message(content, llm)):
+        yield event
+    response = state["history"][-1]["content"]
+    key_courses = parser.courses or extract_key_courses(response)
+    if not key_courses:
+        try:
+            key_courses = await asyncio.to_thread(request_key_courses, llm, response)
+        except Exception:
+            key_courses = None
+    data["key_courses"] = key_courses or None
+    state["stage"] = 3
+
+
+async def _curriculum_courses(llm, state, key_courses):
+    data = state["data"]
+    data["key_courses"] = key_courses
+    yield _add(state, "human", f"请为我详细解读这些核心课程：{', '.join(key_courses)}")
+    chain = ChatPromptTemplate.from_template(CURRICULUM_COURSES_PROMPT) | llm
+    inputs = {"key_courses_list": ", ".join(key_courses), "curriculum_content": data["curriculum_content"]}
+    async for event in _ai_turn(state, chain, inputs):
+        yield event
+    state["stage"], state["done"] = 4, True
+
+
+_HANDLERS = {
+    "exploration": _exploration,
+    "panoramic": _panoramic,
+    "decision": _decision,
+    "company_info": _company_info,
+    "communication": _communication,
+    "curriculum_analysis": _curriculum,
+}
+
+
+def take_turn(llm, state, body):
+    """Validates `body` against the current stage and returns the turn's event stream."""
+    if state.get("done"):
+        raise ModeInputError("该会话已完成。")
+    return _HANDLERS[state["mode"]](llm, state, body)
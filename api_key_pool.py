@@ -0,0 +1,270 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# --- API Key 池 ---
+# One key's rate limit used to cap the whole deployment. A profile with
+# several keys (comma-separated in its key variable, or an "api_keys"
+# list), or a "pool" profile that combines other profiles (several
+# endpoints), is built as a KeyPoolChatModel. It sends each request to the
+# key with the most headroom left. Headroom is read from the
+# x-ratelimit-remaining-* / -limit-* / -reset-* response headers, which the
+# shared httpx clients pass to observe_response(), and less is counted for
+# requests still in flight.
+#
+# A 429 puts the key in cooldown: for Retry-After if the server sent one,
+# otherwise for a backoff that doubles with each consecutive 429. A request
+# that fails with 429, 5xx or a connection error before any token was
+# streamed moves on to the next key. Once every key is cooling down, a
+# request waits for the first one to come back, for up to
+# LLM_KEY_POOL_MAX_WAIT seconds. key_pool_stats() gives per-key throughput
+# and errors, so capacity is scaled by adding keys.
+#
+#     VOLCENGINE_API_KEY=key1,key2,key3 streamlit run web_test.py
+#     LLM_PROFILES_JSON='{"ark2": {"base_url": "...", "model": "...", "api_key_env": ["ARK2_KEYS"]},
+#                         "pooled": {"kind": "pool", "members": ["ark", "ark2"]}}' LLM_PROFILE=pooled ...
+
+COOLDOWN = float(os.getenv("LLM_KEY_POOL_COOLDOWN", "5"))
+MAX_COOLDOWN = float(os.getenv("LLM_KEY_POOL_MAX_COOLDOWN", "120"))
+MAX_WAIT = float(os.getenv("LLM_KEY_POOL_MAX_WAIT", "20"))
+INFLIGHT_PENALTY = 0.05  # headroom one in-flight request costs when the headers do not say
+WINDOW = 60.0  # seconds of history behind the per-minute rates
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class KeyPoolExhausted(RuntimeError):
+    """Every key in the pool failed this request."""
+
+
+def _duration(value):
+    """Seconds in a reset header: "20ms", "1s", "6m0s", or a plain number of seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parts = _DURATION.findall(value)
+        return sum(float(n) * _UNITS[unit] for n, unit in parts) if parts else None
+
+
+def _retryable(error):
+    """429, 5xx and connection errors are worth another key; langchain-openai wraps the openai classes."""
+    status = getattr(error, "status_code", None)
+    names = {cls.__name__ for cls in type(error).__mro__}
+    return status == 429 or (status or 0) >= 500 or bool(names & {"APIConnectionError", "APITimeoutError"})
+
+
+class KeySlot:
+    """Rate-limit state and counters of one API key, shared by every pool that uses the key."""
+
+    def __init__(self, label):
+        self.label = label
+        self._lock = threading.Lock()
+        self.limits = {}  # "requests"/"tokens" -> (remaining, limit, reset at)
+        self.cooldown_until = 0.0
+        self.consecutive_429 = 0
+        self.inflight = 0
+        self.requests = self.errors = self.throttled = self.tokens = 0
+        self.latency = 0.0
+        self._recent = deque()  # (finished at, output tokens) of successful requests
+
+    def headroom(self, now=None):
+        """0..1: the smallest remaining share of any known limit, minus the requests in flight; -1 cooling down."""
+        now = now or time.monotonic()
+        with self._lock:
+            if now < self.cooldown_until:
+                return -1.0
+            share = 1.0
+            for remaining, limit, reset_at in self.limits.values():
+                if limit and (reset_at is None or now < reset_at):
+                    share = min(share, remaining / limit)
+            return share - self.inflight * INFLIGHT_PENALTY
+
+    def observe(self, status, headers, now=None):
+        """Updates the limits from a response's headers; a 429 starts the cooldown."""
+        now = now or time.monotonic()
+        with self._lock:
+            for kind in ("requests", "tokens"):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                if remaining is None or limit is None:
+                    continue
+                try:
+                    reset = _duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    self.limits[kind] = (float(remaining), float(limit), now + reset if reset is not None else None)
+                except ValueError:
+                    pass
+            if status == 429:
+                self.throttled += 1
+                self.consecutive_429 += 1
+                wait = _duration(headers.get("retry-after"))
+                if wait is None:
+                    wait = min(COOLDOWN * 2 ** (self.consecutive_429 - 1), MAX_COOLDOWN)
+                self.cooldown_until = max(self.cooldown_until, now + wait)
+            elif status < 400:
+                self.consecutive_429 = 0
+
+    def begin(self):
+        with self._lock:
+            self.inflight += 1
+            self.requests += 1
+
+    def finish(self, seconds, tokens=0, error=None):
+        now = time.monotonic()
+        with self._lock:
+            self.inflight -= 1
+            if error is not None:
+                self.errors += 1
+                return
+            self.latency += seconds
+            self.tokens += tokens
+            self._recent.append((now, tokens))
+            while self._recent and now - self._recent[0][0] > WINDOW:
+                self._recent.popleft()
+
+    def snapshot(self):
+        now = time.monotonic()
+        headroom = self.headroom(now)
+        with self._lock:
+            recent = [(t, n) for t, n in self._recent if now - t <= WINDOW]
+            ok = self.requests - self.errors - self.inflight
+            return {"key": self.label, "requests": self.requests, "errors": self.errors,
+                    "throttled": self.throttled, "inflight": self.inflight,
+                    "requests_per_min": len(recent) * 60 / WINDOW,
+                    "tokens_per_min": sum(n for _, n in recent) * 60 / WINDOW,
+                    "avg_latency": round(self.latency / ok, 2) if ok > 0 else None,
+                    "headroom": round(headroom, 3) if headroom >= 0 else None,
+                    "cooldown": round(max(0.0, self.cooldown_until - now), 1)}
+
+
+_slots = {}
+_slots_lock = threading.Lock()
+
+
+def get_slot(api_key, label):
+    with _slots_lock:
+        if api_key not in _slots:
+            _slots[api_key] = KeySlot(label)
+        return _slots[api_key]
+
+
+def mask(api_key):
+    return f"…{api_key[-4:]}" if len(api_key) > 8 else "…"
+
+
+def observe_response(response):
+    """httpx response hook: feeds the rate-limit headers of every model response to its key."""
+    auth = response.request.headers.get("authorization", "")
+    slot = _slots.get(auth[7:]) if auth.lower().startswith("bearer ") else None
+    if slot is not None:
+        slot.observe(response.status_code, response.headers)
+
+
+async def aobserve_response(response):
+    observe_response(response)
+
+
+def key_pool_stats():
+    """Per-key counters of every key used in this process, busiest first."""
+    with _slots_lock:
+        slots = list(_slots.values())
+    return sorted((slot.snapshot() for slot in slots), key=lambda s: -s["requests"])
+
+
+class KeyPoolChatModel(BaseChatModel):
+    """Routes each request to the member model whose API key has the most headroom."""
+
+    members: List[Any]  # [(KeySlot, chat model)]
+    max_wait: float = MAX_WAIT
+
+    @property
+    def _llm_type(self) -> str:
+        return "key-pool"
+
+    @property
+    def model_name(self) -> str:
+        # The cassette records this; all members of a pool are expected to serve the same model.
+        return getattr(self.members[0][1], "model_name", "")
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return getattr(self.members[0][1], "temperature", None)
+
+    def _pick(self, tried):
+        """The untried member with the most headroom, waiting out a cooldown if every key is in one."""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            candidates = [(slot.headroom(), i) for i, (slot, _) in enumerate(self.members) if i not in tried]
+            if not candidates:
+                return None
+            headroom, index = max(candidates, key=lambda c: (c[0], -self.members[c[1]][0].requests))
+            if headroom >= 0:
+                return index
+            wake = min(self.members[i][0].cooldown_until for _, i in candidates)
+            if wake > deadline:
+                return index  # try it anyway; the error then says what the server thinks
+            time.sleep(max(0.0, wake - time.monotonic()))
+
+    def _attempts(self):
+        tried = set()
+        while (index := self._pick(tried)) is not None:
+            tried.add(index)
+            yield self.members[index]
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        error = None
+        for slot, llm in self._attempts():
+            slot.begin()
+            started, tokens, streamed = time.monotonic(), 0, False
+            try:
+                for message_chunk in llm.stream(messages, stop=stop, **kwargs):
+                    text = message_chunk.content if isinstance(message_chunk.content, str) else ""
+                    usage = getattr(message_chunk, "usage_metadata", None)
+                    if usage:
+                        tokens = usage.get("output_tokens", 0)
+                    chunk = ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=usage))
+                    streamed = streamed or bool(text)
+                    if run_manager and text:
+                        run_manager.on_llm_new_token(text, chunk=chunk)
+                    yield chunk
+            except Exception as e:
+                slot.finish(time.monotonic() - started, error=e)
+                if streamed or not _retryable(e):
+                    raise
+                print(f"[api_key_pool] {slot.label} 请求失败，换下一个 Key: {e}")
+                error = e
+                continue
+            slot.finish(time.monotonic() - started, tokens)
+            return
+        raise KeyPoolExhausted(f"所有 API Key 均请求失败: {error}") from error
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        error = None
+        for slot, llm in self._attempts():
+            slot.begin()
+            started = time.monotonic()
+            try:
+                response = llm.invoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                slot.finish(time.monotonic() - started, error=e)
+                if not _retryable(e):
+                    raise
+                print(f"[api_key_pool] {slot.label} 请求失败，换下一个 Key: {e}")
+                error = e
+                continue
+            usage = getattr(response, "usage_metadata", None)
+            slot.finish(time.monotonic() - started, (usage or {}).get("output_tokens", 0))
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response.content,
+                                                                            usage_metadata=usage))])
+        raise KeyPoolExhausted(f"所有 API Key 均请求失败: {error}") from error
@@ -0,0 +1,197 @@
+"""Headless HTTP API for the six advisor modes.
+
+    python api_server.py --workers 4 --port 8000
+
+    POST   /sessions                    {"mode": "decision", ...}  -> session (201)
+    GET    /sessions/{id}                                           -> session with history
+    POST   /sessions/{id}/turns         stage input                 -> text/event-stream
+    DELETE /sessions/{id}
+    GET    /healthz
+
+A turn streams server-sent events: `token` ({"text"}) while the model
+writes, `message` for every finished message, then `done` with the new
+session view, or `error`. The session only advances when the turn
+finishes, so a dropped connection can simply be retried. Sessions are
+stored on disk (session_store.py) so any worker can serve any request.
+
+The model is the LLM_PROFILE backend profile (llm_backends.py, "ark" by
+default, with VOLCENGINE_API_KEY from the environment or .env). Each worker
+keeps one pooled HTTP client; /healthz reports its connection reuse and,
+when the profile has several API keys (api_key_pool.py), each key's
+throughput, errors and rate-limit headroom.
+LLM_CASSETTE_MODE=replay serves recorded answers instead (llm_cassette.py).
+Token use is counted per session (token_budget.py); a session past its
+hard limit gets 429 with a user-facing message. Mermaid diagrams are
+repaired before a reply is stored (mermaid_repair.py); /healthz reports
+the repair rates and the hit rate of the stored industry-chain diagrams
+(industry_chain_store.py).
+"""
+import argparse
+import json
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from advisor_modes import ModeInputError, session_view, start_session, take_turn
+from llm_backends import BackendConfigError, create_llm, pool_stats
+from api_key_pool import key_pool_stats
+from industry_chain_store import get_industry_chain_store
+from mermaid_repair import repair_stats
+from session_store import FileSessionStore, SessionBusy, SessionNotFound
+from token_budget import get_token_budget
+
+load_dotenv()
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+# --- LLM 初始化 (每個 worker 一份) ---
+@lru_cache(maxsize=1)
+def get_llm():
+    return create_llm()
+
+
+@lru_cache(maxsize=1)
+def get_store():
+    return FileSessionStore()
+
+
+def _error(status, message):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+async def _json_body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class _TurnStream(StreamingResponse):
+    """The event stream of one turn; releases the session lock however the response ends.
+
+    A generator's finally does not run when the client disconnects before the
+    first event, since the generator was never started.
+    """
+
+    def __init__(self, content, release):
+        super().__init__(content, media_type="text/event-stream",
+                         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+# --- 路由 ---
+async def create_session(request):
+    body = await _json_body(request)
+    if body is None:
+        return _error(400, "请求体必须是 JSON 对象。")
+    try:
+        state = start_session(body.get("mode"), body)
+    except ModeInputError as e:
+        return _error(400, str(e))
+    store = get_store()
+    store.sweep()
+    return JSONResponse(session_view(store.create(state)), status_code=201)
+
+
+async def get_session(request):
+    try:
+        state = get_store().load(request.path_params["session_id"])
+    except SessionNotFound:
+        return _error(404, "会话不存在或已过期。")
+    return JSONResponse(session_view(state))
+
+
+async def delete_session(request):
+    try:
+        get_store().delete(request.path_params["session_id"])
+    except SessionNotFound:
+        return _error(404, "会话不存在或已过期。")
+    return JSONResponse({"deleted": True})
+
+
+async def post_turn(request):
+    session_id = request.path_params["session_id"]
+    body = await _json_body(request)
+    if body is None:
+        return _error(400, "请求体必须是 JSON 对象。")
+    store = get_store()
+    try:
+        store.acquire(session_id)
+    except SessionNotFound:
+        return _error(404, "会话不存在或已过期。")
+    except SessionBusy:
+        return _error(409, "该会话正在生成回复，请稍后再试。")
+    try:
+        state = store.load(session_id)
+        budget = get_token_budget()
+        if budget.level(session_id) == "hard":
+            store.release(session_id)
+            return _error(429, budget.refusal(session_id))
+        events = take_turn(budget.wrap(get_llm(), session_id, state["mode"]), state, body)
+    except SessionNotFound:
+        store.release(session_id)
+        return _error(404, "会话不存在或已过期。")
+    except ModeInputError as e:
+        store.release(session_id)
+        return _error(400, str(e))
+    except BackendConfigError as e:
+        store.release(session_id)
+        return _error(503, f"模型不可用: {e}")
+    except BaseException:
+        store.release(session_id)
+        raise
+
+    async def stream():
+        try:
+            async for event, data in events:
+                yield _sse(event, data)
+            store.save(state)
+            yield _sse("done", session_view(state, include_history=False))
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    return _TurnStream(stream(), lambda: store.release(session_id))
+
+
+async def healthz(request):
+    return JSONResponse({"status": "ok", "pid": os.getpid(), "http_pool": pool_stats(),
+                         "token_budget": get_token_budget().snapshot(), "mermaid_repair": repair_stats(),
+                         "industry_chains": get_industry_chain_store().stats(), "api_keys": key_pool_stats()})
+
+
+app = Starlette(routes=[
+    Route("/sessions", create_session, methods=["POST"]),
+    Route("/sessions/{session_id}", get_session, methods=["GET"]),
+    Route("/sessions/{session_id}", delete_session, methods=["DELETE"]),
+    Route("/sessions/{session_id}/turns", post_turn, methods=["POST"]),
+    Route("/healthz", healthz, methods=["GET"]),
+])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("ADVISOR_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ADVISOR_API_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ADVISOR_API_WORKERS", str(os.cpu_count() or 1))))
+    args = parser.parse_args()
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# --- 報告產物快取 ---
+# Final reports are generated once per (mode, inputs) and rendered from here
+# on every later rerun instead of calling the model again.
+
+DEFAULT_MAX_ENTRIES = 500
+
+
+def make_artifact_key(mode, *inputs):
+    """Builds the store key from the mode name plus a hash of the inputs.
+
+    Whitespace is collapsed first, so inputs that differ only in spacing or
+    trailing newlines share one report (and one generation).
+    """
+    digest = hashlib.sha256("\x1f".join(" ".join(str(i).split()) for i in inputs).encode("utf-8")).hexdigest()
+    return f"{mode}:{digest}"
+
+
+class ArtifactStore:
+    """A bounded, thread-safe LRU store of generated markdown reports."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            artifact = self._items.get(key)
+            if artifact is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return artifact
+
+    def put(self, key, content, title, file_name):
+        artifact = {"content": content, "title": title, "file_name": file_name, "created_at": time.time()}
+        with self._lock:
+            self._items[key] = artifact
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return artifact
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def content_bytes(self):
+        with self._lock:
+            return sum(len(a["content"].encode("utf-8")) for a in self._items.values())
@@ -0,0 +1,229 @@
+"""Batch company briefings (mode 4) or offer comparisons (mode 2) from a CSV file.
+
+    python batch_reports.py companies.csv --out reports/career_fair --concurrency 8
+    python batch_reports.py offers.csv --mode decision --out reports/offers
+
+Company CSVs need a `company_name` column (or 公司名称, 企业名称, ...); a
+file without such a header uses the first column of every row, which
+--no-header forces. Offer CSVs need `offer_a` and `offer_b`, plus an
+optional `priorities` column (comma separated, most important first).
+
+Each report is written to its own markdown file, named after the inputs'
+artifact key. A rerun of the same command skips reports already on disk,
+so an interrupted batch resumes where it stopped. Rows with the same
+inputs, or with different names of the same company (company_index.py),
+are generated once. index.md lists every report, and batch_stats.json
+holds the throughput and failure stats of the last run.
+The prompts are the ones the web app and the API use (web_prompts.py).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import time
+
+from dotenv import load_dotenv
+
+from artifact_store import make_artifact_key
+from company_index import canonical_company
+from web_prompts import COMPANY_INFO_PROMPT, DECISION_PROMPT
+
+load_dotenv()
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 2
+# Header cells that name the company column; a first row made of none of them is data.
+COMPANY_HEADERS = ("company_name", "company", "name", "公司名称", "企业名称", "单位名称", "公司", "企业", "单位", "名称")
+INDEX_FILE = "index.md"
+STATS_FILE = "batch_stats.json"
+
+
+class BatchInputError(ValueError):
+    """The CSV file does not have the columns the selected mode needs."""
+
+
+# --- 讀取 CSV ---
+def _safe_name(text, limit=40):
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", text).strip("_.")[:limit] or "report"
+
+
+def load_jobs(path, mode, has_header=True):
+    """Reads the CSV into report jobs; rows with the same inputs collapse into one job."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        rows = [row for row in csv.reader(f) if any(cell.strip() for cell in row)]
+    header = [cell.strip().lower() for cell in rows[0]] if rows else []
+    jobs = {}
+    if mode == "company_info":
+        named = [header.index(name) for name in COMPANY_HEADERS if name in header] if has_header else []
+        if named:
+            column, rows = named[0], rows[1:]
+        else:
+            # No header row: every row is a company name in the first column.
+            column = 0
+        for row in rows:
+            typed = row[column].strip() if column < len(row) else ""
+            if not typed:
+                continue
+            # "字节" and "ByteDance" resolve to the same company and report.
+            company_key, name = canonical_company(typed)
+            key = make_artifact_key("company_info", company_key)
+            jobs.setdefault(key, {"key": key, "title": f"{name}-核心信息速览", "template": COMPANY_INFO_PROMPT,
+                                  "inputs": {"company_name": name}})
+        return list(jobs.values())
+
+    missing = [c for c in ("offer_a", "offer_b") if c not in header]
+    if missing:
+        raise BatchInputError(f"{path} 缺少列: {', '.join(missing)}")
+    a, b = header.index("offer_a"), header.index("offer_b")
+    p = header.index("priorities") if "priorities" in header else None
+    for line, row in enumerate(rows[1:], start=2):
+        offer_a = row[a].strip() if a < len(row) else ""
+        offer_b = row[b].strip() if b < len(row) else ""
+        if not offer_a or not offer_b:
+            print(f"跳过第 {line} 行: offer_a 和 offer_b 都不能为空。")
+            continue
+        priorities = [x.strip() for x in row[p].split(",") if x.strip()] if p is not None and p < len(row) else []
+        inputs = {"offer_a_details": offer_a, "offer_b_details": offer_b,
+                  "user_priorities_sorted_list": ", ".join(priorities) if priorities else "用户未指定"}
+        # Same key as advisor_modes._decision, so the files line up with API artifacts.
+        key = make_artifact_key("decision", *inputs.values())
+        title = f"Offer对比-{_safe_name(offer_a, 16)}-vs-{_safe_name(offer_b, 16)}"
+        jobs.setdefault(key, {"key": key, "title": title, "template": DECISION_PROMPT, "inputs": inputs})
+    return list(jobs.values())
+
+
+def report_path(out_dir, job):
+    digest = job["key"].split(":", 1)[1][:10]
+    return os.path.join(out_dir, f"{_safe_name(job['title'])}-{digest}.md")
+
+
+# --- 並行產生 ---
+def _write_atomic(path, text):
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp, path)
+
+
+async def _generate(llm, job, path, semaphore, retries, stats):
+    from langchain_core.prompts import ChatPromptTemplate
+
+    chain = ChatPromptTemplate.from_template(job["template"]) | llm
+    async with semaphore:
+        for attempt in range(retries + 1):
+            started = time.monotonic()
+            try:
+                response = await chain.ainvoke(job["inputs"])
+                content = response.content.strip()
+                if not content:
+                    raise ValueError("模型返回了空内容")
+            except Exception as e:
+                if attempt < retries:
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                reason = f"{type(e).__name__}: {e}"
+                stats["failed"].append({"title": job["title"], "error": reason[:300]})
+                print(f"✗ {job['title']} ({reason[:120]})")
+                return
+            stats["latencies"].append(time.monotonic() - started)
+            stats["retried"] += attempt > 0
+            _write_atomic(path, content + "\n")
+            stats["generated"] += 1
+            print(f"✓ {job['title']} ({stats['latencies'][-1]:.1f}s)")
+            return
+
+
+def new_stats(jobs):
+    return {"jobs": len(jobs), "generated": 0, "resumed": 0, "retried": 0, "failed": [], "latencies": []}
+
+
+async def run_batch(llm, jobs, out_dir, stats, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES):
+    """Generates the jobs whose report file is missing, at most `concurrency` at a time, counting into `stats`."""
+    os.makedirs(out_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = []
+    for job in jobs:
+        path = report_path(out_dir, job)
+        if os.path.exists(path):
+            stats["resumed"] += 1
+        else:
+            pending.append(_generate(llm, job, path, semaphore, retries, stats))
+    print(f"共 {len(jobs)} 份报告，已完成 {stats['resumed']} 份，本次生成 {len(pending)} 份 (并发 {concurrency})。")
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*pending)
+    finally:
+        stats["elapsed"] = time.monotonic() - started
+
+
+# --- 索引與統計 ---
+def write_index(out_dir, jobs, stats):
+    lines = ["# 报告索引", "", f"共 {len(jobs)} 份，生成于 {time.strftime('%Y-%m-%d %H:%M')}。", ""]
+    failed = {f["title"] for f in stats["failed"]}
+    for job in jobs:
+        path = report_path(out_dir, job)
+        if os.path.exists(path):
+            lines.append(f"- [{job['title']}]({os.path.basename(path)})")
+        else:
+            lines.append(f"- {job['title']} — {'生成失败' if job['title'] in failed else '未完成'}")
+    _write_atomic(os.path.join(out_dir, INDEX_FILE), "\n".join(lines) + "\n")
+
+
+def summarize(stats):
+    latencies = sorted(stats["latencies"])
+
+    def pct(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2) if latencies else None
+
+    elapsed = stats.get("elapsed", 0.0)
+    return {"jobs": stats["jobs"], "generated": stats["generated"], "resumed": stats["resumed"],
+            "failed": len(stats["failed"]), "retried": stats["retried"], "elapsed_s": round(elapsed, 1),
+            "reports_per_min": round(stats["generated"] / elapsed * 60, 1) if elapsed else None,
+            "latency_p50_s": pct(0.5), "latency_p95_s": pct(0.95), "failures": stats["failed"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path")
+    parser.add_argument("--mode", choices=("company_info", "decision"), default="company_info")
+    parser.add_argument("--out", default="reports")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", DEFAULT_CONCURRENCY)))
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
+    parser.add_argument("--profile", help="model backend profile (llm_backends.py); defaults to LLM_PROFILE")
+    parser.add_argument("--no-header", action="store_true",
+                        help="company CSV without a header row: the first row is a company too")
+    args = parser.parse_args()
+
+    from llm_backends import BackendConfigError, create_llm
+
+    try:
+        jobs = load_jobs(args.csv_path, args.mode, has_header=not args.no_header)
+    except (OSError, BatchInputError) as e:
+        parser.exit(2, f"错误：{e}\n")
+    if not jobs:
+        parser.exit(1, "CSV 中没有可生成的行。\n")
+    try:
+        llm = create_llm(args.profile)
+    except BackendConfigError as e:
+        parser.exit(2, f"错误：{e}\n")
+    stats = new_stats(jobs)
+    try:
+        asyncio.run(run_batch(llm, jobs, args.out, stats, max(1, args.concurrency), args.retries))
+    except KeyboardInterrupt:
+        print("\n已中断。已完成的报告已保存，重新运行同一命令即可继续。")
+    finally:
+        os.makedirs(args.out, exist_ok=True)
+        write_index(args.out, jobs, stats)
+        summary = summarize(stats)
+        _write_atomic(os.path.join(args.out, STATS_FILE), json.dumps(summary, ensure_ascii=False, indent=2))
+    print(f"\n生成 {summary['generated']} 份，续用 {summary['resumed']} 份，失败 {summary['failed']} 份，"
+          f"用时 {summary['elapsed_s']}s ({summary['reports_per_min'] or 0} 份/分钟，"
+          f"p50 {summary['latency_p50_s']}s，p95 {summary['latency_p95_s']}s)。")
+    print(f"索引: {os.path.join(args.out, INDEX_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Cold-start import budget for web_test.py.
+
+Times, in fresh interpreters, how long it takes to import the modules that
+web_test.py imports at module top (read from its AST, so the numbers track
+the file as it changes) and compares them with the eager import set the app
+used before lazy loading. Exits with status 1 when the current set exceeds
+the budget.
+
+    python benchmarks/bench_cold_start.py --runs 5 --budget-ms 1500
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "web_test.py")
+
+# The top-level imports of web_test.py before lazy loading was introduced.
+EAGER_IMPORTS = [
+    "streamlit",
+    "langchain.prompts",
+    "langchain_community.chat_message_histories",
+    "langchain_core.runnables.history",
+    "langchain_openai",
+    "dotenv",
+    "langchain_core.messages",
+    "streamlit_mermaid",
+    "PIL.Image",
+    "pytesseract",
+]
+
+
+def top_level_imports(path):
+    """Returns the modules imported at module level of `path`."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            modules.append(node.module)
+    return modules
+
+
+class MissingModules(RuntimeError):
+    """Some of the app's imports are not installed, so the timing would leave them out."""
+
+
+def time_imports(modules, runs):
+    """Returns the per-run wall time in ms to import `modules` in a fresh interpreter."""
+    code = (
+        "import importlib, json, time\n"
+        "missing = []\n"
+        "t = time.perf_counter()\n"
+        f"for m in {modules!r}:\n"
+        "    try:\n"
+        "        importlib.import_module(m)\n"
+        "    except ImportError as e:\n"
+        "        missing.append(f'{m} ({e})')\n"
+        "print(json.dumps({'ms': (time.perf_counter() - t) * 1000, 'missing': missing}))\n"
+    )
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if result["missing"]:
+            raise MissingModules(", ".join(result["missing"]))
+        timings.append(result["ms"])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("COLD_START_BUDGET_MS", 1500)))
+    args = parser.parse_args()
+
+    current = top_level_imports(APP)
+    rows = [("eager (before)", EAGER_IMPORTS), ("lazy (current)", current)]
+    results = {}
+    print(f"{'import set':<18}{'median ms':>12}{'min ms':>10}{'max ms':>10}  modules")
+    for label, modules in rows:
+        try:
+            timings = time_imports(modules, args.runs)
+        except MissingModules as e:
+            print(f"FAIL: cannot import {e}; install requirements.txt first, a missing module would time as 0 ms")
+            sys.exit(2)
+        results[label] = statistics.median(timings)
+        print(f"{label:<18}{results[label]:>12.1f}{min(timings):>10.1f}{max(timings):>10.1f}  {len(modules)}")
+
+    lazy_ms = results["lazy (current)"]
+    print(f"\nsaved: {results['eager (before)'] - lazy_ms:.1f} ms, budget: {args.budget_ms:.0f} ms")
+    if lazy_ms > args.budget_ms:
+        print(f"FAIL: cold-start imports take {lazy_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Build time and lookup latency of the company index at 100k companies.
+
+Adds synthetic companies (a random Chinese name, its pinyin and a Latin
+alias) to the seed list, then times prefix autocomplete for prefixes of
+one to four characters and exact alias resolution. Uses the seed-style
+pinyin column, so pypinyin is not needed.
+
+    python benchmarks/bench_company_index.py --size 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from company_index import SEED_COMPANIES, CompanyIndex, _split_aliases  # noqa: E402
+
+SYLLABLES = {"华": "hua", "信": "xin", "科": "ke", "技": "ji", "创": "chuang", "新": "xin", "智": "zhi",
+             "能": "neng", "电": "dian", "子": "zi", "网": "wang", "络": "luo", "云": "yun", "数": "shu",
+             "天": "tian", "宇": "yu", "航": "hang", "星": "xing", "海": "hai", "通": "tong", "达": "da",
+             "联": "lian", "合": "he", "中": "zhong", "国": "guo", "金": "jin", "融": "rong", "安": "an"}
+SUFFIXES = ("科技有限公司", "股份有限公司", "集团", "有限公司")
+
+
+def build_index(size, seed=7):
+    rng = random.Random(seed)
+    chars = list(SYLLABLES)
+    index = CompanyIndex()
+    for company_id, name, aliases, pinyin in SEED_COMPANIES:
+        index.add(company_id, name, _split_aliases(aliases), pinyin)
+    names = []
+    for i in range(size):
+        core = "".join(rng.choice(chars) for _ in range(rng.randint(2, 4)))
+        name = core + rng.choice(SUFFIXES)
+        pinyin = " ".join(SYLLABLES[ch] for ch in core)
+        index.add(f"c{i}", name, [f"{pinyin.replace(' ', '').title()} Tech {i}"], pinyin)
+        names.append(name)
+    started = time.perf_counter()
+    index.complete("华")  # sorts the key list
+    return index, names, time.perf_counter() - started
+
+
+def timed(fn, queries):
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)], samples[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index, names, sort_s = build_index(args.size)
+    print(f"companies: {len(index)}, keys: {len(index._keys)}, "
+          f"build {time.perf_counter() - started:.2f}s (sort {sort_s:.2f}s)")
+
+    rng = random.Random(11)
+    print(f"{'lookup':<22}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for length in (1, 2, 3, 4):
+        queries = [rng.choice(names)[:length] for _ in range(args.queries)]
+        p50, p99, worst = timed(index.complete, queries)
+        print(f"{f'complete {length} char':<22}{p50:>9.3f}{p99:>9.3f}{worst:>9.3f}")
+    queries = [rng.choice(names) for _ in range(args.queries)]
+    p50, p99, worst = timed(index.complete, ["".join(SYLLABLES[ch] for ch in n[:2])[:4] for n in queries])
+    print(f"{'complete pinyin':<22}{p50:>9.3f}{p99:>9.3f}{worst:>9.3f}")
+    p50, p99, worst = timed(index.resolve, queries)
+    print(f"{'resolve name':<22}{p50:>9.3f}{p99:>9.3f}{worst:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
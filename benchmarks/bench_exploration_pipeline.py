@@ -0,0 +1,100 @@
+"""Time from submitting an exploration form to the next form being visible.
+
+Runs web_test.py headless with streamlit.testing's AppTest, using the
+"stub" model profile, which streams a canned reply at a fixed per-character
+pace. It fills in and submits the stage 1, 3 and 5 forms and reports two
+numbers for each:
+
+- form visible: submit until the next form is drawn (the pipelined flow;
+  the coaching reply keeps streaming above it)
+- reply done:   submit until the coaching reply has finished. This is when
+                the old flow showed the next form, since it waited for the
+                whole reply and then reran.
+
+    python benchmarks/bench_exploration_pipeline.py --reply-chars 600 --char-delay 0.01
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FORM_BUTTONS = {1: "提交关于“我”的分析", 3: "提交关于“社会”的分析", 5: "提交关于“家庭”的分析"}
+ANSWER = "我喜欢和人打交道，也愿意花时间把一件事情做好。"
+
+
+def fresh_app(state):
+    """A new AppTest carrying the app's own session state over.
+
+    AppTest keeps the elements of a run that st.rerun() interrupted in its
+    tree, so after a submit the old form's widgets linger there and break the
+    next run. A browser drops them; a fresh AppTest does too.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "web_test.py"), default_timeout=300)
+    for key, value in state.items():
+        at.session_state[key] = value
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+
+def app_state(at):
+    widgets = {area.key for area in at.text_area} | {button.key for button in at.button}
+    return {key: at.session_state[key] for key in at.session_state._state._keys()
+            if not key.startswith("$$") and key not in widgets}
+
+
+def run_once():
+    at = fresh_app({"current_mode": "exploration"})
+    rows = []
+    for stage, label in FORM_BUTTONS.items():
+        if rows:
+            at = fresh_app(app_state(at))
+        for area in at.text_area:
+            if area.key and area.key.startswith(f"s{stage}_q"):
+                area.input(ANSWER)
+        button = next(b for b in at.button if b.label == label)
+        started = time.perf_counter()
+        button.click()
+        at.run()
+        reply_done = time.perf_counter() - started
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        form_visible = at.session_state["exploration_form_latency"][-1] if stage < 5 else None
+        rows.append((stage, form_visible, reply_done))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--reply-chars", type=int, default=600)
+    parser.add_argument("--char-delay", type=float, default=0.01, help="stub model seconds per character")
+    args = parser.parse_args()
+
+    os.environ.update(LLM_PROFILE="stub", LLM_CASSETTE_MODE="off", LLM_STUB_REPLY="教练回复。" * (args.reply_chars // 5),
+                      LLM_PROFILES_JSON=json.dumps({"stub": {"sleep": args.char_delay}}))
+    results = {}
+    for _ in range(args.runs):
+        for stage, form_visible, reply_done in run_once():
+            results.setdefault(stage, ([], []))
+            if form_visible is not None:
+                results[stage][0].append(form_visible * 1000)
+            results[stage][1].append(reply_done * 1000)
+
+    print(f"{'submitted':<12}{'form visible ms':>17}{'reply done ms':>15}")
+    for stage, (visible, done) in results.items():
+        shown = f"{statistics.median(visible):.0f}" if visible else "-"
+        print(f"stage {stage:<6}{shown:>17}{statistics.median(done):>15.0f}")
+    print("stage 5 leads to the final report, which now starts generating together with the last reply.")
+
+
+if __name__ == "__main__":
+    main()
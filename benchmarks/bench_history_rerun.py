@@ -0,0 +1,110 @@
+"""Rerun time of the chat modes for long sessions, windowed vs. full history.
+
+Runs web_test.py headless with streamlit.testing's AppTest, with the
+communication, exploration or curriculum mode pre-loaded with 50 and 200
+messages. It compares three cases:
+
+- full:     every message drawn on each rerun (the old behaviour)
+- windowed: a full-app rerun with HISTORY_WINDOW messages drawn
+- fragment: the work left for a chat turn once it only reruns the chat
+            fragment (the latest reply plus the stage widgets).
+
+The fragment cost comes from the rerun profiler's phase split. It is the
+windowed rerun minus the css, state_init, sidebar and older-history
+phases, because AppTest always executes the whole script.
+
+The model is never called; the cassette layer runs in replay mode so no
+API key is needed.
+
+    python benchmarks/bench_history_rerun.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROFILE_PATH = os.path.join(tempfile.mkdtemp(prefix="rerun_bench_"), "profile.jsonl")
+os.environ.update(LLM_CASSETTE_MODE="replay", RERUN_PROFILE="1", RERUN_PROFILE_PATH=PROFILE_PATH)
+
+REPLY = ("孩子，你说的这些我听明白了一部分，可是这个行业这么新，万一几年后就不行了，你又该怎么办呢？"
+         "我们也不是反对你，只是希望你能过得安稳一些。") * 3
+ANSWER = "我理解你们的担心。我查过这家公司的情况，也想好了备选方案，会先干满两年，同时准备好其他出路。" * 3
+
+
+def make_history(count):
+    from langchain_core.chat_history import InMemoryChatMessageHistory
+
+    history = InMemoryChatMessageHistory()
+    for i in range(count):
+        if i % 2 == 0:
+            history.add_ai_message(f"{REPLY} ({i})")
+        else:
+            history.add_user_message(f"{ANSWER} ({i})")
+    return history
+
+
+def preload(at, mode, count):
+    at.session_state["current_mode"] = mode
+    if mode == "communication":
+        at.session_state["sim_started"] = True
+        at.session_state["debrief_requested"] = False
+        at.session_state["my_choice"] = "游戏策划"
+        at.session_state["family_concern"] = "工作不稳定"
+        at.session_state["chat_history"] = {"communication_session": make_history(count)}
+    elif mode == "curriculum_analysis":
+        at.session_state["curriculum_stage"] = 4
+        at.session_state["chat_history"] = {"curriculum_session": make_history(count)}
+    else:
+        at.session_state["exploration_stage"] = 10
+        at.session_state["chat_history"] = {"exploration_session": make_history(count)}
+
+
+def last_profile():
+    with open(PROFILE_PATH, encoding="utf-8") as f:
+        return json.loads(f.readlines()[-1])
+
+
+def measure(mode, count, window, runs):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["HISTORY_WINDOW"] = str(window)
+    walls, fragment_ms = [], []
+    for _ in range(runs):
+        at = AppTest.from_file(os.path.join(ROOT, "web_test.py"), default_timeout=120)
+        preload(at, mode, count)
+        at.run()  # first run pays imports and cache_resource setup
+        started = time.perf_counter()
+        at.run()
+        walls.append((time.perf_counter() - started) * 1000)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        phases = last_profile()["phases"]
+        outside = sum(phases.get(name, 0.0) for name in ("css", "state_init", "sidebar", "history_render"))
+        fragment_ms.append(max(0.0, walls[-1] - outside))
+    return statistics.median(walls), statistics.median(fragment_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--window", type=int, default=20)
+    parser.add_argument("--sizes", default="50,200")
+    parser.add_argument("--modes", default="communication,exploration,curriculum_analysis")
+    args = parser.parse_args()
+
+    print(f"{'mode':<21}{'messages':>9}{'full ms':>10}{'windowed ms':>13}{'fragment ms':>13}")
+    for mode in args.modes.split(","):
+        for count in (int(n) for n in args.sizes.split(",")):
+            full, _ = measure(mode, count, 10 ** 6, args.runs)
+            windowed, fragment = measure(mode, count, args.window, args.runs)
+            print(f"{mode:<21}{count:>9}{full:>10.0f}{windowed:>13.0f}{fragment:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Page-load timing of web_test.py with each font source.
+
+Starts the app once per APP_FONTS setting and loads the menu page in a
+fresh headless Chromium context each run, so nothing is cached:
+
+    google  the old blocking @import of Google Fonts (Noto Sans SC + Material Symbols)
+    local   the self-hosted subset from static/fonts (run subset_fonts.py first)
+    system  no web font, system font stack only
+
+The network can be throttled to a slow campus link through the Chrome
+DevTools protocol, and fonts.googleapis.com / fonts.gstatic.com can be
+blocked outright (--block-google), as on some campus networks. For each
+setting the script reports the median of:
+
+- fcp:        first contentful paint
+- title:      until the menu title is visible
+- fonts:      until document.fonts.ready resolves
+- font KB:    bytes transferred for font CSS and font files
+
+    pip install playwright && playwright install chromium
+    python benchmarks/bench_page_load.py --runs 5 --down-kbps 2000 --latency-ms 150
+    python benchmarks/bench_page_load.py --block-google
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("google", "local", "system")
+TITLE = "智慧化职业发展辅导系统"
+GOOGLE_HOSTS = ("fonts.googleapis.com", "fonts.gstatic.com")
+
+METRICS_JS = """async () => {
+    await document.fonts.ready;
+    const fontsReady = performance.now();
+    const paint = performance.getEntriesByName("first-contentful-paint")[0];
+    const fontBytes = performance.getEntriesByType("resource")
+        .filter(e => /woff2?|ttf|otf|fonts\\.googleapis/.test(e.name))
+        .reduce((sum, e) => sum + (e.transferSize || e.encodedBodySize || 0), 0);
+    return {fcp: paint ? paint.startTime : null, fonts: fontsReady, font_bytes: fontBytes};
+}"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(mode, port):
+    env = dict(os.environ, APP_FONTS=mode, LLM_PROFILE="stub", LLM_CASSETTE_MODE="off")
+    app = subprocess.Popen([sys.executable, "-m", "streamlit", "run", "web_test.py", "--server.headless", "true",
+                            "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+                           cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2)
+            return app
+        except OSError:
+            time.sleep(0.5)
+    app.terminate()
+    raise RuntimeError(f"streamlit ({mode}) did not start on port {port}")
+
+
+def load_once(browser, url, args):
+    context = browser.new_context()
+    page = context.new_page()
+    if args.block_google:
+        page.route(lambda u: any(host in u for host in GOOGLE_HOSTS), lambda route: route.abort())
+    if args.down_kbps:
+        cdp = context.new_cdp_session(page)
+        cdp.send("Network.enable")
+        cdp.send("Network.emulateNetworkConditions", {
+            "offline": False, "latency": args.latency_ms,
+            "downloadThroughput": args.down_kbps * 1000 / 8, "uploadThroughput": args.down_kbps * 1000 / 8})
+    started = time.perf_counter()
+    page.goto(url, wait_until="commit")
+    page.get_by_text(TITLE).first.wait_for(timeout=120_000)
+    title_ms = (time.perf_counter() - started) * 1000
+    metrics = page.evaluate(METRICS_JS)
+    context.close()
+    return {"title": title_ms, **metrics}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--down-kbps", type=int, default=0, help="throttle to this bandwidth; 0 = unthrottled")
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--block-google", action="store_true", help="fail requests to Google Fonts")
+    args = parser.parse_args()
+
+    from playwright.sync_api import sync_playwright
+
+    if "local" in args.modes and not os.path.exists(os.path.join(ROOT, "static", "fonts", "manifest.json")):
+        print("static/fonts/manifest.json missing: 'local' falls back to system fonts; run subset_fonts.py first.")
+    print(f"{'fonts':<8}{'fcp ms':>9}{'title ms':>10}{'fonts ms':>10}{'font KB':>9}")
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch()
+        for mode in args.modes.split(","):
+            port = free_port()
+            app = start_app(mode, port)
+            try:
+                runs = [load_once(browser, f"http://127.0.0.1:{port}/", args) for _ in range(args.runs)]
+            finally:
+                app.terminate()
+                app.wait(timeout=10)
+            fcp = [r["fcp"] for r in runs if r["fcp"] is not None]
+            print(f"{mode:<8}{statistics.median(fcp) if fcp else float('nan'):>9.0f}"
+                  f"{statistics.median(r['title'] for r in runs):>10.0f}"
+                  f"{statistics.median(r['fonts'] for r in runs):>10.0f}"
+                  f"{statistics.median(r['font_bytes'] for r in runs) / 1024:>9.0f}")
+        browser.close()
+
+
+if __name__ == "__main__":
+    main()
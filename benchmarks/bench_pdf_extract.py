@@ -0,0 +1,223 @@
+"""Throughput, memory and text quality of the pdf_extract backends.
+
+Generates a local corpus of curriculum-style PDFs with a real text layer:
+headings, prose and course tables, written like office exporters do, with
+Identity-H codes and a /ToUnicode map (no font is embedded, so the pages
+are for extraction, not for viewing). On a share of the pages the table
+cells are written column by column, as many table exporters do, so an
+extractor that follows content-stream order jumbles the rows. Each backend
+then runs in its own process, which extracts the whole corpus, and the
+script reports:
+
+- pages/s over the corpus
+- peak RSS of that process (including pdftotext children)
+- chars: share of the ground-truth characters recovered, ignoring order
+- rows:  share of (course, credits) table rows parse_courses reads back,
+         i.e. whether the row structure survived
+
+    python benchmarks/bench_pdf_extract.py --docs 20 --pages 8
+    python benchmarks/bench_pdf_extract.py --reuse --backends pdftotext,pypdf2
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from curriculum_compare import normalize_course, parse_courses  # noqa: E402
+from pdf_extract import BACKENDS, available_backends  # noqa: E402
+
+CORPUS_DIR = os.path.join(ROOT, "benchmarks", "_corpus", "pdf")
+PAGE_W, PAGE_H = 595, 842
+FONT_SIZE = 10
+COLUMNS = (60, 150, 330, 380, 430)  # 课程编号 课程名称 学分 学时 课程类别
+
+SUBJECTS = ["高等数学", "线性代数", "概率论与数理统计", "大学物理", "思想道德与法治", "中国近现代史纲要",
+           "数据结构", "操作系统", "计算机网络", "数据库原理", "软件工程", "编译原理", "人工智能导论",
+           "机器学习", "发展心理学", "咨询心理学", "社会心理学", "管理学原理", "微观经济学", "会计学基础",
+           "市场营销学", "民法总论", "刑法学", "宪法学", "大学体育", "军事理论", "毕业设计", "专业实习",
+           "数字电路", "信号与系统", "自动控制原理", "嵌入式系统", "计算机组成原理", "离散数学", "统计学",
+           "运筹学", "财务管理", "人力资源管理", "组织行为学", "教育心理学"]
+# Each course appears once per document, as in a real plan; the prefixes make enough distinct names.
+COURSES = [prefix + subject for prefix in ("", "应用", "高级", "现代", "专业") for subject in SUBJECTS]
+ROWS_PER_PAGE = 20
+CATEGORIES = ["通识必修", "学科基础", "专业核心", "专业选修"]
+SECTIONS = ["一、培养目标", "二、毕业要求", "三、主干学科", "四、核心课程", "五、课程设置与学分分配"]
+PROSE = ["本专业培养德智体美劳全面发展，具有扎实专业基础和较强实践能力的高素质人才。",
+         "毕业生能够在企事业单位、科研院所从事相关领域的设计、开发、管理与服务工作。",
+         "学生应具备良好的沟通表达能力、团队协作精神以及终身学习的意识。",
+         "本方案总学分为一百六十学分，其中实践教学环节不少于三十学分。"]
+
+
+# --- 語料產生 (不依賴任何 PDF 庫) ---
+def _hex(text):
+    return "<" + text.encode("utf-16-be").hex().upper() + ">"
+
+
+def _text(x, y, text):
+    return f"BT /F1 {FONT_SIZE} Tf {x} {y} Td {_hex(text)} Tj ET"
+
+
+def _stream(data):
+    return f"<< /Length {len(data)} >>\nstream\n".encode("latin-1") + data + b"\nendstream"
+
+
+def to_unicode_cmap(chars):
+    """A /ToUnicode CMap for the 2-byte codes used; each code is the character's UTF-16 value."""
+    codes = sorted({ord(ch) for ch in chars if ord(ch) <= 0xFFFF})
+    lines = ["/CIDInit /ProcSet findresource begin", "12 dict begin", "begincmap",
+             "/CMapName /Bench-UTF16 def", "/CMapType 2 def",
+             "1 begincodespacerange", "<0000> <FFFF>", "endcodespacerange"]
+    for start in range(0, len(codes), 100):
+        chunk = codes[start:start + 100]
+        lines.append(f"{len(chunk)} beginbfchar")
+        lines += [f"<{code:04X}> <{code:04X}>" for code in chunk]
+        lines.append("endbfchar")
+    lines += ["endcmap", "CMapName currentdict /CMap defineresource pop", "end", "end"]
+    return "\n".join(lines).encode("latin-1")
+
+
+def build_pdf(pages, chars):
+    """A minimal PDF; `pages` is a list of content-stream operator lists, `chars` the text they show."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /Identity-H "
+               "/DescendantFonts [4 0 R] /ToUnicode 6 0 R >>",
+               "<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light "
+               "/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 4 >> "
+               "/FontDescriptor 5 0 R /DW 1000 >>",
+               "<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 /FontBBox [-25 -254 1000 880] "
+               "/ItalicAngle 0 /Ascent 880 /Descent -120 /CapHeight 880 /StemV 93 >>",
+               _stream(to_unicode_cmap(chars))]
+    kids = []
+    for ops in pages:
+        objects.append(_stream("\n".join(ops).encode("latin-1")))
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_W} {PAGE_H}] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        body = body if isinstance(body, bytes) else body.encode("latin-1")
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def make_page(rng, names, column_major):
+    """Content operators, ground-truth text and table rows of one page listing `names`."""
+    ops, lines, rows, y = [], [], [], PAGE_H - 70
+    for line in [rng.choice(SECTIONS)] + rng.sample(PROSE, 2):
+        ops.append(_text(COLUMNS[0], y, line))
+        lines.append(line)
+        y -= 22
+    header = ["课程编号", "课程名称", "学分", "学时", "课程类别"]
+    table = [header]
+    for name in names:
+        credits = rng.choice([1, 2, 3, 4, 5])
+        table.append([str(rng.randint(1000000, 9999999)), name, str(credits), str(credits * 16),
+                      rng.choice(CATEGORIES)])
+        rows.append((name, float(credits)))
+    cells = [(c, r) for c in range(len(COLUMNS)) for r in range(len(table))] if column_major else \
+        [(c, r) for r in range(len(table)) for c in range(len(COLUMNS))]
+    for c, r in cells:
+        ops.append(_text(COLUMNS[c], y - 20 * r, table[r][c]))
+    lines += ["  ".join(row) for row in table]
+    return ops, "\n".join(lines), rows
+
+
+def generate_corpus(docs, pages, seed):
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    for old in glob.glob(os.path.join(CORPUS_DIR, "doc_*")):
+        os.remove(old)
+    rng = random.Random(seed)
+    for n in range(docs):
+        names = rng.sample(COURSES, pages * ROWS_PER_PAGE)
+        built = [make_page(rng, names[p * ROWS_PER_PAGE:(p + 1) * ROWS_PER_PAGE], column_major=rng.random() < 0.4)
+                 for p in range(pages)]
+        with open(os.path.join(CORPUS_DIR, f"doc_{n:03d}.pdf"), "wb") as f:
+            f.write(build_pdf([ops for ops, _, _ in built], "".join(text for _, text, _ in built)))
+        with open(os.path.join(CORPUS_DIR, f"doc_{n:03d}.json"), "w", encoding="utf-8") as f:
+            json.dump({"pages": [text for _, text, _ in built], "rows": [r for _, _, rows in built for r in rows]},
+                      f, ensure_ascii=False)
+
+
+# --- 評分 ---
+def char_recall(truth, text):
+    want = Counter(ch for ch in truth if not ch.isspace())
+    got = Counter(ch for ch in text if not ch.isspace())
+    return sum((want & got).values()) / max(sum(want.values()), 1)
+
+
+def row_recall(truth_rows, text):
+    found = {(normalize_course(c.name), c.credits) for c in parse_courses(text)}
+    return sum((normalize_course(name), credits) in found for name, credits in truth_rows) / max(len(truth_rows), 1)
+
+
+def worker(backend):
+    """Extracts the whole corpus with one backend; prints one JSON line."""
+    extract = BACKENDS[backend][1]
+    pages, seconds, chars, rows = 0, 0.0, [], []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "doc_*.pdf"))):
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path[:-4] + ".json", encoding="utf-8") as f:
+            truth = json.load(f)
+        started = time.perf_counter()
+        texts = extract(data)
+        seconds += time.perf_counter() - started
+        pages += len(truth["pages"])
+        text = "\n\n".join(texts)
+        chars.append(char_recall("\n".join(truth["pages"]), text))
+        rows.append(row_recall(truth["rows"], text))
+    # ru_maxrss is in KiB on Linux.
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(json.dumps({"pages": pages, "seconds": seconds, "rss_mb": rss / 1024,
+                      "chars": sum(chars) / len(chars), "rows": sum(rows) / len(rows), "worst_rows": min(rows)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=8,
+                        help=f"pages per document, at most {len(COURSES) // ROWS_PER_PAGE}")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--backends", help="comma-separated; default: every installed backend")
+    parser.add_argument("--reuse", action="store_true", help="reuse an existing corpus instead of regenerating")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker)
+        return
+
+    if not args.reuse:
+        generate_corpus(args.docs, args.pages, args.seed)
+    installed = available_backends()
+    names = args.backends.split(",") if args.backends else list(BACKENDS)
+    print(f"{'backend':<11}{'pages/s':>9}{'peak MB':>9}{'chars':>8}{'rows':>8}{'worst':>8}")
+    for name in names:
+        if name not in installed:
+            print(f"{name:<11}  not installed")
+            continue
+        result = subprocess.run([sys.executable, __file__, "--worker", name], capture_output=True, text=True)
+        if result.returncode:
+            print(f"{name:<11}  failed: {result.stderr.strip().splitlines()[-1]}")
+            continue
+        r = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{name:<11}{r['pages'] / r['seconds']:>9.1f}{r['rss_mb']:>9.1f}{r['chars']:>8.1%}"
+              f"{r['rows']:>8.1%}{r['worst_rows']:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
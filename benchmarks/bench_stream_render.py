@@ -0,0 +1,113 @@
+"""Server-side cost of streaming a long report: per-chunk vs. coalesced rendering.
+
+st.write_stream sends the whole accumulated markdown body to the browser
+every time the stream yields. This replays a synthetic multi-thousand-token
+report (prose, a comparison table and a Mermaid diagram) at a simulated
+token rate and feeds it to a sink that does what the server does per
+yield: rebuild the element with the full body and serialize it (a real
+Streamlit ForwardMsg when streamlit is installed, JSON otherwise).
+
+Reports messages, bytes sent and sink CPU time per report for the current
+path (every chunk) and for stream_render.coalesce_stream.
+
+    python benchmarks/bench_stream_render.py --tokens 4000 --rate 40
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stream_render import coalesce_stream  # noqa: E402
+
+PROSE = "基于你的能力画像与目标地区的产业结构，建议优先关注产业链中游的系统集成与解决方案环节，同时补齐数据分析与项目管理方面的能力短板。"
+
+
+def synthetic_report(tokens, seed):
+    rng = random.Random(seed)
+    parts = ["## 产业链位置分析\n\n"]
+    while sum(len(p) for p in parts) < tokens * 0.6:
+        parts.append(PROSE[rng.randint(0, 20):] + "\n\n")
+    parts.append("```mermaid\ngraph TD\n" + "".join(
+        f'    N{i}["环节{i}<br>说明"] --> N{i + 1}["环节{i + 1}"]\n' for i in range(20)) + "```\n\n")
+    parts.append("| 维度 | Offer A | Offer B |\n|---|---|---|\n" + "".join(
+        f"| 维度{i} | 表现{i}A | 表现{i}B |\n" for i in range(15)) + "\n")
+    while sum(len(p) for p in parts) < tokens:
+        parts.append(PROSE + "\n\n")
+    return "".join(parts)
+
+
+def chunked(text, rate, clock):
+    """Yields 1-3 character chunks, advancing the fake clock at `rate` chunks per second."""
+    rng = random.Random(1)
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 3)
+        clock.now += 1.0 / rate
+        yield text[i:i + n]
+        i += n
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_serializer():
+    try:
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    except ImportError:
+        return "json", lambda body: json.dumps({"delta": {"markdown": {"body": body}}}).encode("utf-8")
+
+    def serialize(body):
+        msg = ForwardMsg()
+        msg.delta.new_element.markdown.body = body
+        return msg.SerializeToString()
+
+    return "protobuf", serialize
+
+
+def run(stream, serialize):
+    body, messages, sent = "", 0, 0
+    started = time.process_time()
+    for piece in stream:
+        body += piece
+        sent += len(serialize(body))
+        messages += 1
+    return messages, sent, time.process_time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--rate", type=float, default=40.0, help="simulated chunks per second")
+    parser.add_argument("--interval", type=float, default=None)
+    parser.add_argument("--max-chars", type=int, default=None)
+    parser.add_argument("--reports", type=int, default=5)
+    args = parser.parse_args()
+
+    kind, serialize = make_serializer()
+    print(f"serializer: {kind}, report: ~{args.tokens} chars, {args.reports} reports per path\n")
+    print(f"{'path':<12}{'msgs/report':>14}{'KB/report':>12}{'CPU ms/report':>16}")
+    for label in ("per-chunk", "coalesced"):
+        totals = [0, 0, 0.0]
+        for n in range(args.reports):
+            clock = FakeClock()
+            stream = chunked(synthetic_report(args.tokens, n), args.rate, clock)
+            if label == "coalesced":
+                stream = coalesce_stream(stream, args.interval, args.max_chars, clock=clock)
+            for i, value in enumerate(run(stream, serialize)):
+                totals[i] += value
+        messages, sent, cpu = (t / args.reports for t in totals)
+        print(f"{label:<12}{messages:>14.0f}{sent / 1024:>12.0f}{cpu * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Load test for api_server.py against a local stand-in model.
+
+Starts an OpenAI-compatible stub (streams canned Chinese text at a fixed
+token rate after a fixed first-token delay) and the API server with N
+workers pointed at it, then runs concurrent virtual users through a mix
+of advisor sessions over SSE:
+
+    decision      1 turn
+    company_info  1 turn
+    communication 2 replies + debrief
+    exploration   3 answer turns (the last one streams two messages) + action
+
+Reports per-turn time to first token and total time (p50/p95/p99),
+turns/s, streamed chars/s and errors.
+
+    python benchmarks/load_test_api.py --users 50 --duration 60 --workers 4
+    python benchmarks/load_test_api.py --target http://127.0.0.1:8000 --users 20   # an already running server
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STUB_TEXT = ("基于你的能力画像与目标地区的产业结构，建议优先关注产业链中游的系统集成与解决方案环节，"
+             "同时补齐数据分析与项目管理方面的能力短板。")
+
+
+# --- 本地替身模型 ---
+def make_stub_app(tokens, rate, first_token_delay):
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    def chunk(model, delta, finish=None):
+        return {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+
+    async def completions(request):
+        body = await request.json()
+        model = body.get("model", "stub")
+        pieces = [(STUB_TEXT * 2)[i % len(STUB_TEXT):i % len(STUB_TEXT) + 2] for i in range(0, tokens * 2, 2)]
+        if not body.get("stream"):
+            await asyncio.sleep(first_token_delay + tokens / rate)
+            return JSONResponse({"id": "stub", "object": "chat.completion", "created": int(time.time()),
+                                 "model": model, "usage": {"prompt_tokens": 0, "completion_tokens": tokens,
+                                                           "total_tokens": tokens},
+                                 "choices": [{"index": 0, "finish_reason": "stop",
+                                              "message": {"role": "assistant",
+                                                          "content": json.dumps({"key_courses": ["课程A"]})}}]})
+
+        async def events():
+            await asyncio.sleep(first_token_delay)
+            yield f"data: {json.dumps(chunk(model, {'role': 'assistant', 'content': ''}))}\n\n"
+            for piece in pieces:
+                await asyncio.sleep(1.0 / rate)
+                yield f"data: {json.dumps(chunk(model, {'content': piece}), ensure_ascii=False)}\n\n"
+            yield f"data: {json.dumps(chunk(model, {}, 'stop'))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"]),
+                             Route("/chat/completions", completions, methods=["POST"])])
+
+
+def serve_stub(args):
+    import uvicorn
+
+    uvicorn.run(make_stub_app(args.stub_tokens, args.stub_rate, args.stub_delay), host="127.0.0.1",
+                port=args.stub_port, log_level="warning")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(client, url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(url)
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+# --- 虛擬使用者 ---
+class Stats:
+    def __init__(self):
+        self.ttft = []
+        self.turn_time = []
+        self.chars = 0
+        self.turns = 0
+        self.sessions = 0
+        self.errors = {}
+        self.pool = None
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+async def run_turn(client, stats, session_id, body):
+    started = time.monotonic()
+    first = None
+    async with client.stream("POST", f"/sessions/{session_id}/turns", json=body) as response:
+        if response.status_code != 200:
+            await response.aread()
+            stats.error(f"http {response.status_code}")
+            return False
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = json.loads(line[6:])
+                if event == "token":
+                    if first is None:
+                        first = time.monotonic() - started
+                    stats.chars += len(data["text"])
+                elif event == "error":
+                    stats.error("stream error")
+                    return False
+                elif event == "done":
+                    stats.turns += 1
+                    stats.turn_time.append(time.monotonic() - started)
+                    if first is not None:
+                        stats.ttft.append(first)
+                    return True
+    stats.error("stream ended without done")
+    return False
+
+
+def scenario(user, n):
+    """Returns (mode, start body, turn bodies); inputs vary so report caches don't short-circuit the model."""
+    tag = f"{user}-{n}"
+    kind = random.Random(tag).choice(["decision", "company_info", "communication", "exploration"])
+    if kind == "decision":
+        return kind, {}, [{"offer_a": f"公司: A科技{tag}\n薪资: 15k", "offer_b": f"公司: B集团{tag}\n薪资: 13k",
+                           "priorities": ["职业成长", "薪资福利"]}]
+    if kind == "company_info":
+        return kind, {}, [{"company_name": f"测试公司{tag}"}]
+    if kind == "communication":
+        return kind, {"my_choice": f"游戏策划{tag}", "family_concern": "工作不稳定"}, [
+            {"input": "我查过了，这家公司很稳定。"}, {"input": "我会先干满两年再看。"}, {"action": "debrief"}]
+    return kind, {}, [{"answers": [f"回答{tag}-{i}" for i in range(count)]} for count in (2, 3, 3)] + [
+        {"input": "联系一位学长"}]
+
+
+async def virtual_user(client, stats, user, deadline):
+    n = 0
+    while time.monotonic() < deadline:
+        mode, start_body, turns = scenario(user, n)
+        n += 1
+        response = await client.post("/sessions", json=dict(start_body, mode=mode))
+        if response.status_code != 201:
+            stats.error(f"create {response.status_code}")
+            continue
+        session_id = response.json()["session_id"]
+        for body in turns:
+            if not await run_turn(client, stats, session_id, body):
+                break
+        else:
+            stats.sessions += 1
+        await client.delete(f"/sessions/{session_id}")
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def drive(args, target):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=target, timeout=httpx.Timeout(300.0), limits=limits) as client:
+        await wait_ready(client, f"{target}/healthz")
+        stats = Stats()
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*(virtual_user(client, stats, u, deadline) for u in range(args.users)))
+        elapsed = time.monotonic() - started
+        stats.pool = (await client.get("/healthz")).json().get("http_pool")
+        return stats, elapsed
+
+
+def report(stats, elapsed, args):
+    print(f"users: {args.users}, workers: {args.workers}, elapsed: {elapsed:.1f}s")
+    print(f"sessions completed: {stats.sessions}, turns: {stats.turns} ({stats.turns / elapsed:.1f}/s), "
+          f"streamed: {stats.chars / elapsed:.0f} chars/s")
+    for label, values in (("time to first token", stats.ttft), ("turn time", stats.turn_time)):
+        print(f"{label:<20} p50 {percentile(values, 0.5) * 1000:>8.0f} ms   p95 {percentile(values, 0.95) * 1000:>8.0f} ms"
+              f"   p99 {percentile(values, 0.99) * 1000:>8.0f} ms")
+    print(f"errors: {stats.errors or 'none'}")
+    pool = stats.pool
+    if pool:
+        print(f"model http pool (one worker): {pool['requests']} requests over {pool['connections']} connections, "
+              f"{pool['tls_handshakes']} TLS handshakes, reuse {pool['reuse_ratio']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--target", help="URL of an already running api_server; skips starting the stub and server")
+    parser.add_argument("--stub-tokens", type=int, default=300, help="tokens per stand-in reply")
+    parser.add_argument("--stub-rate", type=float, default=100.0, help="stand-in tokens per second")
+    parser.add_argument("--stub-delay", type=float, default=0.5, help="stand-in time to first token")
+    parser.add_argument("--stub-port", type=int, default=None)
+    parser.add_argument("--serve-stub", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_stub:
+        serve_stub(args)
+        return
+    if args.target:
+        report(*asyncio.run(drive(args, args.target.rstrip("/"))), args)
+        return
+
+    stub_port, api_port = args.stub_port or free_port(), free_port()
+    stub = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve-stub", "--stub-port", str(stub_port),
+                             "--stub-tokens", str(args.stub_tokens), "--stub-rate", str(args.stub_rate),
+                             "--stub-delay", str(args.stub_delay)])
+    env = dict(os.environ, LLM_PROFILE="local", LLM_LOCAL_BASE_URL=f"http://127.0.0.1:{stub_port}/v1",
+               ADVISOR_SESSION_DIR=tempfile.mkdtemp(prefix="advisor_sessions_"))
+    server = subprocess.Popen([sys.executable, "api_server.py", "--port", str(api_port),
+                               "--workers", str(args.workers)], cwd=ROOT, env=env)
+    try:
+        report(*asyncio.run(drive(args, f"http://127.0.0.1:{api_port}")), args)
+    finally:
+        for process in (server, stub):
+            process.terminate()
+            process.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,13 @@ from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 # --- UPDATED IMPORTS ---
 # We will use the generic ChatOpenAI client which allows specifying a custom API endpoint.
-from langchain_openai import ChatOpenAI
+import sys
 import time
 import textwrap
 # ADDED: Import the dotenv library to load the .env file
 from dotenv import load_dotenv
+from llm_backends import BackendConfigError, create_llm, get_profile
+from llm_cassette import CASSETTE_SPEED, cassette_mode
 
 # ADDED: Load environment variables from the .env file
 load_dotenv()
@@ -107,23 +109,22 @@ def print_formatted(text, prefix="AI: "):
 
 
 def get_llm_instance():
-    """Initializes and returns the LLM instance."""
-    api_key = os.getenv("DEEPSEEK_API_KEY")
-    if not api_key:
+    """Initializes and returns the LLM instance for the active backend profile (LLM_PROFILE)."""
+    if cassette_mode() == "replay":
+        print(f"使用录制的模型回复 (重播模式，速度 x{CASSETTE_SPEED:g})。")
+        return create_llm()
+    try:
+        llm = create_llm()
+    except BackendConfigError as e:
         print("\n" + "─" * 80)
-        print(">>>>> 错误：未找到API密钥! <<<<<")
-        print("\n请确认您的项目文件夹中包含 .env 文件，并且该文件中已设置 DEEPSEEK_API_KEY。")
+        print(">>>>> 错误：模型配置不完整! <<<<<")
+        print(f"\n{e}")
         print("─" * 80 + "\n")
         return None
 
     try:
-        llm = ChatOpenAI(
-            model="deepseek-r1-250528",
-            temperature=0.7,
-            api_key=api_key,
-            base_url="https://ark.cn-beijing.volces.com/api/v3"
-        )
-        print("正在连接火山方舟（VolcEngine Ark）API...")
+        name, profile = get_profile()
+        print(f"正在连接模型服务 ({name}: {profile.get('base_url', '本地模拟')})...")
         llm.invoke("Hello")
         print("连接成功！")
         return llm
@@ -259,7 +260,9 @@ def run_test_case(llm):
                                                 config={"configurable": {"session_id": "test_session"}})
         print_formatted(response.content)
 
-        time.sleep(2)
+        # 重播時不必等待
+        if cassette_mode() != "replay":
+            time.sleep(2)
         current_stage += 1
 
         if current_stage <= len(PROMPTS):
@@ -273,7 +276,9 @@ if __name__ == "__main__":
 
     llm_instance = get_llm_instance()
 
-    if llm_instance:
+    if llm_instance and "--test" in sys.argv[1:]:
+        run_test_case(llm_instance)
+    elif llm_instance:
         while True:
             choice = input("\n请选择运行模式: \n1. 交互模式\n2. 运行自动化测试用例\n\n请输入选项 (1或2): ")
             if choice == '1':
@@ -2,10 +2,11 @@ import os
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_openai import ChatOpenAI
 import time
 import textwrap
 from dotenv import load_dotenv
+from llm_backends import BackendConfigError, create_llm, get_profile
+from llm_cassette import CASSETTE_SPEED, cassette_mode
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -80,6 +81,54 @@ PROMPTS = {
     }
 }
 
+# --- PROMPT DEFINITIONS for the meta prompt and Modes 2-4 ---
+# Plain templates filled with str.format(), shared with the batch CLI and the prompt profiler.
+EXPLORATION_META_PROMPT = """You are a thoughtful and insightful career planning coach. Your goal is to help the user think more deeply about their answers based on a five-stage framework. After the user answers the questions for a stage, provide a brief, insightful comment or a thought-provoking follow-up question that connects their answer to the underlying principles of the framework. Keep your feedback concise (2-3 sentences).
+
+You are currently in Stage {current_stage} of the process. The user is answering the following questions:
+{stage_prompt}
+"""
+
+OFFER_DECISION_PROMPT = """You are an expert career advisor. Your task is to conduct a structured analysis of two job offers for a user.
+
+    Offer A Details: {offer_a_details}
+    Offer B Details: {offer_b_details}
+
+    Please perform the following steps:
+    1.  **Create a Comparison Table**: Generate a clear markdown table comparing the two offers side-by-side. Key comparison dimensions should include (but are not limited to): Company, Position, Salary/Compensation, Location, Career Growth Potential, and Work-Life Balance.
+    2.  **Pros and Cons Analysis**: For each offer, list its main advantages (Pros) and disadvantages (Cons) based on the user's input and general career knowledge.
+    3.  **Recommendation and Key Questions**: Provide a concluding recommendation. Do not make a definitive choice for the user, but suggest which offer might be more suitable based on different priorities (e.g., "If you prioritize immediate financial return, Offer A seems better, but if long-term growth is your goal, Offer B has more potential."). Finally, pose 1-2 key questions to help the user make their final decision.
+
+    Structure your entire response in clear, easy-to-read markdown.
+    """
+
+FAMILY_SIMULATION_PROMPT = """You are an AI role-playing as a user's parent. The user wants to practice a difficult conversation about their career choice.
+
+    **Your Persona**: You are a loving but concerned parent. Your primary concerns stem from what the user has described: '{family_concern}'. You want the best for your child, which to you means stability, security, and a respectable career path. You are skeptical of new or unconventional choices.
+
+    **Your Task**:
+    1.  Start the conversation from the parent's perspective, expressing your concern based on what you know.
+    2.  Listen to the user's responses and react naturally. If they make a good point, you can be partially convinced but still raise other questions. If they are purely emotional, express your worry more strongly.
+    3.  Your goal is NOT to be convinced easily. The goal is to provide a realistic simulation to help the user practice.
+    4.  Keep your responses concise and in character.
+
+    Let's begin the simulation. You will speak first.
+    """
+
+COMPANY_INFO_PROMPT = """You are a professional business analyst AI. Your task is to generate a concise, structured summary of a company based on its name.
+
+    Company Name: {company_name}
+
+    Simulate that you have scraped the company's official website, recent news, and recruitment portals. Generate a report in clear markdown format that includes the following sections:
+
+    1.  **公司简介 (Company Profile)**: A brief overview of the company, its mission, and its industry positioning.
+    2.  **核心产品/业务 (Core Products/Business)**: A list or description of its main products, services, or business units.
+    3.  **近期动态 (Recent Developments)**: Summarize 2-3 recent significant news items, product launches, or strategic shifts.
+    4.  **热招岗位方向 (Hot Recruitment Areas)**: Based on simulated recruitment data, list 3-5 key types of positions the company is likely hiring for (e.g., "后端开发工程师", "产品经理-AI方向", "市场营销专员").
+
+    The information should be plausible and well-structured.
+    """
+
 
 # --- Helper Functions ---
 def print_formatted(text, prefix="AI: "):
@@ -89,23 +138,22 @@ def print_formatted(text, prefix="AI: "):
 
 
 def get_llm_instance():
-    """Initializes and returns the LLM instance."""
-    api_key = os.getenv("DEEPSEEK_API_KEY")
-    if not api_key:
+    """Initializes and returns the LLM instance for the active backend profile (LLM_PROFILE)."""
+    if cassette_mode() == "replay":
+        print(f"使用录制的模型回复 (重播模式，速度 x{CASSETTE_SPEED:g})。")
+        return create_llm()
+    try:
+        llm = create_llm()
+    except BackendConfigError as e:
         print("\n" + "─" * 80)
-        print(">>>>> 错误：未找到API密钥! <<<<<")
-        print("\n请确认您的项目文件夹中包含 .env 文件，并且该文件中已设置 DEEPSEEK_API_KEY。")
+        print(">>>>> 错误：模型配置不完整! <<<<<")
+        print(f"\n{e}")
         print("─" * 80 + "\n")
         return None
 
     try:
-        llm = ChatOpenAI(
-            model="deepseek-r1-250528",
-            temperature=0.7,
-            api_key=api_key,
-            base_url="https://ark.cn-beijing.volces.com/api/v3"
-        )
-        print("正在连接火山方舟（VolcEngine Ark）API...")
+        name, profile = get_profile()
+        print(f"正在连接模型服务 ({name}: {profile.get('base_url', '本地模拟')})...")
         llm.invoke("Hello")
         print("连接成功！")
         return llm
@@ -139,11 +187,8 @@ def run_exploration_mode(llm):
         else:
             final_system_prompt = system_prompt
 
-        meta_prompt = f"""You are a thoughtful and insightful career planning coach. Your goal is to help the user think more deeply about their answers based on a five-stage framework. After the user answers the questions for a stage, provide a brief, insightful comment or a thought-provoking follow-up question that connects their answer to the underlying principles of the framework. Keep your feedback concise (2-3 sentences).
-
-You are currently in Stage {current_stage} of the process. The user is answering the following questions:
-{final_system_prompt}
-"""
+        meta_prompt = EXPLORATION_META_PROMPT.format(current_stage=current_stage,
+                                                     stage_prompt=final_system_prompt)
         prompt = ChatPromptTemplate.from_messages(
             [("system", meta_prompt), MessagesPlaceholder(variable_name="history"), ("human", "{input}")])
         chain = RunnableWithMessageHistory(prompt | llm, get_session_history, input_messages_key="input",
@@ -191,18 +236,7 @@ def run_decision_support_mode(llm):
 
     print("\n[AI正在为您生成对比分析报告，请稍候...]")
 
-    prompt_text = f"""You are an expert career advisor. Your task is to conduct a structured analysis of two job offers for a user.
-
-    Offer A Details: {offer_a_details}
-    Offer B Details: {offer_b_details}
-
-    Please perform the following steps:
-    1.  **Create a Comparison Table**: Generate a clear markdown table comparing the two offers side-by-side. Key comparison dimensions should include (but are not limited to): Company, Position, Salary/Compensation, Location, Career Growth Potential, and Work-Life Balance.
-    2.  **Pros and Cons Analysis**: For each offer, list its main advantages (Pros) and disadvantages (Cons) based on the user's input and general career knowledge.
-    3.  **Recommendation and Key Questions**: Provide a concluding recommendation. Do not make a definitive choice for the user, but suggest which offer might be more suitable based on different priorities (e.g., "If you prioritize immediate financial return, Offer A seems better, but if long-term growth is your goal, Offer B has more potential."). Finally, pose 1-2 key questions to help the user make their final decision.
-
-    Structure your entire response in clear, easy-to-read markdown.
-    """
+    prompt_text = OFFER_DECISION_PROMPT.format(offer_a_details=offer_a_details, offer_b_details=offer_b_details)
     prompt = ChatPromptTemplate.from_messages([("human", prompt_text)])
     chain = prompt | llm
     response = chain.invoke({})
@@ -222,18 +256,7 @@ def run_communication_simulation_mode(llm):
     my_choice = input("🗣️ 首先，请告诉我你想要和家人沟通的职业选择是什么？\n")
     family_concern = input("\n🤔 你认为他们主要的担忧会是什么？(例如：工作不稳定、不是铁饭碗、离家太远等)\n")
 
-    meta_prompt = f"""You are an AI role-playing as a user's parent. The user wants to practice a difficult conversation about their career choice.
-
-    **Your Persona**: You are a loving but concerned parent. Your primary concerns stem from what the user has described: '{family_concern}'. You want the best for your child, which to you means stability, security, and a respectable career path. You are skeptical of new or unconventional choices.
-
-    **Your Task**:
-    1.  Start the conversation from the parent's perspective, expressing your concern based on what you know.
-    2.  Listen to the user's responses and react naturally. If they make a good point, you can be partially convinced but still raise other questions. If they are purely emotional, express your worry more strongly.
-    3.  Your goal is NOT to be convinced easily. The goal is to provide a realistic simulation to help the user practice.
-    4.  Keep your responses concise and in character.
-
-    Let's begin the simulation. You will speak first.
-    """
+    meta_prompt = FAMILY_SIMULATION_PROMPT.format(family_concern=family_concern)
 
     store = {}
 
@@ -281,19 +304,7 @@ def run_company_info_mode(llm):
 
     print(f"\n[正在模拟抓取 {company_name} 的相关信息并生成报告...]")
 
-    prompt_text = f"""You are a professional business analyst AI. Your task is to generate a concise, structured summary of a company based on its name.
-
-    Company Name: {company_name}
-
-    Simulate that you have scraped the company's official website, recent news, and recruitment portals. Generate a report in clear markdown format that includes the following sections:
-
-    1.  **公司简介 (Company Profile)**: A brief overview of the company, its mission, and its industry positioning.
-    2.  **核心产品/业务 (Core Products/Business)**: A list or description of its main products, services, or business units.
-    3.  **近期动态 (Recent Developments)**: Summarize 2-3 recent significant news items, product launches, or strategic shifts.
-    4.  **热招岗位方向 (Hot Recruitment Areas)**: Based on simulated recruitment data, list 3-5 key types of positions the company is likely hiring for (e.g., "后端开发工程师", "产品经理-AI方向", "市场营销专员").
-
-    The information should be plausible and well-structured.
-    """
+    prompt_text = COMPANY_INFO_PROMPT.format(company_name=company_name)
 
     prompt = ChatPromptTemplate.from_messages([("human", prompt_text)])
     chain = prompt | llm
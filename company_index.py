@@ -0,0 +1,227 @@
+import csv
+import os
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+from functools import lru_cache
+
+# --- 公司名稱索引 ---
+# Maps what people type ("字节", "ByteDance", "zjtd") to one canonical
+# company, so each company gets one report key instead of one per spelling.
+# Each name, alias and pinyin form is normalized into a key. The keys sit
+# in one sorted list, so a prefix lookup is two bisects plus a short scan,
+# which stays well under a millisecond for 100k companies.
+# COMPANY_INDEX_PATH points to a larger CSV (id,name,aliases,pinyin). When
+# pypinyin is installed it adds pinyin keys for names that have none.
+
+COMPANY_INDEX_PATH = os.getenv("COMPANY_INDEX_PATH", "")
+DEFAULT_LIMIT = 8
+# How many matching keys a prefix lookup looks at before ranking; keeps one-letter prefixes cheap.
+SCAN_LIMIT = 200
+
+_SUFFIXES = ("股份有限公司", "有限责任公司", "有限公司", "集团", "控股", "公司")
+_LATIN_SUFFIX = re.compile(r"[\s,.]+(co\.?,?\s*ltd|ltd|limited|inc|corp|corporation|group|holdings)\.?$")
+_PUNCT = re.compile(r"[\s\W_]+", re.UNICODE)
+_REGION = re.compile(r"[(（](中国|北京|上海|深圳|杭州|广州)[)）]")
+
+Company = namedtuple("Company", ["id", "name", "aliases"])
+
+# id, name, aliases (| separated), pinyin of the name (syllables separated by spaces)
+SEED_COMPANIES = (
+    ("bytedance", "字节跳动", "字节|ByteDance|抖音集团|TikTok|今日头条", "zi jie tiao dong"),
+    ("tencent", "腾讯", "腾讯科技|Tencent|鹅厂|微信", "teng xun"),
+    ("alibaba", "阿里巴巴", "阿里|Alibaba|淘天集团|阿里云", "a li ba ba"),
+    ("baidu", "百度", "Baidu|百度在线", "bai du"),
+    ("meituan", "美团", "Meituan|美团点评|大众点评", "mei tuan"),
+    ("jd", "京东", "JD|京东集团|JD.com", "jing dong"),
+    ("pdd", "拼多多", "PDD|Temu|拼多多控股", "pin duo duo"),
+    ("netease", "网易", "NetEase|网易游戏|网易有道", "wang yi"),
+    ("kuaishou", "快手", "Kuaishou|快手科技", "kuai shou"),
+    ("xiaomi", "小米", "Xiaomi|小米科技|MI", "xiao mi"),
+    ("huawei", "华为", "Huawei|华为技术", "hua wei"),
+    ("honor", "荣耀", "Honor|荣耀终端", "rong yao"),
+    ("didi", "滴滴出行", "滴滴|DiDi|小桔科技", "di di chu xing"),
+    ("bilibili", "哔哩哔哩", "B站|bilibili|B站弹幕网", "bi li bi li"),
+    ("xiaohongshu", "小红书", "RED|行吟信息", "xiao hong shu"),
+    ("ctrip", "携程", "携程旅行|Trip.com|Ctrip", "xie cheng"),
+    ("byd", "比亚迪", "BYD|比亚迪汽车", "bi ya di"),
+    ("catl", "宁德时代", "CATL|宁德时代新能源", "ning de shi dai"),
+    ("nio", "蔚来", "NIO|蔚来汽车", "wei lai"),
+    ("xpeng", "小鹏汽车", "小鹏|XPeng", "xiao peng qi che"),
+    ("li_auto", "理想汽车", "理想|Li Auto", "li xiang qi che"),
+    ("dji", "大疆创新", "大疆|DJI", "da jiang chuang xin"),
+    ("mihoyo", "米哈游", "miHoYo|HoYoverse", "mi ha you"),
+    ("sensetime", "商汤科技", "商汤|SenseTime", "shang tang ke ji"),
+    ("iflytek", "科大讯飞", "讯飞|iFLYTEK", "ke da xun fei"),
+    ("hikvision", "海康威视", "海康|Hikvision", "hai kang wei shi"),
+    ("zte", "中兴通讯", "中兴|ZTE", "zhong xing tong xun"),
+    ("lenovo", "联想", "联想集团|Lenovo", "lian xiang"),
+    ("oppo", "OPPO", "欧珀", "ou po"),
+    ("vivo", "vivo", "维沃移动", "wei wo"),
+    ("ant_group", "蚂蚁集团", "蚂蚁金服|Ant Group|支付宝", "ma yi ji tuan"),
+    ("shein", "希音", "SHEIN", "xi yin"),
+    ("anta", "安踏体育", "安踏|ANTA", "an ta ti yu"),
+    ("moutai", "贵州茅台", "茅台|Kweichow Moutai", "gui zhou mao tai"),
+    ("haier", "海尔智家", "海尔|Haier", "hai er zhi jia"),
+    ("midea", "美的集团", "美的|Midea", "mei di ji tuan"),
+    ("gree", "格力电器", "格力|Gree", "ge li dian qi"),
+    ("sf_express", "顺丰速运", "顺丰|SF Express|顺丰控股", "shun feng su yun"),
+    ("icbc", "中国工商银行", "工商银行|工行|ICBC", "zhong guo gong shang yin hang"),
+    ("ccb", "中国建设银行", "建设银行|建行|CCB", "zhong guo jian she yin hang"),
+    ("boc", "中国银行", "中行|Bank of China", "zhong guo yin hang"),
+    ("abc", "中国农业银行", "农业银行|农行|ABC", "zhong guo nong ye yin hang"),
+    ("cmb", "招商银行", "招行|CMB", "zhao shang yin hang"),
+    ("ping_an", "中国平安", "平安|平安集团|Ping An", "zhong guo ping an"),
+    ("cicc", "中国国际金融", "中金|中金公司|CICC", "zhong guo guo ji jin rong"),
+    ("citic_sec", "中信证券", "中信|CITIC Securities", "zhong xin zheng quan"),
+    ("china_mobile", "中国移动", "移动|China Mobile", "zhong guo yi dong"),
+    ("china_telecom", "中国电信", "电信|China Telecom", "zhong guo dian xin"),
+    ("china_unicom", "中国联通", "联通|China Unicom", "zhong guo lian tong"),
+    ("state_grid", "国家电网", "国网|State Grid", "guo jia dian wang"),
+    ("sinopec", "中国石化", "中石化|Sinopec", "zhong guo shi hua"),
+    ("petrochina", "中国石油", "中石油|PetroChina|CNPC", "zhong guo shi you"),
+    ("comac", "中国商飞", "商飞|COMAC", "zhong guo shang fei"),
+    ("microsoft", "微软", "Microsoft|微软中国|MSRA", "wei ruan"),
+    ("google", "谷歌", "Google|Alphabet", "gu ge"),
+    ("apple", "苹果", "Apple|苹果公司", "ping guo"),
+    ("amazon", "亚马逊", "Amazon|AWS", "ya ma xun"),
+    ("tesla", "特斯拉", "Tesla", "te si la"),
+    ("pg", "宝洁", "P&G|Procter & Gamble", "bao jie"),
+    ("unilever", "联合利华", "Unilever", "lian he li hua"),
+    ("loreal", "欧莱雅", "L'Oréal|Loreal", "ou lai ya"),
+    ("mckinsey", "麦肯锡", "McKinsey", "mai ken xi"),
+    ("pwc", "普华永道", "PwC|PricewaterhouseCoopers", "pu hua yong dao"),
+    ("deloitte", "德勤", "Deloitte", "de qin"),
+    ("ey", "安永", "EY|Ernst & Young", "an yong"),
+    ("kpmg", "毕马威", "KPMG", "bi ma wei"),
+)
+
+
+def normalize(text):
+    """Folds width and case and drops punctuation, region tags and company-form suffixes."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _LATIN_SUFFIX.sub("", _REGION.sub("", text).strip())
+    text = _PUNCT.sub("", text)
+    stripped = True
+    while stripped:
+        # "美的集团股份有限公司" takes two passes.
+        stripped = False
+        for suffix in _SUFFIXES:
+            if text.endswith(suffix) and len(text) > len(suffix):
+                text, stripped = text[:-len(suffix)], True
+                break
+    return text
+
+
+def _pinyin_forms(name, pinyin):
+    if not pinyin:
+        try:
+            from pypinyin import lazy_pinyin
+        except ImportError:
+            return ()
+        if not any("一" <= ch <= "鿿" for ch in name):
+            return ()
+        syllables = lazy_pinyin(name)
+    else:
+        syllables = pinyin.split()
+    return ("".join(syllables), "".join(s[0] for s in syllables if s))
+
+
+class CompanyIndex:
+    """Prefix autocomplete and alias resolution over a sorted key list."""
+
+    def __init__(self):
+        self._companies = {}
+        self._rank = {}
+        self._entries = []
+        self._keys = []
+        self._exact = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def add(self, company_id, name, aliases=(), pinyin=None):
+        company = Company(company_id, name, tuple(a for a in aliases if a))
+        self._companies[company_id] = company
+        self._rank.setdefault(company_id, len(self._rank))
+        keys = [normalize(name)] + [normalize(a) for a in company.aliases]
+        for key in keys:
+            # Names and aliases resolve exactly; pinyin forms are for autocomplete only.
+            if key:
+                self._exact.setdefault(key, company_id)
+        keys += _pinyin_forms(name, pinyin)
+        for key in dict.fromkeys(k for k in keys if k):
+            self._entries.append((key, company_id))
+        self._dirty = True
+        return company
+
+    def _build(self):
+        with self._lock:
+            if self._dirty:
+                self._entries.sort()
+                self._keys = [key for key, _ in self._entries]
+                self._dirty = False
+
+    def __len__(self):
+        return len(self._companies)
+
+    def get(self, company_id):
+        return self._companies.get(company_id)
+
+    def resolve(self, text):
+        """The company whose name or alias matches `text` exactly after normalization, or None."""
+        company_id = self._exact.get(normalize(text))
+        return self._companies[company_id] if company_id else None
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT):
+        """Up to `limit` companies with a name, alias or pinyin key starting with `prefix`."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        if self._dirty:
+            self._build()
+        start = bisect_left(self._keys, prefix)
+        end = min(bisect_left(self._keys, prefix + "\U0010ffff", lo=start), start + SCAN_LIMIT)
+        best = {}
+        for key, company_id in self._entries[start:end]:
+            # Exact key first, then shorter keys (closer matches), then the list order.
+            score = (key != prefix, len(key), self._rank[company_id])
+            if company_id not in best or score < best[company_id]:
+                best[company_id] = score
+        ranked = sorted(best, key=best.get)[:limit]
+        return [self._companies[company_id] for company_id in ranked]
+
+
+def _split_aliases(value):
+    return [a.strip() for a in (value or "").split("|") if a.strip()]
+
+
+def load_csv(index, path):
+    """Adds every row of an id,name,aliases,pinyin CSV file to `index`."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            name = (row.get("name") or "").strip()
+            if name:
+                index.add((row.get("id") or "").strip() or normalize(name), name,
+                          _split_aliases(row.get("aliases")), (row.get("pinyin") or "").strip() or None)
+    return index
+
+
+@lru_cache(maxsize=1)
+def get_company_index():
+    index = CompanyIndex()
+    for company_id, name, aliases, pinyin in SEED_COMPANIES:
+        index.add(company_id, name, _split_aliases(aliases), pinyin)
+    if COMPANY_INDEX_PATH and os.path.exists(COMPANY_INDEX_PATH):
+        load_csv(index, COMPANY_INDEX_PATH)
+    index._build()
+    return index
+
+
+def canonical_company(text):
+    """(report key part, display name) for a typed company name; unknown names key on their normalized form."""
+    company = get_company_index().resolve(text)
+    if company is not None:
+        return f"id:{company.id}", company.name
+    return f"name:{normalize(text) or text.strip()}", text.strip()
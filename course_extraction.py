@@ -0,0 +1,195 @@
+import json
+import re
+
+# --- 核心課程清單的結構化擷取 ---
+# The stage-2 curriculum answer ends with a ```json block holding the key
+# courses. It is parsed while the answer streams and hidden from the prose;
+# when it is missing or broken, cheaper local fallbacks and a list-only
+# retry are tried before anyone has to regenerate the whole answer.
+
+KEY_COURSES_FIELD = "key_courses"
+KEY_COURSES_INSTRUCTION = f"""**核心课程列表 (结构化输出，程序读取)**: 在回答的最末尾，另起一行输出一个 `json` 代码块，只包含所有被你识别为“核心专业课”（即淡蓝色节点）的课程名称，格式必须为:
+    ```json
+    {{{{"{KEY_COURSES_FIELD}": ["课程A", "课程B", "课程C"]}}}}
+    ```
+    该代码块之后不要再输出任何内容。"""
+
+LEGACY_HEADING = "### 核心课程列表"
+KEY_FILL_COLOR = "#D1E8FF"
+
+_JSON_FENCE_OPEN = re.compile(r"^\s*```\s*json\s*$", re.IGNORECASE)
+_FENCE_CLOSE = re.compile(r"^\s*```\s*$")
+_JSON_BLOCK = re.compile(r"```\s*json\s*\n(.*?)(?:\n\s*```|\Z)", re.DOTALL | re.IGNORECASE)
+_STYLE_LINE = re.compile(r"^\s*style\s+(\w+)\s+.*?fill\s*:\s*(#[0-9A-Fa-f]{3,6})", re.MULTILINE)
+_NODE_LABEL = r"\b{node}\s*[\[\(\{{]+\s*(?:\"([^\"]+)\"|([^\]\)\}}]+))"
+
+REPAIR_PROMPT = """以下是一份学习路径规划回答。请从中找出所有被标注为“核心专业课”的课程名称。
+只输出一个 JSON 对象，格式为 {{"key_courses": ["课程A", "课程B"]}}，不要输出任何其他内容。
+
+回答内容:
+{answer}"""
+
+
+def _clean_courses(items):
+    courses = []
+    for item in items:
+        name = str(item).strip().strip("-*•").strip().strip("\"'“”")
+        if name and name not in courses:
+            courses.append(name)
+    return courses
+
+
+def _close_truncated(text):
+    """Closes an open string, then the brackets still open, in order; a cut-off reply ends mid-list."""
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append("]" if char == "[" else "}")
+        elif char in "]}" and stack:
+            stack.pop()
+    if in_string:
+        text += "\\" if escaped else ""
+        text += '"'
+    elif stack:
+        text = text.rstrip(",: \n")
+    return text + "".join(reversed(stack))
+
+
+def repair_json(raw):
+    """Parses a key-course payload, fixing the usual model slips (smart quotes, trailing commas, truncation)."""
+    text = raw.strip()
+    candidates = [text]
+    fixed = text.replace("“", '"').replace("”", '"').replace("‘", "'").replace("’", "'")
+    fixed = re.sub(r",\s*([\]}])", r"\1", fixed)
+    if "'" in fixed and '"' not in fixed:
+        fixed = fixed.replace("'", '"')
+    candidates.append(_close_truncated(fixed))
+    for candidate in candidates:
+        try:
+            payload = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(payload, dict):
+            payload = payload.get(KEY_COURSES_FIELD)
+        if isinstance(payload, list):
+            courses = _clean_courses(payload)
+            if courses:
+                return courses
+    return None
+
+
+def courses_from_heading(text):
+    """Legacy path: the bullet list under a "### 核心课程列表" heading."""
+    if LEGACY_HEADING not in text:
+        return None
+    content_after_heading = text.split(LEGACY_HEADING, 1)[1]
+    matches = re.findall(r"^\s*[-*]\s+(.*)", content_after_heading, re.MULTILINE)
+    return _clean_courses(matches) or None
+
+
+def courses_from_mermaid(text, fill=KEY_FILL_COLOR):
+    """Reads the core-course nodes back from the diagram's `style ... fill:#D1E8FF` lines."""
+    nodes = [node for node, color in _STYLE_LINE.findall(text) if color.upper() == fill.upper()]
+    labels = []
+    for node in nodes:
+        match = re.search(_NODE_LABEL.format(node=re.escape(node)), text)
+        if match:
+            labels.append(re.split(r"<br\s*/?>", match.group(1) or match.group(2))[0])
+    return _clean_courses(labels) or None
+
+
+def extract_key_courses(text):
+    """Tries every local source in order of reliability and returns the course list or None."""
+    match = _JSON_BLOCK.search(text)
+    if match:
+        courses = repair_json(match.group(1))
+        if courses:
+            return courses
+    return courses_from_heading(text) or courses_from_mermaid(text)
+
+
+def request_key_courses(llm, answer):
+    """Asks the model for the list alone, in JSON mode, from the already generated answer."""
+    from langchain_core.prompts import ChatPromptTemplate
+
+    chain = ChatPromptTemplate.from_template(REPAIR_PROMPT) | llm.bind(response_format={"type": "json_object"})
+    response = chain.invoke({"answer": answer})
+    return repair_json(response.content)
+
+
+class KeyCourseStreamParser:
+    """Splits a streamed answer into displayed prose and the hidden ```json key-course block."""
+
+    def __init__(self):
+        self.courses = None
+        self.raw_block = None
+        self._pending = ""
+        self._block_lines = None
+        self._display = []
+        self._line_start = True
+
+    @property
+    def display_text(self):
+        return "".join(self._display)
+
+    def _consume_line(self, line):
+        stripped = line.rstrip("\n")
+        line_start, self._line_start = self._line_start, line.endswith("\n")
+        if self._block_lines is None:
+            if line_start and _JSON_FENCE_OPEN.match(stripped):
+                self._block_lines = []
+                return ""
+            self._display.append(line)
+            return line
+        if _FENCE_CLOSE.match(stripped):
+            self._close_block()
+        else:
+            self._block_lines.append(stripped)
+        return ""
+
+    def _close_block(self):
+        self.raw_block = "\n".join(self._block_lines)
+        self._block_lines = None
+        self.courses = repair_json(self.raw_block) or self.courses
+
+    def feed(self, chunk):
+        """Takes a chunk of model output and returns the part of it that is safe to display."""
+        self._pending += chunk
+        out = []
+        while "\n" in self._pending:
+            line, self._pending = self._pending.split("\n", 1)
+            out.append(self._consume_line(line + "\n"))
+        # A partial line can be shown right away unless it may still turn into the json fence.
+        if self._block_lines is None and self._pending and "`" not in self._pending:
+            self._display.append(self._pending)
+            out.append(self._pending)
+            self._pending = ""
+            self._line_start = False
+        return "".join(out)
+
+    def close(self):
+        out = ""
+        if self._pending:
+            out = self._consume_line(self._pending)
+            self._pending = ""
+        if self._block_lines is not None:
+            self._close_block()
+        return out
+
+    def wrap(self, chunks):
+        for chunk in chunks:
+            text = self.feed(getattr(chunk, "content", chunk))
+            if text:
+                yield text
+        tail = self.close()
+        if tail:
+            yield tail
@@ -0,0 +1,216 @@
+import re
+import unicodedata
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+
+from pdf_extract import extract_pdf_text
+
+# --- 多份培養方案對比 ---
+# Double-major and transfer students compare two or three curricula. All
+# uploads are extracted in parallel. Each document's course table is
+# parsed locally into (name, credits, category) rows, courses are aligned
+# across the documents by normalized name with a fuzzy fallback, and
+# overlap, credit totals and unique core courses are computed without the
+# model. The model only gets format_comparison()'s compact diff, never the
+# full documents.
+
+MAX_DOCUMENTS = 3
+MAX_WORKERS = 3
+FUZZY_THRESHOLD = 0.85
+MAX_LISTED = 25  # courses per list in the prompt; the rest are counted
+
+Course = namedtuple("Course", ["name", "credits", "category"])
+
+_COURSE_LINE = re.compile(
+    r"(?:^|\s)(?:[A-Za-z]{0,4}\d{4,10}[A-Za-z]?\s+)?"
+    r"(?P<name>[一-鿿][一-鿿A-Za-z0-9()（）ⅠⅡⅢⅣⅤ·\-+＋&、]{1,30})\s+"
+    r"(?P<numbers>\d{1,3}(?:\.\d{1,2})?(?:\s+\d{1,3}(?:\.\d{1,2})?)*)(?=\s|$)")
+# Header cells of the numeric columns after the course name; their order says which number is the credits.
+_NUMBER_HEADERS = ("学分", "学时", "时数", "周数", "学期", "理论", "实践", "实验", "上机")
+_CORE_WORDS = ("核心", "必修", "学科基础", "专业基础", "主干")
+_ELECTIVE_WORDS = ("选修", "任选", "限选")
+_GENERAL_WORDS = ("通识", "公共基础", "公共必修", "思想政治", "大学英语", "体育")
+_PAREN_NUMBERS = {"一": "1", "二": "2", "三": "3", "四": "4", "I": "1", "II": "2", "III": "3", "IV": "4"}
+_NOT_COURSES = ("学分", "学时", "合计", "总计", "小计", "学期", "课程名称", "课程类别", "周数")
+_SEQUENCE = re.compile(r"\((\w{1,3})\)$|(?<=[一-鿿])([a-z])$")
+
+
+# --- 文字擷取 (並行) ---
+def extract_text(data, file_name, load_tesseract=None):
+    """Text of one uploaded PDF or TXT file, with the OCR fallback for scanned PDFs when a loader is given."""
+    if not file_name.lower().endswith(".pdf"):
+        return data.decode("utf-8", errors="ignore")
+    text = extract_pdf_text(data)
+    if text.strip() or load_tesseract is None:
+        return text
+    from pdf2image import convert_from_bytes
+    from ocr_preprocess import OCR_RENDER_DPI, ocr_pages
+
+    tesseract = load_tesseract()
+    images = convert_from_bytes(data, dpi=OCR_RENDER_DPI, grayscale=True)
+    return "\n\n--- Page Break ---\n\n".join(text for text, _ in ocr_pages(images, tesseract))
+
+
+def extract_all(files, load_tesseract=None, max_workers=MAX_WORKERS):
+    """Extracts [(file_name, bytes), ...] concurrently; returns the texts in upload order.
+
+    Tesseract and poppler run as subprocesses, so threads overlap the slow OCR pages of different files.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files))),
+                            thread_name_prefix="curriculum-extract") as pool:
+        futures = [pool.submit(extract_text, data, name, load_tesseract) for name, data in files]
+        return [future.result() for future in futures]
+
+
+# --- 課程解析 ---
+def normalize_course(name):
+    """Folds width, spaces and the usual (一)/(1)/(Ⅰ)/Ⅰ/1 spellings, so the same course matches across schools."""
+    # NFKC turns Ⅱ into "II", so the Roman numerals are matched in their ASCII form
+    name = unicodedata.normalize("NFKC", name).replace(" ", "")
+    name = re.sub(r"\((一|二|三|四|IV|I{1,3})\)", lambda m: f"({_PAREN_NUMBERS[m.group(1)]})", name)
+    name = re.sub(r"(?<=[一-鿿])(IV|I{1,3}|\d)$", lambda m: f"({_PAREN_NUMBERS.get(m.group(1), m.group(1))})", name)
+    return name.lower()
+
+
+def _sequence(key):
+    """The trailing part number or level of a normalized name: "1" in 高等数学(1), "b" in 高等数学b; else None."""
+    match = _SEQUENCE.search(key)
+    return match.group(1) or match.group(2) if match else None
+
+
+def _category(text, current):
+    if any(word in text for word in _ELECTIVE_WORDS):
+        return "elective"
+    if any(word in text for word in _CORE_WORDS):
+        return "core"
+    if any(word in text for word in _GENERAL_WORDS):
+        return "general"
+    return current
+
+
+def _credit_column(header):
+    """Which of the numbers after the course name is the credits, from a header row such as
+    "课程名称 学时 学分"; None when the line is not a header with a credits column."""
+    cells = [cell for cell in header.split() if any(word in cell for word in _NUMBER_HEADERS)]
+    # "专业核心课程(共32学分)" is a section heading, not a header row
+    if "名称" not in header and len(cells) < 2:
+        return None
+    return next((i for i, cell in enumerate(cells) if "学分" in cell), None)
+
+
+def parse_courses(text):
+    """Course rows found in the extracted text; a section heading sets the category of the rows after it,
+    a header row the column the credits are read from (the first number after the name by default)."""
+    courses, seen, section, column = [], set(), "other", 0
+    for line in text.splitlines():
+        line = unicodedata.normalize("NFKC", line).strip()
+        if not line:
+            continue
+        match = _COURSE_LINE.search(line)
+        if match is None:
+            header = _credit_column(line)
+            if header is not None:
+                column = header
+            # A heading such as "三、专业核心课程" applies to the table that follows.
+            elif len(line) <= 30:
+                section = _category(line, section)
+            continue
+        numbers = match.group("numbers").split()
+        if column >= len(numbers):
+            continue
+        name, credits = match.group("name"), float(numbers[column])
+        if any(word in name for word in _NOT_COURSES) or not 0 < credits <= 20:
+            continue
+        key = normalize_course(name)
+        if key in seen:
+            continue
+        seen.add(key)
+        rest = line[:match.start("name")] + line[match.end("numbers"):]
+        courses.append(Course(name, credits, _category(rest, section)))
+    return courses
+
+
+# --- 對齊與比較 ---
+def align(course_lists):
+    """Groups courses across documents; returns [{doc_index: Course}] with one entry per distinct course."""
+    groups, by_key = [], {}
+    for doc, courses in enumerate(course_lists):
+        unmatched = []
+        for course in courses:
+            key = normalize_course(course.name)
+            group = by_key.get(key)
+            if group is not None and doc not in group:
+                group[doc] = course
+            else:
+                unmatched.append((key, course))
+        for key, course in unmatched:
+            best, best_ratio = None, FUZZY_THRESHOLD
+            for other_key, group in by_key.items():
+                # 高等数学(1) 与 高等数学(2) 字面极相似，却是两门课；序号不同时不做模糊匹配
+                if doc in group or _sequence(key) != _sequence(other_key):
+                    continue
+                ratio = SequenceMatcher(None, key, other_key).ratio()
+                if ratio >= best_ratio:
+                    best, best_ratio = group, ratio
+            if best is None:
+                best = {}
+                groups.append(best)
+                by_key[key] = best
+            best[doc] = course
+    return groups
+
+
+def compare(named_texts):
+    """Local comparison of [(label, text), ...]: totals, overlap and unique core courses per document."""
+    labels = [label for label, _ in named_texts]
+    course_lists = [parse_courses(text) for _, text in named_texts]
+    groups = align(course_lists)
+    count = len(labels)
+    documents = []
+    for doc, courses in enumerate(course_lists):
+        unique = [g[doc] for g in groups if list(g) == [doc]]
+        documents.append({
+            "label": labels[doc], "courses": len(courses),
+            "credits": round(sum(c.credits for c in courses), 1),
+            "core_credits": round(sum(c.credits for c in courses if c.category == "core"), 1),
+            "unique_core": [c.name for c in unique if c.category == "core"],
+            "unique_other": [c.name for c in unique if c.category != "core"],
+        })
+    shared = [g for g in groups if len(g) == count]
+    pairwise = {}
+    for a in range(count):
+        for b in range(a + 1, count):
+            both = [g for g in groups if a in g and b in g]
+            pairwise[f"{labels[a]} ∩ {labels[b]}"] = {
+                "courses": len(both), "credits": round(sum(g[b].credits for g in both), 1),
+                # Credits already earned in A that count toward B.
+                "share_of_b": round(sum(g[b].credits for g in both) / documents[b]["credits"], 3)
+                if documents[b]["credits"] else None}
+    credit_gaps = [{"course": g[0].name, "credits": [g[d].credits for d in range(count)]}
+                   for g in shared if len({g[d].credits for d in range(count)}) > 1]
+    return {"labels": labels, "documents": documents, "shared": [g[0].name for g in shared],
+            "pairwise": pairwise, "credit_gaps": credit_gaps}
+
+
+def _listed(names):
+    shown = "、".join(names[:MAX_LISTED]) or "无"
+    return shown + (f" 等 {len(names)} 门" if len(names) > MAX_LISTED else "")
+
+
+def format_comparison(result):
+    """The compact diff the model receives instead of the full documents."""
+    lines = []
+    for doc in result["documents"]:
+        lines.append(f"【{doc['label']}】课程 {doc['courses']} 门，总学分 {doc['credits']}，核心/必修学分 {doc['core_credits']}")
+        lines.append(f"  独有核心课: {_listed(doc['unique_core'])}")
+        lines.append(f"  独有其他课: {_listed(doc['unique_other'])}")
+    lines.append(f"共同课程 ({len(result['shared'])} 门): {_listed(result['shared'])}")
+    for pair, overlap in result["pairwise"].items():
+        share = f"，占后者总学分 {overlap['share_of_b']:.0%}" if overlap["share_of_b"] is not None else ""
+        lines.append(f"{pair}: 重合 {overlap['courses']} 门 / {overlap['credits']} 学分{share}")
+    if result["credit_gaps"]:
+        gaps = "; ".join(f"{g['course']} ({' / '.join(str(c) for c in g['credits'])})"
+                         for g in result["credit_gaps"][:MAX_LISTED])
+        lines.append(f"同名课程学分不同: {gaps}")
+    return "\n".join(lines)
@@ -0,0 +1,325 @@
+"""Local store of vetted industry-chain diagrams, keyed by canonical profession.
+
+Panoramic stage 4 used to have the model draw the 产业链 Mermaid diagram
+from scratch for every student, though a few dozen professions account for
+most requests. Every clean diagram the model produces (one that passes
+mermaid_repair with nothing left unfixed) is recorded here as a candidate
+for its profession. It becomes vetted once a maintainer approves it (see
+`list` and `show` below). With INDUSTRY_CHAIN_AUTO_VET_AFTER set, it is
+also vetted after that many clean generations whose node labels agree
+with it (MIN_AGREEMENT overlap); how often a profession comes up
+confirms nothing on its own. From then on the web page shows it at
+once, and the model only gets a short outline of it as context, so it
+writes the personalized analysis and no diagram.
+
+Profession names are free text ("我想做产品经理吧", "PM"). canonical()
+strips the filler and maps aliases to one key. Text that names two known
+professions resolves to none, so the model draws the diagram as before.
+Entries expire after INDUSTRY_CHAIN_TTL_DAYS, because industries change.
+
+    python industry_chain_store.py list
+    python industry_chain_store.py show 产品经理
+    python industry_chain_store.py approve 产品经理
+    python industry_chain_store.py invalidate 产品经理      # or --all
+    python industry_chain_store.py alias 产品运营 产品经理
+    python industry_chain_store.py stats
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+from mermaid_repair import diagram_parts, outline, repair
+from web_prompts import INDUSTRY_CHAIN_HEADING
+
+INDUSTRY_CHAIN_DB = os.getenv("INDUSTRY_CHAIN_DB",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), "industry_chains.sqlite3"))
+AUTO_VET_AFTER = int(os.getenv("INDUSTRY_CHAIN_AUTO_VET_AFTER", "0"))  # 0 = only maintainers vet
+MIN_AGREEMENT = float(os.getenv("INDUSTRY_CHAIN_MIN_AGREEMENT", "0.6"))  # label overlap a confirmation needs
+TTL_DAYS = float(os.getenv("INDUSTRY_CHAIN_TTL_DAYS", "180"))
+MIN_NODES = 4  # fewer nodes is not a chain worth reusing
+MAX_KEY_CHARS = 12  # longer text is a sentence, not a profession name
+OUTLINE_CHARS = 300
+
+# canonical name -> aliases
+SEED_ALIASES = {
+    "产品经理": ("pm", "互联网产品经理"),
+    "数据分析师": ("数据分析", "商业分析师", "ba"),
+    "软件工程师": ("程序员", "软件开发", "开发工程师", "软件开发工程师"),
+    "算法工程师": ("算法", "机器学习工程师", "ai工程师"),
+    "ui设计师": ("ui设计", "ux设计师", "交互设计师", "视觉设计师"),
+    "新媒体运营": ("新媒体", "内容运营", "自媒体运营"),
+    "人力资源专员": ("hr", "人力资源", "招聘专员"),
+    "心理咨询师": ("心理咨询", "咨询师"),
+    "教师": ("老师", "中小学教师"),
+    "会计": ("会计师", "财务会计"),
+    "律师": ("法务",),
+    "用户研究员": ("用户研究", "用研"),
+}
+
+_FILLER_PREFIX = re.compile(r"^(?:我(?:比较|更)?(?:想|要|打算|希望|倾向于?|会|准备)?(?:选择?|做|当|成为|从事|去做)?"
+                            r"|选择?|想做)(?:一名|一个|一位)?")
+_FILLER_SUFFIX = re.compile(r"(?:岗位|职位|方向|这个|吧|啦|了|的工作|工作)+$")
+_SEPARATORS = re.compile(r"[、,，/;；]|和|与|及|或者?|还有")
+_PUNCT = re.compile(r"[\s\W_]+", re.UNICODE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chains (
+    profession TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    diagram TEXT NOT NULL,
+    outline TEXT NOT NULL,
+    status TEXT NOT NULL,
+    confirmations INTEGER NOT NULL DEFAULT 1,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    profession TEXT NOT NULL
+);
+"""
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _PUNCT.sub("", text)
+    return _FILLER_SUFFIX.sub("", _FILLER_PREFIX.sub("", text))
+
+
+def format_outline(groups, limit=OUTLINE_CHARS):
+    """The outline of a diagram as one compact line per stage, for prompts."""
+    lines = [f"{title or '其他'}: {'、'.join(labels)}" for title, labels in groups]
+    text = "\n".join(lines)
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def agreement(groups, other):
+    """Jaccard overlap of two outlines' node labels, 0..1."""
+    labels = [{normalize(label) for _, names in g for label in names} for g in (groups, other)]
+    union = labels[0] | labels[1]
+    return len(labels[0] & labels[1]) / len(union) if union else 0.0
+
+
+class IndustryChainStore:
+    """An SQLite table of diagrams plus an alias table; safe to share between threads."""
+
+    def __init__(self, path=INDUSTRY_CHAIN_DB, auto_vet_after=AUTO_VET_AFTER, ttl_days=TTL_DAYS):
+        self.path = path
+        self.auto_vet_after = auto_vet_after
+        self.ttl = ttl_days * 86400
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.executemany("INSERT OR IGNORE INTO aliases VALUES (?, ?)",
+                             [(normalize(a), normalize(name)) for name, aliases in SEED_ALIASES.items()
+                              for a in (name,) + aliases])
+        self._aliases, self._data_version = {}, None
+        self.lookups = Counter()
+
+    def _alias_map(self):
+        """alias -> profession, reloaded whenever any connection has written to the database."""
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version or not self._aliases:
+            self._aliases = dict(self._db.execute("SELECT alias, profession FROM aliases"))
+            for (profession,) in self._db.execute("SELECT profession FROM chains"):
+                self._aliases.setdefault(profession, profession)
+            self._data_version = version
+        return self._aliases
+
+    def canonical(self, text):
+        """The profession key for free text, or None if it names several professions or none cleanly."""
+        key = normalize(text)
+        if not key:
+            return None
+        with self._lock:
+            aliases = self._alias_map()
+        if key in aliases:
+            return aliases[key]
+        # Aliases inside a sentence, longest first so "数据分析师" wins over "数据分析"; "pm" or "hr" only on their own.
+        found, rest = set(), key
+        for alias in sorted((a for a in aliases if len(a) > 2), key=len, reverse=True):
+            if alias in rest:
+                found.add(aliases[alias])
+                rest = rest.replace(alias, " ")
+        if len(found) == 1:
+            return found.pop()
+        if found or _SEPARATORS.search(key) or len(key) > MAX_KEY_CHARS:
+            return None
+        return key
+
+    def lookup(self, text):
+        """The vetted, unexpired entry for a profession as a dict, or None; counted in stats()."""
+        profession = self.canonical(text)
+        if profession is None:
+            self.lookups["unresolved"] += 1
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT name, diagram, outline, updated FROM chains "
+                                   "WHERE profession = ? AND status = 'vetted'", (profession,)).fetchone()
+            if row is None or time.time() - row[3] > self.ttl:
+                self.lookups["miss"] += 1
+                return None
+            self._db.execute("UPDATE chains SET hits = hits + 1 WHERE profession = ?", (profession,))
+            self.lookups["hit"] += 1
+        return {"profession": profession, "name": row[0], "diagram": row[1], "outline": row[2]}
+
+    def record(self, text, diagram):
+        """Adds a clean diagram the model drew as a candidate; returns the entry's status or None if rejected."""
+        profession = self.canonical(text)
+        if profession is None:
+            return None
+        diagram, issues = repair(diagram)
+        groups = outline(diagram)
+        if any(not issue.fixed for issue in issues) or sum(len(labels) for _, labels in groups) < MIN_NODES:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT status, confirmations, updated, diagram FROM chains "
+                                   "WHERE profession = ?", (profession,)).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                self._db.execute("INSERT OR REPLACE INTO chains (profession, name, diagram, outline, status, "
+                                 "created, updated) VALUES (?, ?, ?, ?, 'candidate', ?, ?)",
+                                 (profession, profession, diagram, format_outline(groups), now, now))
+                self._aliases = {}  # writes on this connection do not change its data_version
+                status, confirmations = "candidate", 1
+            elif row[0] == "candidate" and agreement(groups, outline(row[3])) >= MIN_AGREEMENT:
+                # The first clean diagram is kept; a later one confirms it only if it draws mostly the same chain.
+                status, confirmations = row[0], row[1] + 1
+                if self.auto_vet_after and confirmations >= self.auto_vet_after:
+                    status = "vetted"
+                self._db.execute("UPDATE chains SET confirmations = ?, status = ? WHERE profession = ?",
+                                 (confirmations, status, profession))
+            else:
+                status = row[0]
+        return status
+
+    def record_reply(self, text, reply):
+        """record() for the diagram in a stage-4 reply, if it has one."""
+        parts = diagram_parts(reply)
+        return self.record(text, parts[1]) if parts else None
+
+    def approve(self, text, diagram=None):
+        """Marks a profession's diagram vetted, optionally replacing it with a hand-checked one."""
+        profession = self.canonical(text)
+        if profession is None:
+            raise KeyError(text)
+        with self._lock:
+            if diagram is not None:
+                diagram, _ = repair(diagram)
+                now = time.time()
+                self._db.execute("INSERT OR REPLACE INTO chains (profession, name, diagram, outline, status, "
+                                 "created, updated) VALUES (?, ?, ?, ?, 'vetted', ?, ?)",
+                                 (profession, text.strip(), diagram, format_outline(outline(diagram)), now, now))
+                self._aliases = {}
+            elif not self._db.execute("UPDATE chains SET status = 'vetted', updated = ? WHERE profession = ?",
+                                      (time.time(), profession)).rowcount:
+                raise KeyError(text)
+        return profession
+
+    def invalidate(self, text=None):
+        """Deletes one profession's diagram (or all of them); the next clean generation starts over."""
+        profession = None if text is None else self.canonical(text)
+        with self._lock:
+            self._aliases = {}
+            if text is None:
+                return self._db.execute("DELETE FROM chains").rowcount
+            return self._db.execute("DELETE FROM chains WHERE profession = ?", (profession,)).rowcount
+
+    def add_alias(self, alias, text):
+        profession = self.canonical(text) or normalize(text)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?)", (normalize(alias), profession))
+            self._aliases = {}
+        return profession
+
+    def entries(self):
+        with self._lock:
+            rows = self._db.execute("SELECT profession, status, confirmations, hits, updated FROM chains "
+                                    "ORDER BY hits DESC, profession").fetchall()
+        return [dict(zip(("profession", "status", "confirmations", "hits", "updated"), row)) for row in rows]
+
+    def get(self, text):
+        profession = self.canonical(text)
+        with self._lock:
+            row = self._db.execute("SELECT diagram, outline, status FROM chains WHERE profession = ?",
+                                   (profession,)).fetchone()
+        return dict(zip(("diagram", "outline", "status"), row)) if row else None
+
+    def stats(self):
+        """Lookups of this process by outcome, the hit rate, and the stored entries by status."""
+        with self._lock:
+            by_status = dict(self._db.execute("SELECT status, COUNT(*) FROM chains GROUP BY status"))
+            top = self._db.execute("SELECT profession, hits FROM chains WHERE hits > 0 "
+                                   "ORDER BY hits DESC LIMIT 10").fetchall()
+            lookups = dict(self.lookups)
+        total = sum(lookups.values())
+        return {"lookups": total, "hit": lookups.get("hit", 0), "miss": lookups.get("miss", 0),
+                "unresolved": lookups.get("unresolved", 0),
+                "hit_rate": round(lookups.get("hit", 0) / total, 3) if total else None,
+                "entries": by_status, "top": dict(top)}
+
+
+def with_diagram(reply, entry):
+    """A reply written from the outline, with the stored diagram in front as if the model had drawn it."""
+    return f"{INDUSTRY_CHAIN_HEADING}\n\n```mermaid\n{entry['diagram']}\n```\n\n{reply}"
+
+
+@lru_cache(maxsize=1)
+def get_industry_chain_store():
+    return IndustryChainStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=INDUSTRY_CHAIN_DB)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    commands.add_parser("stats")
+    commands.add_parser("show").add_argument("profession")
+    approve = commands.add_parser("approve")
+    approve.add_argument("profession")
+    approve.add_argument("--diagram", metavar="FILE", help="replace the stored diagram with this Mermaid file")
+    invalidate = commands.add_parser("invalidate")
+    invalidate.add_argument("profession", nargs="?")
+    invalidate.add_argument("--all", action="store_true")
+    alias = commands.add_parser("alias")
+    alias.add_argument("alias")
+    alias.add_argument("profession")
+    args = parser.parse_args()
+
+    store = IndustryChainStore(args.db)
+    if args.command == "list":
+        for entry in store.entries():
+            print(f"{entry['profession']:<16}{entry['status']:<11}确认 {entry['confirmations']:<4}命中 {entry['hits']:<6}"
+                  f"{time.strftime('%Y-%m-%d', time.localtime(entry['updated']))}")
+    elif args.command == "stats":
+        # Hit rates are counted per process; the web app and /healthz report those. Here: stored totals.
+        stats = store.stats()
+        print(f"按状态: {stats['entries']}\n累计命中: {sum(e['hits'] for e in store.entries())}\n最常用: {stats['top']}")
+    elif args.command == "show":
+        entry = store.get(args.profession)
+        print(f"[{entry['status']}]\n{entry['outline']}\n\n{entry['diagram']}" if entry else "没有这个职业的图谱")
+    elif args.command == "approve":
+        diagram = None
+        if args.diagram:
+            with open(args.diagram, encoding="utf-8") as f:
+                diagram = f.read()
+        print(f"已审核: {store.approve(args.profession, diagram)}")
+    elif args.command == "invalidate":
+        if not args.all and not args.profession:
+            parser.error("请指定职业名称，或使用 --all")
+        print(f"已删除 {store.invalidate(None if args.all else args.profession)} 条")
+    elif args.command == "alias":
+        print(f"{args.alias} -> {store.add_alias(args.alias, args.profession)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import threading
+import time
+import uuid
+from collections import Counter
+
+# --- 背景生成任務 ---
+# Long generations are owned by a background thread instead of the Streamlit
+# script run, so a rerun or a "返回主菜单" click no longer drops the output.
+#
+# A job is single-flight per key: whoever submits a key that is already
+# running attaches to that job and replays its buffer, so identical requests
+# from several sessions (the same company at a career fair, a double-clicked
+# button) cost one upstream call. Keys without a session id are shared that
+# way across sessions. Each follower holds the job via its owner id; release()
+# cancels the generation only once the last follower has let go.
+
+DEFAULT_GRACE_PERIOD = 60.0
+DEFAULT_RETENTION = 600.0
+PRESUBMIT_GRACE_PERIOD = 600.0  # for jobs started before anyone follows them, e.g. a report while a reply streams
+
+
+class JobCancelled(Exception):
+    """Raised to followers of a job that was cancelled before finishing."""
+
+
+class GenerationJob:
+    """A single streamed generation with a replayable token buffer."""
+
+    def __init__(self, key, stream_factory, owner=None, grace_period=None):
+        self.key = key
+        self.owner = owner
+        self.grace_period = grace_period  # None: the runner's default
+        self.followers = {owner}
+        self.job_id = uuid.uuid4().hex
+        self._stream_factory = stream_factory
+        self._chunks = []
+        self._cond = threading.Condition()
+        self._cancel = threading.Event()
+        self.status = "pending"
+        self.error = None
+        self.created_at = time.monotonic()
+        self.finished_at = None
+        self.last_seen = self.created_at
+        self._thread = threading.Thread(target=self._run, name=f"gen-{self.job_id[:8]}", daemon=True)
+
+    def start(self):
+        self.status = "running"
+        self._thread.start()
+        return self
+
+    def _run(self):
+        stream = None
+        try:
+            stream = self._stream_factory()
+            for chunk in stream:
+                if self._cancel.is_set():
+                    break
+                text = getattr(chunk, "content", chunk)
+                if not text:
+                    continue
+                with self._cond:
+                    self._chunks.append(text)
+                    self._cond.notify_all()
+            status = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            self.error = e
+            status = "error"
+        finally:
+            # Closing the generator closes the upstream HTTP stream as well.
+            close = getattr(stream, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+        with self._cond:
+            self.status = status
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    @property
+    def done(self):
+        return self.status in ("done", "error", "cancelled")
+
+    @property
+    def text(self):
+        with self._cond:
+            return "".join(self._chunks)
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def cancel(self):
+        self._cancel.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def follow(self, poll_interval=0.5):
+        """Yields every chunk produced so far, then keeps following new ones."""
+        index = 0
+        while True:
+            self.touch()
+            with self._cond:
+                while index >= len(self._chunks) and not self.done:
+                    self._cond.wait(poll_interval)
+                    self.touch()
+                pending = self._chunks[index:]
+                index += len(pending)
+                finished = self.done and index >= len(self._chunks)
+            if pending:
+                yield "".join(pending)
+            if finished:
+                break
+        if self.status == "error":
+            raise self.error
+        if self.status == "cancelled":
+            raise JobCancelled(self.key)
+
+    def wait(self, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self.done, timeout)
+        return self.done
+
+
+class JobRunner:
+    """Owns generation jobs by key and reaps the abandoned ones."""
+
+    def __init__(self, grace_period=DEFAULT_GRACE_PERIOD, retention=DEFAULT_RETENTION, reap_interval=5.0):
+        self.grace_period = grace_period
+        self.retention = retention
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Per key prefix (the mode): upstream generations started, and requests served by one already running.
+        self.started = Counter()
+        self.coalesced = Counter()
+        self._reaper = threading.Thread(target=self._reap_loop, args=(reap_interval,), name="gen-reaper",
+                                        daemon=True)
+        self._reaper.start()
+
+    def submit(self, key, stream_factory, owner=None, grace_period=None):
+        """Returns the job for `key`, starting one if there is none; `owner` joins its followers.
+
+        A job started ahead of time, with nobody following it yet, needs a `grace_period` that covers the
+        wait until it is followed, or the reaper takes it for abandoned.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.status in ("error", "cancelled"):
+                job = GenerationJob(key, stream_factory, owner, grace_period).start()
+                self._jobs[key] = job
+                self.started[_mode(key)] += 1
+            elif owner not in job.followers:
+                # Another session asking for the same thing: it follows this stream instead of calling the model.
+                # Replaying a job that has already finished saves no concurrent call, so it is not counted.
+                job.followers.add(owner)
+                if not job.done:
+                    self.coalesced[_mode(key)] += 1
+            job.touch()
+            return job
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def discard(self, key):
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if job is not None and not job.done:
+            job.cancel()
+
+    def release(self, key, owner=None):
+        """Drops `owner` from the job's followers; the job is discarded once nobody follows it."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return
+            job.followers.discard(owner)
+            if job.followers:
+                return
+            del self._jobs[key]
+        if not job.done:
+            job.cancel()
+
+    def _reap_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self.reap()
+
+    def reap(self):
+        now = time.monotonic()
+        with self._lock:
+            for key, job in list(self._jobs.items()):
+                if not job.done and now - job.last_seen > (job.grace_period or self.grace_period):
+                    job.cancel()
+                elif job.done and now - (job.finished_at or now) > self.retention:
+                    del self._jobs[key]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def dedup_stats(self):
+        """Per mode: generations started, requests coalesced onto them (the saved calls), and the share saved."""
+        with self._lock:
+            started, coalesced = dict(self.started), dict(self.coalesced)
+        return {mode: {"started": started.get(mode, 0), "coalesced": coalesced.get(mode, 0),
+                       "saved": coalesced.get(mode, 0) / (started.get(mode, 0) + coalesced.get(mode, 0))}
+                for mode in sorted(set(started) | set(coalesced))}
+
+
+def _mode(key):
+    """The mode part of a job key: "<session>:<mode>:<digest>" or "shared:<mode>:<digest>"."""
+    parts = key.split(":")
+    return parts[1] if len(parts) > 2 else parts[0]
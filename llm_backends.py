@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+import warnings
+
+from llm_cassette import cassette_mode, replay_llm, wrap_with_cassette
+
+# --- 模型後端註冊表 ---
+# Named model profiles, configured from the environment or Streamlit
+# secrets, replace the hardcoded model, URL and temperature in every
+# get_llm_instance. All HTTP profiles in a process share one pooled httpx
+# client, sync and async. Pool size, keep-alive and HTTP/2 are set here.
+# A trace hook counts new connections and TLS handshakes, so reuse can be
+# checked with pool_stats().
+#
+# A profile with several API keys (comma-separated, or an "api_keys" list)
+# or of kind "pool" (its "members" are other profiles, e.g. on other
+# endpoints) becomes a router over one model per key; see api_key_pool.py.
+#
+#     LLM_PROFILE=local LLM_LOCAL_BASE_URL=http://127.0.0.1:8001/v1 streamlit run web_test.py
+#     LLM_PROFILES_JSON='{"qwen": {"base_url": "...", "model": "qwen-plus", "api_key_env": ["DASHSCOPE_API_KEY"]}}'
+
+ARK_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3"
+
+BUILTIN_PROFILES = {
+    "ark": {"kind": "openai", "model": "deepseek-r1-250528", "base_url": ARK_BASE_URL, "temperature": 0.7,
+            "api_key_env": ["VOLCENGINE_API_KEY", "DEEPSEEK_API_KEY"]},
+    # Any OpenAI-compatible server (vLLM, llama.cpp, Ollama, ...); most ignore the key.
+    "local": {"kind": "openai", "model": "local-model", "base_url": "http://127.0.0.1:8001/v1", "temperature": 0.7,
+              "api_key_env": ["LOCAL_LLM_API_KEY"], "api_key": "not-needed"},
+    "stub": {"kind": "stub", "model": "stub", "temperature": 0.7},
+}
+DEFAULT_PROFILE = os.getenv("LLM_PROFILE", "ark")
+
+POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+POOL_KEEPALIVE = int(os.getenv("LLM_POOL_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+HTTP2 = os.getenv("LLM_HTTP2", "0").lower() in ("1", "true", "yes")
+REQUEST_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))
+
+STUB_REPLY = os.getenv("LLM_STUB_REPLY", "（离线模式）这是一条用于本地开发的模拟回复，没有调用任何真实模型。")
+
+
+class BackendConfigError(ValueError):
+    """A profile is unknown or misses something it needs, usually the API key."""
+
+
+def _secret(secrets, key):
+    """One entry of st.secrets, or None. Touching st.secrets at all (even len()) raises without a secrets.toml."""
+    if secrets is None:
+        return None
+    try:
+        return secrets[key]
+    except (KeyError, FileNotFoundError):
+        return None
+
+
+def _secret_profiles(secrets):
+    section = _secret(secrets, "llm_profiles") or {}
+    return {name: dict(values) for name, values in dict(section).items()}
+
+
+def load_profiles(secrets=None):
+    """Built-in profiles, updated by LLM_PROFILES_JSON, secrets [llm_profiles.<name>] and LLM_<NAME>_* variables."""
+    profiles = {name: dict(values) for name, values in BUILTIN_PROFILES.items()}
+    extra = json.loads(os.getenv("LLM_PROFILES_JSON", "") or "{}")
+    for source in (extra, _secret_profiles(secrets)):
+        for name, values in source.items():
+            profiles.setdefault(name, {"kind": "openai", "temperature": 0.7}).update(values)
+    for name, profile in profiles.items():
+        prefix = f"LLM_{name.upper()}_"
+        for field in ("model", "base_url", "api_key"):
+            if os.getenv(prefix + field.upper()):
+                profile[field] = os.getenv(prefix + field.upper())
+        if os.getenv(prefix + "TEMPERATURE"):
+            profile["temperature"] = float(os.getenv(prefix + "TEMPERATURE"))
+    return profiles
+
+
+def get_profile(name=None, secrets=None):
+    name = name or DEFAULT_PROFILE
+    profiles = load_profiles(secrets)
+    if name not in profiles:
+        raise BackendConfigError(f"未知的模型配置 “{name}”，可选: {', '.join(sorted(profiles))}")
+    return name, profiles[name]
+
+
+def _api_keys(profile, secrets):
+    """Every key of the profile: an "api_keys" list, or the first key variable set, split on commas."""
+    if profile.get("api_keys"):
+        return list(profile["api_keys"])
+    key_names = profile.get("api_key_env") or []
+    if isinstance(key_names, str):
+        key_names = [key_names]
+    for key_name in key_names:
+        value = _secret(secrets, key_name) or os.getenv(key_name)
+        if value:
+            return [key.strip() for key in str(value).split(",") if key.strip()]
+    if profile.get("api_key"):
+        return [profile["api_key"]]
+    raise BackendConfigError(f"未找到 {' / '.join(key_names) or 'API Key'}。请在 Streamlit Secrets、环境变量或 .env 文件中设置它。")
+
+
+# --- 共用連線池 ---
+class PoolStats:
+    """Counts requests against new TCP connections and TLS handshakes, from httpx trace events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.http2_requests = 0
+
+    def _bump(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def trace(self, event, info):
+        if event == "connection.connect_tcp.complete":
+            self._bump("connections")
+        elif event == "connection.start_tls.complete":
+            self._bump("tls_handshakes")
+        elif event == "http2.send_request_headers.started":
+            self._bump("http2_requests")
+
+    async def atrace(self, event, info):
+        self.trace(event, info)
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(0, self.requests - self.connections)
+            return {"requests": self.requests, "connections": self.connections,
+                    "tls_handshakes": self.tls_handshakes, "http2_requests": self.http2_requests,
+                    "reused_requests": reused,
+                    "reuse_ratio": round(reused / self.requests, 3) if self.requests else None}
+
+
+_stats = PoolStats()
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client_kwargs():
+    import httpx
+
+    limits = httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_KEEPALIVE,
+                          keepalive_expiry=KEEPALIVE_EXPIRY)
+    http2 = HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            warnings.warn("LLM_HTTP2=1 需要安装 h2 (pip install 'httpx[http2]')，已回退到 HTTP/1.1。")
+            http2 = False
+    return {"limits": limits, "http2": http2, "timeout": httpx.Timeout(REQUEST_TIMEOUT, connect=10.0)}
+
+
+def _count_request(request):
+    _stats._bump("requests")
+    request.extensions["trace"] = _stats.trace
+
+
+async def _acount_request(request):
+    _stats._bump("requests")
+    request.extensions["trace"] = _stats.atrace
+
+
+def get_http_clients():
+    """The process-wide (sync, async) httpx clients shared by every HTTP profile."""
+    import httpx
+
+    with _clients_lock:
+        if not _clients:
+            kwargs = _client_kwargs()
+            from api_key_pool import aobserve_response, observe_response
+
+            # The response hooks hand rate-limit headers to the key pool, which routes by them.
+            _clients["sync"] = httpx.Client(event_hooks={"request": [_count_request], "response": [observe_response]},
+                                            **kwargs)
+            _clients["async"] = httpx.AsyncClient(event_hooks={"request": [_acount_request],
+                                                               "response": [aobserve_response]}, **kwargs)
+        return _clients["sync"], _clients["async"]
+
+
+def pool_stats():
+    stats = _stats.snapshot()
+    stats.update(pool_size=POOL_SIZE, keepalive=POOL_KEEPALIVE, http2_enabled=HTTP2)
+    return stats
+
+
+# --- 建立模型 ---
+def _pool_members(settings):
+    if not settings.get("members"):
+        raise BackendConfigError("模型池配置缺少 members。")
+    return settings["members"]
+
+
+def _recorded_settings(settings, secrets):
+    """The settings a cassette records for a profile; a pool records its first member's model."""
+    if settings["kind"] == "pool":
+        _, settings = get_profile(_pool_members(settings)[0], secrets)
+    return settings
+
+
+def _build(profile, secrets, **overrides):
+    settings = dict(profile, **overrides)
+    if settings["kind"] == "stub":
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+        return FakeListChatModel(responses=[settings.get("reply", STUB_REPLY)], sleep=settings.get("sleep", 0.01))
+    if settings["kind"] == "pool":
+        members = []
+        for member in _pool_members(settings):
+            _, member_settings = get_profile(member, secrets)
+            if member_settings["kind"] != "openai":
+                raise BackendConfigError(f"模型池 “{member}” 只能包含 openai 类型的配置")
+            members += [(member_settings, key) for key in _api_keys(dict(member_settings, **overrides), secrets)]
+        return _key_pool(members)
+    if settings["kind"] != "openai":
+        raise BackendConfigError(f"不支持的模型类型 “{settings['kind']}”")
+    keys = _api_keys(settings, secrets)
+    if len(keys) > 1:
+        return _key_pool([(settings, key) for key in keys])
+    return _chat_openai(settings, keys[0])
+
+
+def _chat_openai(settings, api_key, **kwargs):
+    from langchain_openai import ChatOpenAI
+
+    http_client, http_async_client = get_http_clients()
+    # stream_usage asks for the token usage chunk at the end of a stream; token_budget.py counts it.
+    return ChatOpenAI(model=settings["model"], temperature=settings.get("temperature", 0.7),
+                      api_key=api_key, base_url=settings["base_url"], stream_usage=True,
+                      http_client=http_client, http_async_client=http_async_client, **kwargs)
+
+
+def _key_pool(members):
+    """A router over one model per (settings, key); the pool, not the client, retries on another key."""
+    from api_key_pool import KeyPoolChatModel, get_slot, mask
+
+    return KeyPoolChatModel(members=[(get_slot(key, f"{settings['model']} {mask(key)}"),
+                                      _chat_openai(settings, key, max_retries=0)) for settings, key in members])
+
+
+def create_llm(profile=None, secrets=None, **overrides):
+    """Builds the chat model for a profile (LLM_PROFILE by default), with cassette record/replay applied."""
+    name, settings = get_profile(profile, secrets)
+    if cassette_mode() == "replay":
+        recorded = _recorded_settings(settings, secrets)
+        return replay_llm(overrides.get("model", recorded["model"]),
+                          temperature=overrides.get("temperature", recorded.get("temperature")))
+    return wrap_with_cassette(_build(settings, secrets, **overrides))
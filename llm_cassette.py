@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# --- LLM 錄製與重播 ---
+# Wraps the chat model so regression runs don't have to pay for live
+# deepseek-r1 calls. "record" stores every request (normalized messages
+# plus model parameters) with its streamed chunks and their timing in a
+# JSONL cassette; "replay" serves them back locally, at the original pace
+# or faster; "auto" replays what it has and records the rest.
+#
+#     LLM_CASSETTE_MODE=record python bot_test.py --test
+#     LLM_CASSETTE_MODE=replay LLM_CASSETTE_SPEED=0 python bot_test.py --test
+
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", os.path.join("cassettes", "llm.jsonl"))
+# 1 keeps the recorded timing, 10 plays ten times faster, 0 returns everything at once.
+CASSETTE_SPEED = float(os.getenv("LLM_CASSETTE_SPEED", "1"))
+
+MODES = ("off", "record", "replay", "auto")
+
+
+class CassetteMiss(LookupError):
+    """Replay was asked for a request that is not on the cassette."""
+
+
+def _normalize(content):
+    if isinstance(content, str):
+        return "\n".join(line.rstrip() for line in content.replace("\r\n", "\n").strip().split("\n"))
+    return content
+
+
+def request_key(messages, params):
+    """Hashes the normalized messages and parameters; whitespace-only edits to a prompt keep the same key."""
+    payload = {"messages": [[m.type, _normalize(m.content)] for m in messages], "params": params}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """The recordings of one JSONL file. Identical requests are replayed in the order they were recorded."""
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = defaultdict(list)
+        self._cursor = defaultdict(int)
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]].append(entry)
+
+    def next(self, key):
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            index = min(self._cursor[key], len(entries) - 1)
+            self._cursor[key] += 1
+            return entries[index]
+
+    def append(self, entry):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._entries[entry["key"]].append(entry)
+            # What was just recorded counts as served, so "auto" doesn't replay it to the same run.
+            self._cursor[entry["key"]] = len(self._entries[entry["key"]])
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(v) for v in self._entries.values())
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path=CASSETTE_PATH):
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+class CassetteChatModel(BaseChatModel):
+    """A chat model that records the wrapped model's answers or replays them from a cassette."""
+
+    inner: Optional[BaseChatModel] = None
+    mode: str = "replay"
+    cassette_path: str = CASSETTE_PATH
+    speed: float = CASSETTE_SPEED
+    recorded_model: str = ""
+    temperature: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _params(self, stop, kwargs):
+        params = {"model": self.recorded_model, "temperature": self.temperature, "stop": stop}
+        params.update(kwargs)
+        return params
+
+    def _lookup(self, messages, stop, kwargs):
+        params = self._params(stop, kwargs)
+        key = request_key(messages, params)
+        if self.mode in ("replay", "auto"):
+            entry = get_cassette(self.cassette_path).next(key)
+            if entry is not None:
+                return key, params, entry
+        if self.mode == "replay" or self.inner is None:
+            last = _normalize(messages[-1].content) if messages else ""
+            raise CassetteMiss(f"cassette {self.cassette_path} has no recording for request {key[:12]} "
+                               f"(last message: {str(last)[:80]!r})")
+        return key, params, None
+
+    def _save(self, key, params, messages, chunks, usage):
+        entry = {"key": key, "recorded_at": time.time(),
+                 "request": {"messages": [[m.type, _normalize(m.content)] for m in messages], "params": params},
+                 "chunks": chunks}
+        if usage:
+            entry["usage"] = usage
+        get_cassette(self.cassette_path).append(entry)
+
+    def _replay(self, entry):
+        elapsed = 0.0
+        for offset, text in entry["chunks"]:
+            if self.speed > 0 and offset > elapsed:
+                time.sleep((offset - elapsed) / self.speed)
+            elapsed = max(elapsed, offset)
+            yield text
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        key, params, entry = self._lookup(messages, stop, kwargs)
+        if entry is not None:
+            last = len(entry["chunks"]) - 1
+            for i, text in enumerate(self._replay(entry)):
+                usage = entry.get("usage") if i == last else None
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=usage))
+                if run_manager:
+                    run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+            return
+        started, recorded, usage = time.monotonic(), [], None
+        for message_chunk in self.inner.stream(messages, stop=stop, **kwargs):
+            text = message_chunk.content if isinstance(message_chunk.content, str) else ""
+            usage = getattr(message_chunk, "usage_metadata", None) or usage
+            recorded.append([round(time.monotonic() - started, 4), text])
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text,
+                                                               usage_metadata=message_chunk.usage_metadata))
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+        self._save(key, params, messages, recorded, usage)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        key, params, entry = self._lookup(messages, stop, kwargs)
+        if entry is not None:
+            text = "".join(self._replay(entry))
+            usage = entry.get("usage")
+        else:
+            started = time.monotonic()
+            response = self.inner.invoke(messages, stop=stop, **kwargs)
+            text = response.content
+            usage = getattr(response, "usage_metadata", None)
+            self._save(key, params, messages, [[round(time.monotonic() - started, 4), text]], usage)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+
+def cassette_mode():
+    return CASSETTE_MODE if CASSETTE_MODE in MODES else "off"
+
+
+def replay_llm(model_name, temperature=None):
+    """A replay-only model for runs without an API key or network."""
+    return CassetteChatModel(mode="replay", recorded_model=model_name, temperature=temperature)
+
+
+def wrap_with_cassette(llm, model_name=None, temperature=None):
+    """Returns `llm` unchanged unless LLM_CASSETTE_MODE asks for recording or replay."""
+    mode = cassette_mode()
+    if mode == "off":
+        return llm
+    return CassetteChatModel(inner=llm, mode=mode,
+                             recorded_model=model_name or getattr(llm, "model_name", "") or "",
+                             temperature=getattr(llm, "temperature", None) if temperature is None else temperature)
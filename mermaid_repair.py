@@ -0,0 +1,431 @@
+import re
+import threading
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+# --- Mermaid 圖表的本地校驗與修復 ---
+# The panoramic stage-4 report and the curriculum stage-2 learning path end
+# in a ```mermaid graph TD block, and st_mermaid shows a parse error instead
+# of the diagram for the usual slips: node text with parentheses or <br>
+# left unquoted, quotes inside quoted text, style lines for nodes that do
+# not exist or with non-CSS values, style lines written after the closing
+# fence. repair() parses the block line by line and fixes those locally.
+# Only when something is left that it cannot fix (a broken edge line, say)
+# does repair_message() ask the model to fix the diagram alone, never the
+# whole answer. Outcomes are counted in repair_stats().
+
+Issue = namedtuple("Issue", ["line", "kind", "fixed"])
+
+ISSUE_TEXT = {
+    "header": "缺少 graph TD 声明",
+    "unquoted_label": "节点文本含括号、<br> 等特殊符号却没有用双引号括起来",
+    "quote_in_label": "双引号括起的节点文本内部又出现了双引号",
+    "style_list": "一条 style 命令写了多个节点",
+    "style_unknown_node": "style 命令引用了不存在的节点",
+    "style_invalid": "style 命令的颜色或属性不是合法的 CSS 写法",
+    "style_outside_block": "style 命令写在了代码块之外",
+    "stray_text": "代码块中混入了说明文字",
+    "fullwidth_arrow": "连线使用了全角符号",
+    "loose_arrow": "连线箭头写成了 ->、=> 或 → 等非 Mermaid 写法",
+    "unbalanced_end": "多余的 end",
+    "unclosed_subgraph": "subgraph 缺少对应的 end",
+    "syntax": "无法解析的连线语句",
+    "empty": "图中没有任何节点",
+}
+
+MERMAID_REPAIR_PROMPT = """下面这段 Mermaid `graph TD` 流程图无法渲染。请只修复语法，不要增删节点和连线，也不要改变颜色标注。
+语法要求: 节点文本一律用双引号括起来，例如 A["人际交往心理学(研讨课)<br>大二上"]；style 命令放在最下方，且只能引用已定义的节点。
+本地检查发现的问题:
+{issues}
+
+只输出修复后的 Mermaid 代码块，不要输出任何其他内容。
+
+```mermaid
+{code}
+```"""
+
+_FENCE = "```mermaid"
+_HEADER = re.compile(r"^(?:graph|flowchart)\s+(?:TD|TB|BT|LR|RL)\s*;?$", re.IGNORECASE)
+_BARE_HEADER = re.compile(r"^(?:graph|flowchart)\s*;?$", re.IGNORECASE)
+_ID = re.compile(r"\w+")
+# Longest opener first; each maps to the closers that may end it.
+_SHAPES = (("(((", (")))",)), ("((", ("))",)), ("([", ("])",)), ("[(", (")]",)), ("[[", ("]]",)),
+           ("{{", ("}}",)), ("[/", ("/]", "\\]")), ("[\\", ("\\]", "/]")), ("[", ("]",)), ("(", (")",)),
+           ("{", ("}",)), (">", ("]",)))
+_LINK = re.compile(r"\s*(?:(?:--|==|-\.)\s+(?P<text>[^|]+?)\s+(?:-{2,}[->ox]?|={2,}[=>ox]?|\.-+>?)"
+                   r"|(?:<?(?:-{2,}|={2,}|-\.+-)[->ox]?|~~~)(?:\s*\|(?P<label>[^|]*)\|)?)\s*")
+_LINK_START = re.compile(r"<?(?:--|==|-\.)|~~~")
+_AFTER_NODE = re.compile(r"\s*(?:$|&|:::|<?(?:--|==|-\.)|~~~)")
+_CLASS_SUFFIX = re.compile(r":::\w+")
+_FULLWIDTH_ARROW = re.compile(r"[—－]{1,2}[>＞]")
+# -> => → written for -->; "-->" "==>" "-.->" themselves are not matched.
+_LOOSE_ARROW = re.compile(r"\s*(?<![-=.])(?:->|=>|→|⟶)\s*")
+_OTHER_STATEMENT = re.compile(r"^(?:%%|classDef\s|class\s|linkStyle\s|click\s|direction\s)")
+_SUBGRAPH = re.compile(r"^subgraph\b\s*(?P<rest>.*)$")
+_SUBGRAPH_TITLE = re.compile(r"^(?P<id>\w+)\s*\[(?P<title>.*)\]$")
+_STYLE = re.compile(r"^style\s+(?P<ids>\w+(?:\s*,\s*\w+)*)\s+(?P<props>.+?)\s*;?$")
+_STYLE_PROP = re.compile(r"^(?P<name>[a-zA-Z\-]+)\s*:\s*(?P<value>[#\w.%()\- ]+)$", re.ASCII)
+_SPECIAL = re.compile(r"[()\[\]{}<>\"|]")
+
+
+# --- 解析 ---
+def _parse_label(line, pos):
+    """Reads a node shape at `pos`: (label_start, label_end, end) or None when no shape is there."""
+    for opener, closers in _SHAPES:
+        if not line.startswith(opener, pos):
+            continue
+        start = pos + len(opener)
+        # The first closer after which the statement can go on; this skips parentheses inside the text.
+        candidates = sorted((i, closer) for closer in closers
+                            for i in (m.start() for m in re.finditer(re.escape(closer), line[start:])))
+        for i, closer in candidates:
+            end = start + i + len(closer)
+            if _AFTER_NODE.match(line, end):
+                return start, start + i, end
+        return None
+    return None
+
+
+def _parse_chain(line):
+    """Parses `A["x"] --> B & C -->|y| D`; returns (node ids, label spans, edge label spans, {id: label span})
+    or None."""
+    ids, labels, edge_labels, named = [], [], [], {}
+    pos = 0
+    while True:
+        while True:
+            match = _ID.match(line, pos)
+            if match is None:
+                return None
+            ids.append(match.group())
+            pos = match.end()
+            if pos < len(line) and line[pos] not in " &:-=<~;":
+                shape = _parse_label(line, pos)
+                if shape is None:
+                    return None
+                labels.append(shape[:2])
+                named.setdefault(ids[-1], shape[:2])
+                pos = shape[2]
+            suffix = _CLASS_SUFFIX.match(line, pos)
+            if suffix:
+                pos = suffix.end()
+            amp = re.compile(r"\s*&\s*").match(line, pos)
+            if not amp:
+                break
+            pos = amp.end()
+        rest = line[pos:].strip()
+        if not rest or rest == ";":
+            return ids, labels, edge_labels, named
+        link = _LINK.match(line, pos)
+        if link is None:
+            return None
+        group = "text" if link.group("text") is not None else "label"
+        if link.group(group) is not None:
+            edge_labels.append(link.span(group))
+        pos = link.end()
+
+
+def _quote(text):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        text = text[1:-1]
+    return '"' + text.replace('"', "#quot;") + '"'
+
+
+def _fix_label(text):
+    """The label text as it should be written, and the issue kind when it had to change."""
+    stripped = text.strip()
+    if len(stripped) >= 2 and stripped[0] == stripped[-1] == '"':
+        if '"' in stripped[1:-1]:
+            return _quote(stripped), "quote_in_label"
+        return text, None
+    if stripped.startswith("`"):  # markdown string
+        return text, None
+    if _SPECIAL.search(stripped):
+        return _quote(stripped), "unquoted_label"
+    return text, None
+
+
+def _rewrite(line, spans):
+    """Applies label fixes right to left so earlier spans stay valid; returns (line, kinds)."""
+    kinds = []
+    for start, end in sorted(spans, reverse=True):
+        fixed, kind = _fix_label(line[start:end])
+        if kind:
+            line = line[:start] + fixed + line[end:]
+            kinds.append(kind)
+    return line, kinds
+
+
+def _fix_style(line, nodes):
+    """One style statement per node, known nodes only, CSS properties only; returns (lines, kinds)."""
+    match = _STYLE.match(line)
+    if match is None:
+        return [], ["style_invalid"]
+    kinds = []
+    ids = [i.strip() for i in match.group("ids").split(",")]
+    if len(ids) > 1:
+        kinds.append("style_list")
+    props = []
+    for prop in match.group("props").rstrip(";").split(","):
+        prop_match = _STYLE_PROP.match(prop.strip())
+        if prop_match:
+            props.append(f"{prop_match.group('name')}:{prop_match.group('value').strip()}")
+    if len(props) < len(match.group("props").rstrip(";").split(",")):
+        kinds.append("style_invalid")
+    known = [i for i in ids if i in nodes]
+    if len(known) < len(ids):
+        kinds.append("style_unknown_node")
+    if not props:
+        return [], kinds
+    return [f"style {node} {','.join(props)}" for node in known], kinds
+
+
+def _analyze(code):
+    """Checks every statement and builds the repaired code; returns (lines, [Issue])."""
+    raw_lines = code.strip("\n").split("\n")
+    lines, issues = [], []
+    for number, line in enumerate(raw_lines, 1):
+        fixed = _FULLWIDTH_ARROW.sub("-->", line)
+        if fixed != line:
+            issues.append(Issue(number, "fullwidth_arrow", True))
+        if _LOOSE_ARROW.search(fixed):
+            # Rewritten only if that makes more nodes parse: A -> B would otherwise read as one node
+            # A[...] with a label running to the last "]", and a -> inside a quoted label stays as it is.
+            loose = _LOOSE_ARROW.sub(" --> ", fixed).rstrip()
+            before, after = _parse_chain(fixed.strip()), _parse_chain(loose.strip())
+            if after and len(after[0]) > len(before[0] if before else ()):
+                issues.append(Issue(number, "loose_arrow", True))
+                fixed = loose
+        lines.append(fixed)
+
+    nodes, parsed = set(), {}
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if not stripped or _HEADER.match(stripped) or _BARE_HEADER.match(stripped) or _OTHER_STATEMENT.match(
+                stripped) or stripped.startswith(("style ", "subgraph")) or re.match(r"^end\s*;?$", stripped):
+            continue
+        chain = _parse_chain(stripped)
+        parsed[number] = chain
+        if chain:
+            nodes.update(chain[0])
+
+    out, depth, header = [], 0, None
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        indent = line[:len(line) - len(line.lstrip())]
+        if not stripped or _OTHER_STATEMENT.match(stripped):
+            out.append(line)
+        elif _HEADER.match(stripped) or _BARE_HEADER.match(stripped):
+            if header is None:
+                header = stripped if _HEADER.match(stripped) else None
+                if header is None or any(not l.strip().startswith("%%") for l in out if l.strip()):
+                    issues.append(Issue(number, "header", True))
+                header = header or "graph TD"
+        elif stripped.startswith("style ") or stripped == "style":
+            styles, kinds = _fix_style(stripped, nodes)
+            issues.extend(Issue(number, kind, True) for kind in kinds)
+            out.extend(indent + style for style in styles)
+        elif _SUBGRAPH.match(stripped):
+            depth += 1
+            rest = _SUBGRAPH.match(stripped).group("rest").strip()
+            titled = _SUBGRAPH_TITLE.match(rest)
+            if titled:
+                title, kind = _fix_label(titled.group("title"))
+                rest = f"{titled.group('id')} [{title}]"
+            else:
+                title, kind = _fix_label(rest)
+                if kind:
+                    rest = f"sg{number} [{title}]"
+            if kind:
+                issues.append(Issue(number, kind, True))
+            out.append(f"{indent}subgraph {rest}")
+        elif re.match(r"^end\s*;?$", stripped):
+            if depth == 0:
+                issues.append(Issue(number, "unbalanced_end", True))
+                continue
+            depth -= 1
+            out.append(line)
+        elif parsed.get(number):
+            _, labels, edge_labels, _ = parsed[number]
+            fixed, kinds = _rewrite(stripped, labels + edge_labels)
+            issues.extend(Issue(number, kind, True) for kind in kinds)
+            out.append(indent + fixed)
+        elif _LINK_START.search(stripped) or _LOOSE_ARROW.search(stripped):
+            issues.append(Issue(number, "syntax", False))
+            out.append(line)
+        else:
+            # Legend or explanation text the model wrote inside the block; kept as a comment.
+            issues.append(Issue(number, "stray_text", True))
+            out.append(f"{indent}%% {stripped}")
+    if depth > 0:
+        issues.append(Issue(len(lines), "unclosed_subgraph", True))
+        out.extend(["end"] * depth)
+    if header is None:
+        issues.append(Issue(1, "header", True))
+    # The declaration goes first; only comments and %%{init}%% directives may precede it.
+    first = next((i for i, l in enumerate(out) if l.strip() and not l.strip().startswith("%%")), len(out))
+    out.insert(first, header or "graph TD")
+    if not nodes:
+        issues.append(Issue(None, "empty", False))
+    return out, issues
+
+
+def validate(code):
+    """Issues st_mermaid would likely fail on, as [Issue(line, kind, fixed)]; fixed means repair() handles it."""
+    return _analyze(code)[1]
+
+
+def repair(code):
+    """The locally repaired diagram and its issues; the diagram should render when all issues are fixed."""
+    lines, issues = _analyze(code)
+    return "\n".join(lines), issues
+
+
+def _label_text(text):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        text = text[1:-1]
+    return re.sub(r"<br\s*/?>", " ", text, flags=re.IGNORECASE).replace("#quot;", '"').strip()
+
+
+def outline(code):
+    """Node labels in order of first appearance, grouped by subgraph: [(title or None, [label, ...])]."""
+    lines, _ = _analyze(code)
+    groups, stack, seen = {}, [], set()
+    for line in lines:
+        stripped = line.strip()
+        subgraph = _SUBGRAPH.match(stripped)
+        if subgraph:
+            titled = _SUBGRAPH_TITLE.match(subgraph.group("rest").strip())
+            stack.append(_label_text(titled.group("title") if titled else subgraph.group("rest")))
+            continue
+        if re.match(r"^end\s*;?$", stripped):
+            if stack:
+                stack.pop()
+            continue
+        if (not stripped or _HEADER.match(stripped) or _OTHER_STATEMENT.match(stripped)
+                or stripped.startswith("style ")):
+            continue
+        chain = _parse_chain(stripped)
+        if not chain:
+            continue
+        ids, _, _, named = chain
+        for node in ids:
+            if node in seen:
+                continue
+            seen.add(node)
+            label = _label_text(stripped[slice(*named[node])]) if node in named else node
+            groups.setdefault(stack[-1] if stack else None, []).append(label)
+    return list(groups.items())
+
+
+def describe(issues):
+    return "\n".join(f"- 第 {i.line} 行: {ISSUE_TEXT[i.kind]}" if i.line else f"- {ISSUE_TEXT[i.kind]}"
+                     for i in issues)
+
+
+# --- 回答中的圖表區塊 ---
+def _split(text):
+    """(before, code, after, stray style lines) of the first ```mermaid block, or None."""
+    start = text.find(_FENCE)
+    if start < 0:
+        return None
+    body_start = text.find("\n", start)
+    if body_start < 0:
+        return None
+    close = re.compile(r"^[ \t]*```[ \t]*$", re.MULTILINE).search(text, body_start + 1)
+    code = text[body_start + 1:close.start() if close else len(text)]
+    after = text[close.end():] if close else ""
+    stray = []
+    after_lines = after.split("\n")
+    while after_lines and (not after_lines[0].strip() or after_lines[0].strip().startswith("style ")):
+        line = after_lines.pop(0)
+        if line.strip():
+            stray.append(line.strip())
+    if stray:
+        after = "\n".join(after_lines)
+    return text[:start], code, after, stray
+
+
+def _join(before, code, after):
+    if after and not after.startswith("\n"):
+        after = "\n" + after
+    return f"{before}{_FENCE}\n{code}\n```{after}"
+
+
+@lru_cache(maxsize=256)
+def diagram_parts(text):
+    """(before, locally repaired code, after) for rendering a stored answer, or None without a diagram."""
+    split = _split(text)
+    if split is None:
+        return None
+    before, code, after, stray = split
+    fixed, _ = repair("\n".join([code.rstrip("\n")] + stray))
+    return before, fixed, after
+
+
+def request_repair(llm, code, issues):
+    """Asks the model to fix the diagram alone and returns its code."""
+    from langchain_core.prompts import ChatPromptTemplate
+
+    chain = ChatPromptTemplate.from_template(MERMAID_REPAIR_PROMPT) | llm
+    content = chain.invoke({"code": code, "issues": describe(issues)}).content
+    split = _split(content if _FENCE in content else f"{_FENCE}\n{content.strip().strip('`')}\n```")
+    return split[1] if split else content
+
+
+def repair_message(text, llm=None):
+    """The answer with its diagram repaired: locally first, then by a diagram-only model call if needed."""
+    split = _split(text)
+    if split is None:
+        return text
+    before, code, after, stray = split
+    fixed, issues = repair("\n".join([code.rstrip("\n")] + stray))
+    if stray:
+        issues.append(Issue(None, "style_outside_block", True))
+    if not issues:
+        _stats.record("valid", issues)
+        return text
+    outcome = "local"
+    if any(not issue.fixed for issue in issues):
+        outcome = "failed"
+        if llm is not None:
+            try:
+                model_fixed, model_issues = repair(request_repair(llm, fixed, issues))
+                if all(issue.fixed for issue in model_issues):
+                    fixed, outcome = model_fixed, "model"
+            except Exception as e:
+                print(f"[mermaid_repair] 模型修复失败: {e}")
+    _stats.record(outcome, issues)
+    return _join(before, fixed, after)
+
+
+# --- 修復率統計 ---
+class RepairStats:
+    """Process-wide counts of diagrams by outcome and of the issues found."""
+
+    OUTCOMES = ("valid", "local", "model", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.outcomes = Counter()
+        self.issues = Counter()
+
+    def record(self, outcome, issues):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            self.issues.update(issue.kind for issue in issues)
+
+    def snapshot(self):
+        with self._lock:
+            total = sum(self.outcomes.values())
+            return {"diagrams": total, **{k: self.outcomes[k] for k in self.OUTCOMES},
+                    "rates": {k: round(self.outcomes[k] / total, 3) if total else None for k in self.OUTCOMES},
+                    "issues": dict(self.issues.most_common())}
+
+
+_stats = RepairStats()
+
+
+def repair_stats():
+    return _stats.snapshot()
@@ -0,0 +1,156 @@
+import re
+
+from PIL import Image, ImageOps
+
+# --- OCR 影像前處理 ---
+# Scanned curriculum pages are cleaned up with Pillow before they reach
+# Tesseract: grayscale, binarization, deskew, border crop and downscaling.
+
+OCR_RENDER_DPI = 200
+MAX_OCR_WIDTH = 1700
+MAX_SKEW_ANGLE = 5.0
+SKEW_STEP = 0.5
+SKEW_PROBE_WIDTH = 800
+CROP_MARGIN = 12
+DARK_EDGE_RATIO = 0.5
+MIN_LATIN_WORDS = 3
+
+_LATIN_WORD = re.compile(r"[A-Za-z]{2,}")
+
+
+def otsu_threshold(gray):
+    """Returns the Otsu threshold of a grayscale image, computed from its histogram."""
+    hist = gray.histogram()[:256]
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    sum_b, weight_b, best, threshold = 0, 0, -1.0, 127
+    for t, count in enumerate(hist):
+        weight_b += count
+        if weight_b == 0:
+            continue
+        weight_f = total - weight_b
+        if weight_f == 0:
+            break
+        sum_b += t * count
+        mean_b = sum_b / weight_b
+        mean_f = (sum_all - sum_b) / weight_f
+        between = weight_b * weight_f * (mean_b - mean_f) ** 2
+        if between > best:
+            best, threshold = between, t
+    return threshold
+
+
+def binarize(gray, threshold=None):
+    if threshold is None:
+        threshold = otsu_threshold(gray)
+    return gray.point(lambda p: 255 if p > threshold else 0)
+
+
+def downscale(gray, max_width=MAX_OCR_WIDTH):
+    if gray.width <= max_width:
+        return gray
+    height = round(gray.height * max_width / gray.width)
+    return gray.resize((max_width, height), Image.Resampling.LANCZOS)
+
+
+def _row_profile(image):
+    return list(image.resize((1, image.height), Image.Resampling.BOX).getdata())
+
+
+def _col_profile(image):
+    return list(image.resize((image.width, 1), Image.Resampling.BOX).getdata())
+
+
+def estimate_skew(binary, max_angle=MAX_SKEW_ANGLE, step=SKEW_STEP):
+    """Finds the rotation that makes text rows sharpest (max variance of the row profile)."""
+    probe = binary
+    if probe.width > SKEW_PROBE_WIDTH:
+        probe = probe.resize((SKEW_PROBE_WIDTH, round(probe.height * SKEW_PROBE_WIDTH / probe.width)))
+    ink = ImageOps.invert(probe)
+    best_angle, best_score = 0.0, -1.0
+    steps = int(max_angle / step)
+    # 0°, then outward in both directions: a tie (a blank or uniform page) keeps the smallest rotation
+    for i in sorted(range(-steps, steps + 1), key=abs):
+        angle = i * step
+        profile = _row_profile(ink.rotate(angle, resample=Image.Resampling.BILINEAR, fillcolor=0))
+        mean = sum(profile) / len(profile)
+        score = sum((v - mean) ** 2 for v in profile)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def deskew(binary, angle):
+    if not angle:
+        return binary
+    rotated = binary.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=255)
+    return binarize(rotated, threshold=127)
+
+
+def strip_dark_edges(binary, dark_ratio=DARK_EDGE_RATIO):
+    """Removes the black bands scanners leave along the page edges."""
+    rows, cols = _row_profile(binary), _col_profile(binary)
+    limit = 255 * dark_ratio
+    top, bottom = 0, len(rows)
+    while top < bottom and rows[top] < limit:
+        top += 1
+    while bottom > top and rows[bottom - 1] < limit:
+        bottom -= 1
+    left, right = 0, len(cols)
+    while left < right and cols[left] < limit:
+        left += 1
+    while right > left and cols[right - 1] < limit:
+        right -= 1
+    if (left, top, right, bottom) == (0, 0, binary.width, binary.height) or right <= left or bottom <= top:
+        return binary
+    return binary.crop((left, top, right, bottom))
+
+
+def crop_to_content(binary, margin=CROP_MARGIN):
+    bbox = ImageOps.invert(binary).getbbox()
+    if bbox is None:
+        return binary
+    left, top, right, bottom = bbox
+    return binary.crop((max(left - margin, 0), max(top - margin, 0),
+                        min(right + margin, binary.width), min(bottom + margin, binary.height)))
+
+
+def preprocess_page(image):
+    """Runs the full pipeline on one rendered page and returns a clean black-on-white image."""
+    gray = downscale(ImageOps.grayscale(image))
+    binary = strip_dark_edges(binarize(gray))
+    binary = deskew(binary, estimate_skew(binary))
+    return crop_to_content(binary)
+
+
+def needs_latin_model(text, min_words=MIN_LATIN_WORDS):
+    """A chi_sim pass that still shows several Latin words means the page needs the eng model too."""
+    return len(_LATIN_WORD.findall(text)) >= min_words
+
+
+def ocr_page(image, tesseract, preprocess=True, lang=None):
+    """OCRs one page with `lang`, or without it with chi_sim only, falling back to chi_sim+eng on
+    mixed-script pages.
+
+    Returns the recognized text and the Tesseract language string that produced it.
+    """
+    prepared = preprocess_page(image) if preprocess else image
+    if lang:
+        return tesseract.image_to_string(prepared, lang=lang), lang
+    text = tesseract.image_to_string(prepared, lang="chi_sim")
+    if needs_latin_model(text):
+        return tesseract.image_to_string(prepared, lang="chi_sim+eng"), "chi_sim+eng"
+    return text, "chi_sim"
+
+
+def ocr_pages(images, tesseract, preprocess=True):
+    """OCRs the pages of one document, yielding (text, lang) per page.
+
+    The language is picked on the first page and kept for the rest, so only
+    that page can be read twice; a curriculum's course codes and English
+    course names run through the whole document, not single pages.
+    """
+    lang = None
+    for image in images:
+        text, lang = ocr_page(image, tesseract, preprocess, lang)
+        yield text, lang
@@ -0,0 +1,130 @@
+import importlib.util
+import io
+import os
+import re
+import shutil
+import subprocess
+
+# --- PDF 文字擷取後端 ---
+# Text-layer PDFs go through one of several extractors, chosen per
+# deployment with PDF_EXTRACTOR: a single backend name, a comma-separated
+# preference list, or "auto" (the default, AUTO_ORDER). The first installed
+# backend is used. If it fails on a file, the next one in the list is tried.
+# PyPDF2 follows the content stream, so a table written column by column
+# comes out as one column after another. Poppler's pdftotext -layout and
+# pypdf's layout mode place text by position and keep each table row on one
+# line, which parse_courses needs. pdfminer does the same here, at a lower
+# speed, by regrouping its lines by height. PyPDF2 stays last as the
+# always-installed fallback.
+#
+#     PDF_EXTRACTOR=pypdf2 streamlit run web_test.py
+#     PDF_EXTRACTOR=pdfminer,pypdf2 python batch_reports.py ...
+#
+# benchmarks/bench_pdf_extract.py compares the backends on a generated corpus.
+#
+# The layout backends pad columns with runs of spaces and blank lines, about
+# as many characters again as the text itself. parse_courses works on the
+# layout text; what goes into a prompt is compact_text() of it.
+
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "auto")
+AUTO_ORDER = ("pdftotext", "pypdf", "pdfminer", "pypdf2")
+PDFTOTEXT_TIMEOUT = float(os.getenv("PDFTOTEXT_TIMEOUT", "120"))
+ROW_TOLERANCE = 2.0  # points; pdfminer lines whose baselines round together form one row
+
+_SPACE_RUN = re.compile(r"[ \t\u3000]{2,}")
+_BLANK_LINES = re.compile(r"\n\s*\n")
+
+
+class ExtractorUnavailable(RuntimeError):
+    """No backend in the configured list is installed, or a name is unknown."""
+
+
+def _pdftotext(data):
+    result = subprocess.run(["pdftotext", "-layout", "-enc", "UTF-8", "-q", "-", "-"], input=data,
+                            capture_output=True, timeout=PDFTOTEXT_TIMEOUT, check=True)
+    # Pages are separated by form feeds, with one after the last page.
+    return result.stdout.decode("utf-8", errors="ignore").split("\f")[:-1] or [""]
+
+
+def _pdfminer(data):
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LAParams, LTTextContainer, LTTextLine
+
+    pages = []
+    for layout in extract_pages(io.BytesIO(data), laparams=LAParams(line_margin=0.3)):
+        # pdfminer boxes a table column by column; lines at the same height are put back into one row.
+        rows = {}
+        for box in layout:
+            if isinstance(box, LTTextContainer):
+                for line in box:
+                    if isinstance(line, LTTextLine) and line.get_text().strip():
+                        rows.setdefault(round(line.y0 / ROW_TOLERANCE), []).append((line.x0, line.get_text().strip()))
+        pages.append("\n".join("  ".join(text for _, text in sorted(cells))
+                               for _, cells in sorted(rows.items(), reverse=True)))
+    return pages or [""]
+
+
+def _pypdf(data):
+    import pypdf
+
+    pages = pypdf.PdfReader(io.BytesIO(data)).pages
+    try:
+        # Layout mode (pypdf >= 3.17) lays text out by position, so table rows stay on one line.
+        return [page.extract_text(extraction_mode="layout") or "" for page in pages]
+    except TypeError:
+        return [page.extract_text() or "" for page in pages]
+
+
+def _pypdf2(data):
+    import PyPDF2
+
+    return [page.extract_text() or "" for page in PyPDF2.PdfReader(io.BytesIO(data)).pages]
+
+
+# name -> (how to check it is installed, extractor returning one string per page)
+BACKENDS = {
+    "pdftotext": (lambda: shutil.which("pdftotext") is not None, _pdftotext),
+    "pypdf": (lambda: importlib.util.find_spec("pypdf") is not None, _pypdf),
+    "pdfminer": (lambda: importlib.util.find_spec("pdfminer") is not None, _pdfminer),
+    "pypdf2": (lambda: importlib.util.find_spec("PyPDF2") is not None, _pypdf2),
+}
+
+
+def available_backends():
+    return [name for name, (installed, _) in BACKENDS.items() if installed()]
+
+
+def backend_order(spec=None):
+    """The installed backends named by `spec` (default PDF_EXTRACTOR), in preference order."""
+    spec = (spec or PDF_EXTRACTOR).strip().lower()
+    names = AUTO_ORDER if spec == "auto" else [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        raise ExtractorUnavailable(f"未知的 PDF 解析后端: {', '.join(unknown)}，可选: {', '.join(BACKENDS)}")
+    installed = [name for name in names if BACKENDS[name][0]()]
+    if not installed:
+        raise ExtractorUnavailable(f"PDF 解析后端均未安装: {', '.join(names)}")
+    return installed
+
+
+def extract_pages(data, backend=None):
+    """Text of each page of a PDF given as bytes; empty pages (scans) come back as empty strings."""
+    error = None
+    for name in backend_order(backend):
+        try:
+            return BACKENDS[name][1](data)
+        except Exception as e:
+            print(f"[pdf_extract] {name} 解析失败，尝试下一个后端: {e}")
+            error = e
+    raise error
+
+
+def extract_pdf_text(data, backend=None):
+    return "\n\n".join(extract_pages(data, backend))
+
+
+def compact_text(text):
+    """Layout text for a prompt: column padding becomes one space, blank lines go, rows stay one per line."""
+    text = _SPACE_RUN.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.splitlines())
+    return _BLANK_LINES.sub("\n", text).strip()
@@ -0,0 +1,366 @@
+"""Prompt-size profiler for every mode and stage.
+
+Renders each prompt the apps send (career_bot.py PROMPTS and its Mode 2-4
+templates, the web_test.py mode prompts and the curriculum prompts from
+web_prompts.py) with recorded or synthetic inputs, counts tokens with a
+local tokenizer and reports tokens per call per stage. Text that appears in
+two messages of the same call (e.g. career_bot stage 4, which formats the
+whole history into the system prompt *and* sends it again through
+MessagesPlaceholder) is flagged as duplicated context.
+
+    python prompt_profiler.py
+    python prompt_profiler.py --inputs recorded.json --budget "web.curriculum.*=9000" --budget "*=6000"
+    python prompt_profiler.py --tokenizer /models/deepseek/tokenizer.json --json prompt_sizes.json
+
+Exits with status 1 when a call exceeds its budget.
+"""
+import argparse
+import fnmatch
+import json
+import re
+import sys
+
+from bot_test import TEST_ANSWERS
+from career_bot import (PROMPTS, EXPLORATION_META_PROMPT, OFFER_DECISION_PROMPT, FAMILY_SIMULATION_PROMPT,
+                        COMPANY_INFO_PROMPT as CLI_COMPANY_INFO_PROMPT)
+from curriculum_compare import compare, format_comparison
+from web_prompts import (EXPLORATION_INTERIM_PROMPTS, EXPLORATION_REPORT_PROMPT, DECISION_PROMPT,
+                         COMMUNICATION_ROLE_PROMPT, COMMUNICATION_DEBRIEF_PROMPT, COMPANY_INFO_PROMPT,
+                         PANORAMIC_PROMPT, PANORAMIC_CACHED_CHAIN_PROMPT, CURRICULUM_ANALYSIS_PROMPT,
+                         CURRICULUM_PATH_PROMPT, CURRICULUM_COURSES_PROMPT, CURRICULUM_COMPARE_PROMPT)
+
+SHINGLE_CHARS = 32
+MIN_DUPLICATE_TOKENS = 50
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]")
+
+
+class TokenCounter:
+    """Counts tokens with the best local tokenizer available."""
+
+    def __init__(self, tokenizer_path=None):
+        self.name = "heuristic"
+        self._encode = None
+        if tokenizer_path:
+            from tokenizers import Tokenizer
+            tokenizer = Tokenizer.from_file(tokenizer_path)
+            self.name = f"hf:{tokenizer_path}"
+            self._encode = lambda text: len(tokenizer.encode(text).ids)
+            return
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding("cl100k_base")
+            self.name = "tiktoken:cl100k_base"
+            self._encode = lambda text: len(encoding.encode(text))
+        except Exception:
+            pass
+
+    def count(self, text):
+        if self._encode is not None:
+            return self._encode(text)
+        # DeepSeek's published ratios: ~0.6 token per CJK character, ~0.3 per other character.
+        cjk = len(_CJK.findall(text))
+        return round(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+
+# --- Synthetic inputs (override any of them with --inputs recorded.json) ---
+def synthetic_curriculum():
+    rows = "\n".join(f"{1000000 + i} 专业课程{i} {i % 4 + 1} {(i % 4 + 1) * 16}" for i in range(120))
+    prose = "本专业培养德智体美劳全面发展，具有扎实的专业基础知识和较强实践能力的高素质应用型人才。" * 40
+    return f"一、培养目标\n{prose}\n二、毕业要求\n{prose}\n三、课程设置\n{rows}"
+
+
+def synthetic_comparison(curriculum):
+    """The local diff of the curriculum against a variant with about a quarter of its courses renamed."""
+    variant = curriculum.replace("专业课程1", "方向课程1")
+    return format_comparison(compare([("本专业", curriculum), ("第二专业", variant)]))
+
+
+SAMPLE = {
+    "answers": TEST_ANSWERS,
+    "ai_replies": [
+        "你的回答很有洞察力。你提到对法律科技的兴趣，这正好连接了你的专业优势与社会趋势，值得进一步思考你在其中想扮演的角色。",
+        "学校平台与城市产业是你的重要资源。不妨想一想，律所与AI创业公司的招聘需求之间，是否存在可以连接的交叉岗位？",
+        "家庭期待与榜样的影响同样真实。你欣赏的似乎是那位律师“用技术解决问题”的状态，而不仅仅是创业这个身份本身。",
+        "两个方向都很具体。建议分别列出三年后的理想状态，再对照收入、成长与家庭期待，看看哪一个更让你坚定。",
+        "行动计划很清晰。联系学长时，可以准备三个具体问题，比如他入行的第一步、最看重的能力，以及踩过的坑。",
+    ],
+    "family_replies": [
+        "孩子，你说的这些我听明白了一部分，可是这个行业这么新，万一几年后就不行了，你又该怎么办呢？",
+        "游戏公司听说天天加班，身体熬坏了怎么办？考个公务员或者进国企，我们也放心一些。",
+        "你表哥在银行干得好好的，每年都有年终奖。你再想想，家里也不是要你大富大贵。",
+        "那你说说，如果三年以后没做出成绩，你打算怎么办？有没有给自己留条后路？",
+    ],
+    "family_next": "爸妈，我理解你们担心稳定。我查过了，这家公司成立十几年，我会先干满两年，同时准备好备选方案。",
+    "offer_a": "公司: A科技\n职位: 初级产品经理\n薪资: 15k * 14薪\n地点: 上海张江\n优点: 成长快\n顾虑: 加班多",
+    "offer_b": "公司: B集团\n职位: 管培生\n薪资: 13k * 16薪 + 2w签字费\n地点: 北京海淀\n优点: 稳定\n顾虑: 晋升慢",
+    "priorities": "职业成长, 薪资福利",
+    "company_name": "字节跳动",
+    "my_choice": "游戏策划",
+    "family_concern": "工作不稳定，不是铁饭碗",
+    "family_turns": 6,
+    "user_profile": "学历背景: 计算机科学本科\n核心技能: Python、数据分析、沟通\n相关经验: 两段互联网实习\n品行特质: 责任心强\n内在动机: 做出有用的产品",
+    "chosen_professions": "数据分析师",
+    "chosen_region": "上海、杭州",
+    "industry_chain": "上游·数据采集: 埋点系统、第三方数据平台\n中游·数据处理: 数据仓库、ETL、BI 工具\n"
+                      "下游·业务应用: 用户增长、风控、商业决策",
+    "career_path": "数据分析师",
+    "key_courses": "数据结构, 数据库原理, 机器学习",
+    "curriculum_content": None,
+    "comparison": None,  # synthetic_comparison(curriculum_content) unless given
+}
+
+
+def family_turns(inputs):
+    """Alternating parent/user turns; the user side reuses the sample answers as stand-in replies."""
+    turns = []
+    for i in range(inputs["family_turns"]):
+        if i % 2 == 0:
+            turns.append(("ai", inputs["family_replies"][(i // 2) % len(inputs["family_replies"])]))
+        else:
+            turns.append(("human", inputs["answers"][i // 2]))
+    return turns
+
+
+def history_pairs(inputs, count):
+    messages = []
+    for answer in inputs["answers"][:count]:
+        messages += [("human", answer), ("ai", inputs["ai_replies"][len(messages) // 2])]
+    return messages
+
+
+# --- Calls: each returns the list of (role, text) messages one model call sends ---
+CALLS = {}
+
+
+def call(name):
+    def register(builder):
+        CALLS[name] = builder
+        return builder
+    return register
+
+
+def _register_cli_exploration(stage):
+    @call(f"cli.exploration.stage{stage}")
+    def build(inputs):
+        history = history_pairs(inputs, stage - 1)
+        stage_prompt = PROMPTS[stage]["prompt"]
+        if stage == 4:
+            summary = "\n".join(f"{role.capitalize()}: {text}" for role, text in history)
+            stage_prompt = stage_prompt.format(history=summary)
+        system = EXPLORATION_META_PROMPT.format(current_stage=stage, stage_prompt=stage_prompt)
+        return [("system", system)] + history + [("human", inputs["answers"][stage - 1])]
+
+
+for _stage in PROMPTS:
+    _register_cli_exploration(_stage)
+
+
+@call("cli.decision")
+def _(inputs):
+    return [("human", OFFER_DECISION_PROMPT.format(offer_a_details=inputs["offer_a"],
+                                                   offer_b_details=inputs["offer_b"]))]
+
+
+@call("cli.communication.turn")
+def _(inputs):
+    system = FAMILY_SIMULATION_PROMPT.format(family_concern=inputs["family_concern"])
+    return [("system", system)] + family_turns(inputs) + [("human", inputs["family_next"])]
+
+
+@call("cli.company_info")
+def _(inputs):
+    return [("human", CLI_COMPANY_INFO_PROMPT.format(company_name=inputs["company_name"]))]
+
+
+def _register_web_interim(stage, answer_index):
+    @call(f"web.exploration.stage{stage}")
+    def build(inputs):
+        return [("human", EXPLORATION_INTERIM_PROMPTS[stage].format(user_input=inputs["answers"][answer_index]))]
+
+
+for _stage, _index in ((2, 0), (4, 1), (6, 2)):
+    _register_web_interim(_stage, _index)
+
+
+@call("web.exploration.stage7")
+def _(inputs):
+    conversation = "\n\n".join(inputs["answers"][:3])
+    return [("human", EXPLORATION_REPORT_PROMPT.format(conversation_history=conversation))]
+
+
+@call("web.decision")
+def _(inputs):
+    return [("human", DECISION_PROMPT.format(offer_a_details=inputs["offer_a"], offer_b_details=inputs["offer_b"],
+                                             user_priorities_sorted_list=inputs["priorities"]))]
+
+
+@call("web.communication.turn")
+def _(inputs):
+    system = COMMUNICATION_ROLE_PROMPT.format(my_choice=inputs["my_choice"], family_concern=inputs["family_concern"])
+    return [("system", system)] + family_turns(inputs) + [("human", inputs["family_next"])]
+
+
+@call("web.communication.debrief")
+def _(inputs):
+    conversation = "\n".join(f"{'家人' if role == 'ai' else '我'}: {text}" for role, text in family_turns(inputs))
+    return [("human", COMMUNICATION_DEBRIEF_PROMPT.format(my_choice=inputs["my_choice"],
+                                                          family_concern=inputs["family_concern"],
+                                                          conversation_history=conversation))]
+
+
+@call("web.company_info")
+def _(inputs):
+    return [("human", COMPANY_INFO_PROMPT.format(company_name=inputs["company_name"]))]
+
+
+def _register_web_panoramic(stage):
+    @call(f"web.panoramic.stage{stage}")
+    def build(inputs):
+        return [("human", PANORAMIC_PROMPT.format(
+            current_stage=stage, user_profile=inputs["user_profile"],
+            chosen_professions=inputs["chosen_professions"] if stage > 2 else "N/A",
+            chosen_region=inputs["chosen_region"] if stage > 3 else "N/A"))]
+
+
+for _stage in (2, 3, 4):
+    _register_web_panoramic(_stage)
+
+
+@call("web.panoramic.stage4.cached")
+def _(inputs):
+    return [("human", PANORAMIC_CACHED_CHAIN_PROMPT.format(
+        current_stage=4, user_profile=inputs["user_profile"], chosen_professions=inputs["chosen_professions"],
+        chosen_region=inputs["chosen_region"], industry_chain=inputs["industry_chain"]))]
+
+
+@call("web.curriculum.stage1")
+def _(inputs):
+    return [("human", CURRICULUM_ANALYSIS_PROMPT.format(curriculum_content=inputs["curriculum_content"]))]
+
+
+@call("web.curriculum.stage2")
+def _(inputs):
+    return [("human", CURRICULUM_PATH_PROMPT.format(career_path=inputs["career_path"],
+                                                    curriculum_content=inputs["curriculum_content"]))]
+
+
+@call("web.curriculum.stage3")
+def _(inputs):
+    return [("human", CURRICULUM_COURSES_PROMPT.format(key_courses_list=inputs["key_courses"],
+                                                       curriculum_content=inputs["curriculum_content"]))]
+
+
+@call("web.curriculum.compare")
+def _(inputs):
+    comparison = inputs["comparison"] or synthetic_comparison(inputs["curriculum_content"])
+    return [("human", CURRICULUM_COMPARE_PROMPT.format(comparison=comparison))]
+
+
+# --- Analysis ---
+def _shingles(text, width=SHINGLE_CHARS):
+    return {text[i:i + width] for i in range(len(text) - width + 1)}
+
+
+def duplicated_chars(shingles, target, width=SHINGLE_CHARS):
+    """Number of characters of `target` covered by `width`-character windows found in `shingles`."""
+    if len(target) < width:
+        return 0
+    covered = bytearray(len(target))
+    for i in range(len(target) - width + 1):
+        if target[i:i + width] in shingles:
+            covered[i:i + width] = b"\x01" * width
+    return sum(covered)
+
+
+def profile_call(name, messages, counter):
+    tokens = [counter.count(text) for _, text in messages]
+    duplicates = []
+    seen = set()
+    for j, (role, text) in enumerate(messages):
+        chars = duplicated_chars(seen, text)
+        if chars:
+            duplicates.append({"message": f"{j}:{role}", "tokens": round(tokens[j] * chars / len(text))})
+        seen |= _shingles(text)
+    # Many small repeats (every history turn echoed in a summary) add up, so the threshold applies to the total.
+    if sum(d["tokens"] for d in duplicates) < MIN_DUPLICATE_TOKENS:
+        duplicates = []
+    return {"call": name, "messages": len(messages), "tokens": sum(tokens),
+            "largest_message": max(tokens) if tokens else 0,
+            "duplicated_tokens": sum(d["tokens"] for d in duplicates), "duplicates": duplicates}
+
+
+def parse_budgets(values, budget_file):
+    budgets = []
+    if budget_file:
+        with open(budget_file, encoding="utf-8") as f:
+            budgets += list(json.load(f).items())
+    for value in values or []:
+        pattern, _, limit = value.rpartition("=")
+        budgets.append((pattern, int(limit)))
+    return budgets
+
+
+def budget_for(name, budgets):
+    """The first matching pattern wins, so list specific patterns before catch-alls."""
+    for pattern, limit in budgets:
+        if fnmatch.fnmatch(name, pattern):
+            return limit
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", help="JSON file with recorded inputs overriding the synthetic ones")
+    parser.add_argument("--curriculum", help="text file used as curriculum_content")
+    parser.add_argument("--tokenizer", help="path to a local tokenizer.json (HuggingFace tokenizers format)")
+    parser.add_argument("--only", default="*", help="glob over call names, e.g. 'web.*'")
+    parser.add_argument("--budget", action="append", help="PATTERN=TOKENS, may be repeated")
+    parser.add_argument("--budget-file", help="JSON object of {pattern: tokens}")
+    parser.add_argument("--json", help="write the full report to this file")
+    args = parser.parse_args(argv)
+
+    inputs = dict(SAMPLE, curriculum_content=synthetic_curriculum())
+    if args.inputs:
+        with open(args.inputs, encoding="utf-8") as f:
+            inputs.update(json.load(f))
+    if args.curriculum:
+        with open(args.curriculum, encoding="utf-8") as f:
+            inputs["curriculum_content"] = f.read()
+
+    counter = TokenCounter(args.tokenizer)
+    budgets = parse_budgets(args.budget, args.budget_file)
+    report, failures = [], []
+    print(f"tokenizer: {counter.name}\n")
+    print(f"{'call':<30}{'msgs':>6}{'tokens':>9}{'largest':>9}{'dup':>7}{'budget':>9}")
+    for name, builder in CALLS.items():
+        if not fnmatch.fnmatch(name, args.only):
+            continue
+        row = profile_call(name, builder(inputs), counter)
+        row["budget"] = budget_for(name, budgets)
+        report.append(row)
+        over = row["budget"] is not None and row["tokens"] > row["budget"]
+        if over:
+            failures.append(row)
+        flag = "  OVER BUDGET" if over else ""
+        flag += "  DUPLICATED CONTEXT" if row["duplicated_tokens"] else ""
+        print(f"{name:<30}{row['messages']:>6}{row['tokens']:>9}{row['largest_message']:>9}"
+              f"{row['duplicated_tokens']:>7}{row['budget'] or '-':>9}{flag}")
+
+    if any(row["duplicates"] for row in report):
+        print()
+    for row in report:
+        for dup in row["duplicates"]:
+            print(f"[duplicated context] {row['call']}: ~{dup['tokens']} tokens of message {dup['message']} "
+                  f"were already sent earlier in the same call")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"tokenizer": counter.name, "calls": report}, f, ensure_ascii=False, indent=2)
+    if failures:
+        print(f"\nFAIL: {len(failures)} call(s) over budget: {', '.join(r['call'] for r in failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
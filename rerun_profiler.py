@@ -0,0 +1,126 @@
+import hmac
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# --- 重新執行效能剖析 ---
+# Every interaction reruns web_test.py from the top. When profiling is on,
+# each rerun is split into phases (css, state_init, sidebar,
+# history_render, chain_build, widget_layout, generation), and every
+# phase reports exclusive time, so a nested phase is not also counted in
+# its parent. Fragment reruns are recorded separately with scope
+# "fragment". One JSON line per rerun goes to RERUN_PROFILE_PATH, which is
+# rotated to a single ".1" backup once it passes RERUN_PROFILE_MAX_BYTES.
+# When profiling is off, phase() costs one thread-local lookup.
+#
+# RERUN_PROFILE=1 turns it on for every visitor. Otherwise a visitor turns
+# it on with ?debug=<token>, where the token is RERUN_PROFILE_TOKEN or the
+# rerun_profile_token secret; without a token, ?debug does nothing, since
+# the panels it opens show usage across all sessions.
+
+PROFILE_ENV = os.getenv("RERUN_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_TOKEN = os.getenv("RERUN_PROFILE_TOKEN", "")
+PROFILE_PATH = os.getenv("RERUN_PROFILE_PATH", "rerun_profile.jsonl")
+PROFILE_MAX_BYTES = int(os.getenv("RERUN_PROFILE_MAX_BYTES", str(5 * 1024 * 1024)))
+RECENT_RERUNS = 50
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+class RerunProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name):
+        frame = [time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[1]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def summary(self, **context):
+        total = time.perf_counter() - self.started
+        phases = {name: round(seconds * 1000, 2) for name, seconds in self.phases.items()}
+        phases["other"] = round(max(0.0, total - sum(self.phases.values())) * 1000, 2)
+        # Model time is waiting, not script work; keep it out of the script total.
+        script_ms = round(total * 1000 - phases.get("generation", 0.0), 2)
+        return dict(context, ts=time.time(), total_ms=round(total * 1000, 2), script_ms=script_ms, phases=phases)
+
+
+def debug_allowed(requested, secrets=None):
+    """Whether ?debug=`requested` matches the configured token; False when no token is configured."""
+    token = PROFILE_TOKEN
+    if not token and secrets is not None:
+        try:
+            token = str(secrets["rerun_profile_token"])
+        except (KeyError, FileNotFoundError):
+            token = ""
+    return bool(token and requested) and hmac.compare_digest(str(requested), token)
+
+
+def start_rerun(enabled):
+    _local.profile = RerunProfile() if enabled else None
+    return _local.profile
+
+
+def profiling_active():
+    return getattr(_local, "profile", None) is not None
+
+
+def phase(name):
+    """Times a block as part of the current rerun; a no-op unless profiling is on for this script thread."""
+    profile = getattr(_local, "profile", None)
+    return profile.phase(name) if profile is not None else nullcontext()
+
+
+def finish_rerun(recent, path=PROFILE_PATH, **context):
+    """Closes the current rerun, appends it to `recent` and to the JSONL export, and returns the record."""
+    profile = getattr(_local, "profile", None)
+    _local.profile = None
+    if profile is None:
+        return None
+    record = profile.summary(**context)
+    recent.append(record)
+    with _write_lock:
+        try:
+            if os.path.getsize(path) > PROFILE_MAX_BYTES:
+                os.replace(path, path + ".1")
+        except FileNotFoundError:
+            pass
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return record
+
+
+def new_recent():
+    return deque(maxlen=RECENT_RERUNS)
+
+
+def mode_averages(recent):
+    """Mean script time and per-phase time of the recent reruns, grouped by mode."""
+    grouped = {}
+    for record in recent:
+        grouped.setdefault((record["mode"], record.get("scope", "app")), []).append(record)
+    rows = []
+    for (mode, scope), records in grouped.items():
+        phases = {}
+        for record in records:
+            for name, ms in record["phases"].items():
+                phases[name] = phases.get(name, 0.0) + ms
+        row = {"mode": mode, "scope": scope, "reruns": len(records),
+               "script_ms": round(sum(r["script_ms"] for r in records) / len(records), 1)}
+        row.update({name: round(ms / len(records), 1) for name, ms in sorted(phases.items())})
+        rows.append(row)
+    return rows
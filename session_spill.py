@@ -0,0 +1,203 @@
+import glob
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from collections import deque
+
+# --- 會話記憶體統計與閒置轉存 ---
+# Every Streamlit session keeps its chat histories, curriculum text and
+# profile in RAM for as long as the tab stays open. At the end of each
+# rerun the heavy keys are measured per mode. A reaper thread moves the
+# heavy keys of sessions idle for longer than SESSION_IDLE_TIMEOUT into a
+# zlib-compressed pickle in SESSION_SPILL_DIR and drops them from memory.
+# The next rerun of that session loads them back before anything reads
+# them, so the user does not notice. Sessions whose state has been
+# garbage-collected (tab closed) lose their spill file too.
+
+SPILL_DIR = os.getenv("SESSION_SPILL_DIR", os.path.join(tempfile.gettempdir(), "career_bot_sessions"))
+IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "900"))
+CHECK_INTERVAL = float(os.getenv("SESSION_SPILL_CHECK_INTERVAL", "30"))
+SPILL_SUFFIX = ".spill"
+
+# Only these keys move to disk; widget values and stage counters stay, they are small.
+SPILL_KEYS = ("chat_history", "curriculum_content", "user_profile", "chosen_professions",
+              "key_courses_identified", "curriculum_comparison", "decision_inputs", "rerun_profiles")
+KEY_MODES = {"curriculum_content": "curriculum_analysis", "key_courses_identified": "curriculum_analysis",
+             "curriculum_comparison": "curriculum_analysis",
+             "user_profile": "panoramic", "chosen_professions": "panoramic", "decision_inputs": "decision",
+             "rerun_profiles": "debug"}
+HISTORY_MODES = {"exploration_session": "exploration", "communication_session": "communication",
+                 "panoramic_session": "panoramic", "curriculum_session": "curriculum_analysis"}
+
+
+def estimate_bytes(value, _seen=None):
+    """Approximate memory held by a session value, following containers, chat histories and messages."""
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k, seen) + estimate_bytes(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset, deque)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v, seen) for v in value)
+    if hasattr(value, "messages"):
+        return sys.getsizeof(value) + estimate_bytes(list(value.messages), seen)
+    if hasattr(value, "content"):
+        # A chat message: its text plus the pydantic object around it.
+        return sys.getsizeof(value) + estimate_bytes(value.content, seen) + 256
+    return sys.getsizeof(value)
+
+
+def account(state):
+    """Bytes of the spillable keys in `state`, by mode."""
+    by_mode = {}
+    for key in SPILL_KEYS:
+        try:
+            value = state[key]
+        except KeyError:
+            continue
+        if key == "chat_history" and isinstance(value, dict):
+            for history_key, history in value.items():
+                mode = HISTORY_MODES.get(history_key, "other")
+                by_mode[mode] = by_mode.get(mode, 0) + estimate_bytes(history)
+        else:
+            mode = KEY_MODES.get(key, "other")
+            by_mode[mode] = by_mode.get(mode, 0) + estimate_bytes(value)
+    return by_mode
+
+
+def _remove_dead_process_dirs(spill_dir):
+    """Spill files of a server process that is gone belong to sessions that no longer exist."""
+    for path in glob.glob(os.path.join(spill_dir, "[0-9]*")):
+        try:
+            os.kill(int(os.path.basename(path)), 0)
+        except ProcessLookupError:
+            shutil.rmtree(path, ignore_errors=True)
+        except (ValueError, PermissionError):
+            continue
+
+
+class SessionSpiller:
+    """Tracks sessions by id, spills the idle ones to disk and loads them back on their next rerun."""
+
+    def __init__(self, spill_dir=SPILL_DIR, idle_timeout=IDLE_TIMEOUT, check_interval=CHECK_INTERVAL):
+        _remove_dead_process_dirs(spill_dir)
+        # One directory per server process, so several servers can share SESSION_SPILL_DIR.
+        self.spill_dir = os.path.join(spill_dir, str(os.getpid()))
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.spills = 0
+        self.rehydrations = 0
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._reaper = threading.Thread(target=self._reap_loop, args=(check_interval,), name="session-spill",
+                                        daemon=True)
+        self._reaper.start()
+
+    def _path(self, session_id):
+        return os.path.join(self.spill_dir, f"{session_id}{SPILL_SUFFIX}")
+
+    def _entry(self, session_id, state):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry["state"]() is not state:
+                entry = {"state": weakref.ref(state), "lock": threading.Lock(), "last_seen": time.monotonic(),
+                         "spilled": False, "spilled_bytes": 0, "by_mode": {}}
+                self._sessions[session_id] = entry
+            return entry
+
+    def resume(self, session_id, state):
+        """Marks the session active and loads its spilled keys back; True when it was spilled."""
+        entry = self._entry(session_id, state)
+        with entry["lock"]:
+            entry["last_seen"] = time.monotonic()
+            if not entry["spilled"]:
+                return False
+            entry.update(spilled=False, spilled_bytes=0)
+            try:
+                with open(self._path(session_id), "rb") as f:
+                    payload = pickle.loads(zlib.decompress(f.read()))
+                os.remove(self._path(session_id))
+            except (OSError, zlib.error, pickle.UnpicklingError) as e:
+                # The keys start again from their defaults rather than breaking the page.
+                print(f"[session_spill] 会话 {session_id[:8]} 恢复失败: {e}")
+                return False
+            for key, value in payload.items():
+                state[key] = value
+            self.rehydrations += 1
+            return True
+
+    def record(self, session_id, state):
+        """Measures the session at the end of a rerun."""
+        entry = self._entry(session_id, state)
+        with entry["lock"]:
+            entry["last_seen"] = time.monotonic()
+            if not entry["spilled"]:
+                entry["by_mode"] = account(state)
+
+    def _spill(self, session_id, entry):
+        state = entry["state"]()
+        with entry["lock"]:
+            if state is None or entry["spilled"] or time.monotonic() - entry["last_seen"] < self.idle_timeout:
+                return
+            payload = {}
+            for key in SPILL_KEYS:
+                try:
+                    payload[key] = state[key]
+                except KeyError:
+                    continue
+            if not payload:
+                return
+            data = zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), 6)
+            temp = f"{self._path(session_id)}.tmp"
+            with open(temp, "wb") as f:
+                f.write(data)
+            os.replace(temp, self._path(session_id))
+            for key in payload:
+                del state[key]
+            entry.update(spilled=True, spilled_bytes=len(data))
+            self.spills += 1
+
+    def _reap_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self.reap()
+
+    def reap(self):
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for session_id, entry in sessions:
+            if entry["state"]() is None:
+                with self._lock:
+                    self._sessions.pop(session_id, None)
+                if entry["spilled"] and os.path.exists(self._path(session_id)):
+                    os.remove(self._path(session_id))
+                continue
+            try:
+                self._spill(session_id, entry)
+            except Exception as e:
+                print(f"[session_spill] 会话 {session_id[:8]} 转存失败: {e}")
+
+    def snapshot(self):
+        """Resident vs. spilled sessions and bytes, plus resident bytes by mode."""
+        with self._lock:
+            entries = [entry for entry in self._sessions.values() if entry["state"]() is not None]
+        resident = [e for e in entries if not e["spilled"]]
+        by_mode = {}
+        for entry in resident:
+            for mode, size in entry["by_mode"].items():
+                by_mode[mode] = by_mode.get(mode, 0) + size
+        return {"resident_sessions": len(resident),
+                "resident_bytes": sum(sum(e["by_mode"].values()) for e in resident),
+                "spilled_sessions": len(entries) - len(resident),
+                "spilled_bytes": sum(e["spilled_bytes"] for e in entries if e["spilled"]),
+                "spills": self.spills, "rehydrations": self.rehydrations,
+                "by_mode": dict(sorted(by_mode.items(), key=lambda item: -item[1]))}
@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+import time
+import uuid
+
+# --- API 會話儲存 ---
+# The HTTP API runs several worker processes, so a session can't live in
+# one worker's memory: each request may land on a different process. State
+# is one JSON file per session, written atomically, plus a lock file that
+# keeps two turns of the same session from running at once.
+
+SESSION_DIR = os.getenv("ADVISOR_SESSION_DIR", os.path.join(tempfile.gettempdir(), "advisor_sessions"))
+SESSION_TTL = int(os.getenv("ADVISOR_SESSION_TTL", "86400"))
+# A turn that has held its lock this long belongs to a worker that died mid-stream.
+STALE_LOCK_SECONDS = int(os.getenv("ADVISOR_STALE_LOCK_SECONDS", "900"))
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class SessionBusy(RuntimeError):
+    pass
+
+
+class FileSessionStore:
+    def __init__(self, directory=SESSION_DIR, ttl=SESSION_TTL, stale_lock=STALE_LOCK_SECONDS):
+        self.directory = directory
+        self.ttl = ttl
+        self.stale_lock = stale_lock
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id, suffix=".json"):
+        # Session ids are generated here; anything else is rejected before it reaches the filesystem.
+        try:
+            uuid.UUID(session_id)
+        except (ValueError, TypeError):
+            raise SessionNotFound(session_id)
+        return os.path.join(self.directory, session_id + suffix)
+
+    def create(self, state):
+        session_id = str(uuid.uuid4())
+        now = time.time()
+        state = dict(state, session_id=session_id, created=now, updated=now)
+        self.save(state)
+        return state
+
+    def load(self, session_id):
+        path = self._path(session_id)
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            raise SessionNotFound(session_id)
+        if time.time() - state["updated"] > self.ttl:
+            self.delete(session_id)
+            raise SessionNotFound(session_id)
+        return state
+
+    def save(self, state):
+        state["updated"] = time.time()
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self._path(state["session_id"]))
+
+    def delete(self, session_id):
+        for suffix in (".json", ".lock"):
+            try:
+                os.remove(self._path(session_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def acquire(self, session_id):
+        """Takes the per-session turn lock; raises SessionBusy while another turn is running."""
+        path = self._path(session_id, ".lock")
+        for _ in range(2):
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) < self.stale_lock:
+                        raise SessionBusy(session_id)
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        raise SessionBusy(session_id)
+
+    def release(self, session_id):
+        try:
+            os.remove(self._path(session_id, ".lock"))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        """Removes expired sessions; cheap enough to run whenever a session is created."""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += name.endswith(".json")
+            except FileNotFoundError:
+                pass
+        return removed
@@ -0,0 +1,64 @@
+import os
+import time
+
+# --- 串流輸出節流 ---
+# st.write_stream re-renders the whole accumulated markdown for every chunk
+# it receives. Coalescing chunks over a time/size window, and holding back
+# while a Mermaid/code fence or a table is still open, cuts the websocket
+# deltas and server-side markdown work per report.
+
+FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.25"))
+FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "400"))
+# Safety valve: a block that never closes must not hide the answer forever.
+MAX_HOLD_CHARS = int(os.getenv("STREAM_MAX_HOLD_CHARS", "12000"))
+
+
+class BlockTracker:
+    """Tracks whether the markdown seen so far ends inside an unfinished fence or table."""
+
+    def __init__(self):
+        self.in_fence = False
+        self._last_line_is_row = False
+        self._partial = ""
+
+    def feed(self, text):
+        self._partial += text
+        while "\n" in self._partial:
+            line, self._partial = self._partial.split("\n", 1)
+            stripped = line.strip()
+            if stripped.startswith("```"):
+                self.in_fence = not self.in_fence
+            self._last_line_is_row = not self.in_fence and stripped.startswith("|")
+
+    @property
+    def in_open_block(self):
+        if self.in_fence:
+            return True
+        partial = self._partial.lstrip()
+        if partial.startswith("```") or partial.startswith("|"):
+            return True
+        return self._last_line_is_row and not partial
+
+
+def coalesce_stream(chunks, interval=None, max_chars=None, clock=time.monotonic):
+    """Re-yields a token stream in batches of at least `interval` seconds or `max_chars` characters."""
+    interval = FLUSH_INTERVAL if interval is None else interval
+    max_chars = FLUSH_CHARS if max_chars is None else max_chars
+    tracker = BlockTracker()
+    buffer, size = [], 0
+    last_flush = clock()
+    for chunk in chunks:
+        text = getattr(chunk, "content", chunk)
+        if not text:
+            continue
+        tracker.feed(text)
+        buffer.append(text)
+        size += len(text)
+        if tracker.in_open_block and size < MAX_HOLD_CHARS:
+            continue
+        now = clock()
+        if size >= max_chars or now - last_flush >= interval:
+            yield "".join(buffer)
+            buffer, size, last_flush = [], 0, now
+    if buffer:
+        yield "".join(buffer)
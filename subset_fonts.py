@@ -0,0 +1,120 @@
+"""Builds the self-hosted Noto Sans SC subset that web_test.py serves from static/fonts.
+
+Collects every character in the string literals of the modules whose text
+appears on the page, plus printable ASCII and any --extra-chars files. Each
+weight is subset to those glyphs and written as WOFF2. manifest.json
+records the files, their content hashes (used as ?v= in the URLs, so the
+browser can cache them for good) and the unicode-range. Re-run it after
+UI text changes.
+
+The page uses the font for its own chrome only (headings, buttons, tabs,
+sidebar, widget labels); chat messages and model answers keep the system
+font stack, since a subset would leave most of their characters to a
+fallback font in the middle of a sentence.
+
+    pip install fonttools brotli
+    python subset_fonts.py --font 400=NotoSansSC-Regular.otf --font 500=NotoSansSC-Medium.otf \\
+        --font 700=NotoSansSC-Bold.otf
+    python subset_fonts.py --font 400,500,700="NotoSansSC[wght].ttf" --extra-chars common_chars.txt
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FONT_DIR = os.path.join(ROOT, "static", "fonts")
+FAMILY = "Noto Sans SC"
+FILE_PREFIX = "noto-sans-sc"
+UI_MODULES = ("web_test.py", "web_prompts.py", "token_budget.py", "company_index.py")
+# Punctuation the model and the markdown renderer use even when the UI strings do not.
+ALWAYS = "".join(chr(c) for c in range(0x20, 0x7F)) + "，。、；：？！“”‘’（）《》【】—…·￥"
+
+
+def ui_characters(modules=UI_MODULES):
+    chars = set(ALWAYS)
+    for module in modules:
+        with open(os.path.join(ROOT, module), encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                chars.update(node.value)
+    return {ch for ch in chars if (ch.isprintable() and not ch.isspace()) or ch == " "}
+
+
+def unicode_range(chars):
+    """CSS unicode-range for a set of characters, with consecutive code points merged."""
+    points = sorted(ord(ch) for ch in chars)
+    ranges, start, previous = [], points[0], points[0]
+    for point in points[1:] + [None]:
+        if point is not None and point == previous + 1:
+            previous = point
+            continue
+        ranges.append(f"U+{start:X}" if start == previous else f"U+{start:X}-{previous:X}")
+        if point is not None:
+            start = previous = point
+    return ", ".join(ranges)
+
+
+def subset(source, weight, chars, out_path):
+    from fontTools import subset as ft_subset
+    from fontTools.ttLib import TTFont
+
+    font = TTFont(source)
+    if "fvar" in font:
+        from fontTools.varLib import instancer
+
+        font = instancer.instantiateVariableFont(font, {"wght": weight})
+    options = ft_subset.Options()
+    options.flavor = "woff2"
+    # locl, vert and aalt pull in the JP/KR/TW forms and vertical alternates, ~600 glyphs the page never draws.
+    options.layout_features = ["ccmp", "kern", "liga"]
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    subsetter = ft_subset.Subsetter(options)
+    subsetter.populate(text="".join(sorted(chars)))
+    subsetter.subset(font)
+    font.flavor = "woff2"
+    font.save(out_path)
+    return {chr(point) for point in font.getBestCmap()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--font", action="append", required=True, metavar="WEIGHTS=PATH",
+                        help="source font for one or more comma-separated weights; repeatable")
+    parser.add_argument("--extra-chars", action="append", default=[], metavar="FILE",
+                        help="text file whose characters are added to the subset")
+    parser.add_argument("--out", default=FONT_DIR)
+    args = parser.parse_args()
+
+    chars = ui_characters()
+    for path in args.extra_chars:
+        with open(path, encoding="utf-8") as f:
+            chars.update(ch for ch in f.read() if ch.isprintable())
+    os.makedirs(args.out, exist_ok=True)
+    faces, covered = [], set()
+    for spec in args.font:
+        weights, _, source = spec.partition("=")
+        if not source:
+            parser.error(f"--font 需要 WEIGHTS=PATH 格式: {spec}")
+        for weight in (int(w) for w in weights.split(",")):
+            file_name = f"{FILE_PREFIX}-{weight}.woff2"
+            out_path = os.path.join(args.out, file_name)
+            covered |= subset(source, weight, chars, out_path)
+            with open(out_path, "rb") as f:
+                data = f.read()
+            faces.append({"weight": weight, "file": file_name, "version": hashlib.sha256(data).hexdigest()[:10],
+                          "bytes": len(data)})
+            print(f"{file_name}: {len(data) / 1024:.0f} KB")
+    # Only what the font really covers, so emoji and rare characters never trigger a download.
+    manifest = {"family": FAMILY, "chars": len(covered), "unicode_range": unicode_range(covered),
+                "faces": sorted(faces, key=lambda face: face["weight"])}
+    with open(os.path.join(args.out, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    print(f"{len(covered)}/{len(chars)} 个字符有字形，已写入 {os.path.join(args.out, 'manifest.json')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def test_spilled_session_comes_back_after_rerun(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_PROFILE", "stub")
+    monkeypatch.setenv("LLM_CASSETTE_MODE", "off")
+    monkeypatch.setenv("SESSION_SPILL_DIR", str(tmp_path))
+    monkeypatch.setenv("SESSION_IDLE_TIMEOUT", "0.5")
+    monkeypatch.setenv("SESSION_SPILL_CHECK_INTERVAL", "0.1")
+    sys.modules.pop("session_spill", None)  # picks up the settings above
+
+    at = AppTest.from_file(os.path.join(ROOT, "web_test.py"), default_timeout=60)
+    at.session_state["current_mode"] = "communication"
+    at.run()
+    history = InMemoryChatMessageHistory()
+    history.add_ai_message("你好")
+    history.add_user_message("我想做游戏策划")
+    at.session_state["chat_history"] = {"communication_session": history}
+    at.session_state["curriculum_content"] = "高等数学 5"
+    at.run()
+
+    spill_dir = os.path.join(str(tmp_path), str(os.getpid()))
+    deadline = time.monotonic() + 5
+    while not os.listdir(spill_dir) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert os.listdir(spill_dir), "the idle session was never spilled"
+    assert "curriculum_content" not in at.session_state
+
+    at.run()
+    assert not at.exception
+    assert at.session_state["curriculum_content"] == "高等数学 5"
+    assert len(at.session_state["chat_history"]["communication_session"].messages) == 2
+    assert not os.listdir(spill_dir)
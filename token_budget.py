@@ -0,0 +1,231 @@
+"""Token budgets per session and per deployment, with an operator report.
+
+Every model call is counted from the usage the API reports (estimated
+from the text length when a backend sends none), per session and mode and
+in a daily global total. Past the soft limit a session's calls are
+degraded: they either go to a cheaper profile (TOKEN_BUDGET_FALLBACK_PROFILE)
+or have their output capped at TOKEN_BUDGET_SOFT_MAX_TOKENS. Past the
+hard limit a call is refused before any request is sent, with a friendly
+BudgetExceeded message. Each call is appended to TOKEN_USAGE_LOG. On
+start, today's global total is read back from that log, so a restart does
+not reset the day.
+
+    python token_budget.py                 # usage by day and mode from the log
+    python token_budget.py --days 7 --sessions 10
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+SESSION_SOFT = int(os.getenv("TOKEN_BUDGET_SESSION_SOFT", "80000"))
+SESSION_HARD = int(os.getenv("TOKEN_BUDGET_SESSION_HARD", "200000"))
+GLOBAL_SOFT = int(os.getenv("TOKEN_BUDGET_GLOBAL_SOFT", "8000000"))
+GLOBAL_HARD = int(os.getenv("TOKEN_BUDGET_GLOBAL_HARD", "12000000"))
+SOFT_MAX_TOKENS = int(os.getenv("TOKEN_BUDGET_SOFT_MAX_TOKENS", "1200"))
+FALLBACK_PROFILE = os.getenv("TOKEN_BUDGET_FALLBACK_PROFILE", "")
+USAGE_LOG = os.getenv("TOKEN_USAGE_LOG", "token_usage.jsonl")
+# Rough characters per token for Chinese-heavy text, used only when no usage is reported.
+CHARS_PER_TOKEN = 1.5
+
+SESSION_REFUSAL = "本次会话的AI使用量已达上限。您已生成的内容仍可查看和下载；如需继续，请稍后新开一个会话。"
+GLOBAL_REFUSAL = "今日AI服务使用量已达上限，为保证服务稳定，暂时无法生成新的内容，请明天再来。"
+
+
+class BudgetExceeded(RuntimeError):
+    """A model call was refused because a hard token limit is reached; the message is user-facing."""
+
+
+def _today():
+    return time.strftime("%Y-%m-%d")
+
+
+def _estimate(text_chars):
+    return int(text_chars / CHARS_PER_TOKEN) + 1
+
+
+class UsageCallback(BaseCallbackHandler):
+    """Refuses calls past the hard limit and records the usage of the others for one session and mode."""
+
+    raise_error = True
+
+    def __init__(self, budget, session_id, mode):
+        self.budget = budget
+        self.session_id = session_id
+        self.mode = mode
+        self._prompt_chars = {}
+
+    def _admit(self, run_id, chars):
+        if self.budget.level(self.session_id) == "hard":
+            raise BudgetExceeded(self.budget.refusal(self.session_id))
+        self._prompt_chars[run_id] = chars
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._admit(run_id, sum(len(str(m.content)) for batch in messages for m in batch))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._admit(run_id, sum(len(p) for p in prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_chars = self._prompt_chars.pop(run_id, 0)
+        usage = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        if not usage:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            if token_usage:
+                usage = {"input_tokens": token_usage.get("prompt_tokens", 0),
+                         "output_tokens": token_usage.get("completion_tokens", 0)}
+        if usage:
+            self.budget.record(self.session_id, self.mode, usage.get("input_tokens", 0),
+                               usage.get("output_tokens", 0))
+        else:
+            output_chars = sum(len(g.text) for generations in response.generations for g in generations)
+            self.budget.record(self.session_id, self.mode, _estimate(prompt_chars), _estimate(output_chars),
+                               estimated=True)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._prompt_chars.pop(run_id, None)
+
+
+class TokenBudget:
+    """In-process token counters: per session, per mode and a daily global total."""
+
+    def __init__(self, session_soft=SESSION_SOFT, session_hard=SESSION_HARD, global_soft=GLOBAL_SOFT,
+                 global_hard=GLOBAL_HARD, log_path=USAGE_LOG):
+        self.session_soft, self.session_hard = session_soft, session_hard
+        self.global_soft, self.global_hard = global_soft, global_hard
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._modes = {}
+        self._day = _today()
+        self._global = 0
+        self.degraded_calls = 0
+        self.refusals = 0
+        if log_path and os.path.exists(log_path):
+            for record in read_log(log_path):
+                if record["day"] == self._day:
+                    self._global += record["input_tokens"] + record["output_tokens"]
+
+    def _roll_day(self):
+        if _today() != self._day:
+            self._day, self._global = _today(), 0
+
+    def record(self, session_id, mode, input_tokens, output_tokens, estimated=False):
+        total = input_tokens + output_tokens
+        record = {"ts": round(time.time(), 3), "day": _today(), "session": session_id[:12], "mode": mode,
+                  "input_tokens": input_tokens, "output_tokens": output_tokens, "estimated": estimated}
+        with self._lock:
+            self._roll_day()
+            self._global += total
+            self._sessions[session_id] = self._sessions.get(session_id, 0) + total
+            counts = self._modes.setdefault(mode, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+            counts["calls"] += 1
+            counts["input_tokens"] += input_tokens
+            counts["output_tokens"] += output_tokens
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def level(self, session_id):
+        """"ok", "soft" (degrade) or "hard" (refuse) for the next call of this session."""
+        with self._lock:
+            self._roll_day()
+            used = self._sessions.get(session_id, 0)
+            if used >= self.session_hard or self._global >= self.global_hard:
+                return "hard"
+            if used >= self.session_soft or self._global >= self.global_soft:
+                return "soft"
+            return "ok"
+
+    def refusal(self, session_id):
+        with self._lock:
+            self.refusals += 1
+            return GLOBAL_REFUSAL if self._global >= self.global_hard else SESSION_REFUSAL
+
+    def wrap(self, llm, session_id, mode):
+        """The model as this session should use it now: counted, and degraded past the soft limit."""
+        if self.level(session_id) == "soft":
+            with self._lock:
+                self.degraded_calls += 1
+            llm = _fallback_llm() if FALLBACK_PROFILE else llm.bind(max_tokens=SOFT_MAX_TOKENS)
+        return llm.with_config(callbacks=[UsageCallback(self, session_id, mode)])
+
+    def session_usage(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {"day": self._day, "global_tokens": self._global, "global_soft": self.global_soft,
+                    "global_hard": self.global_hard, "sessions": len(self._sessions),
+                    "sessions_over_soft": sum(1 for used in self._sessions.values() if used >= self.session_soft),
+                    "degraded_calls": self.degraded_calls, "refusals": self.refusals,
+                    "by_mode": {mode: dict(counts) for mode, counts in self._modes.items()}}
+
+
+@lru_cache(maxsize=1)
+def _fallback_llm():
+    from llm_backends import create_llm
+
+    return create_llm(FALLBACK_PROFILE)
+
+
+@lru_cache(maxsize=1)
+def get_token_budget():
+    return TokenBudget()
+
+
+# --- 營運報表 ---
+def read_log(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def report(path, days=1, top_sessions=5):
+    """Usage by day and mode, plus the heaviest sessions, from the usage log."""
+    records = list(read_log(path))
+    kept_days = sorted({r["day"] for r in records})[-days:]
+    records = [r for r in records if r["day"] in kept_days]
+    rows = {}
+    sessions = {}
+    for r in records:
+        row = rows.setdefault((r["day"], r["mode"]), {"calls": 0, "input": 0, "output": 0, "estimated": 0})
+        row["calls"] += 1
+        row["input"] += r["input_tokens"]
+        row["output"] += r["output_tokens"]
+        row["estimated"] += r.get("estimated", False)
+        sessions[r["session"]] = sessions.get(r["session"], 0) + r["input_tokens"] + r["output_tokens"]
+    lines = [f"{'day':<12}{'mode':<22}{'calls':>7}{'input':>12}{'output':>12}{'total':>12}"]
+    for (day, mode), row in sorted(rows.items()):
+        total = row["input"] + row["output"]
+        note = f"  ({row['estimated']} estimated)" if row["estimated"] else ""
+        lines.append(f"{day:<12}{mode:<22}{row['calls']:>7}{row['input']:>12}{row['output']:>12}{total:>12}{note}")
+    lines.append("")
+    lines.append(f"top sessions ({len(sessions)} total):")
+    for session, total in sorted(sessions.items(), key=lambda item: -item[1])[:top_sessions]:
+        lines.append(f"  {session:<14}{total:>12}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=USAGE_LOG)
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=5)
+    args = parser.parse_args()
+    if not os.path.exists(args.log):
+        parser.exit(1, f"{args.log} 不存在，还没有记录任何模型调用。\n")
+    print(report(args.log, args.days, args.sessions))
+
+
+if __name__ == "__main__":
+    main()
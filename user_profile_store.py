@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+from web_prompts import PANORAMIC_PROFILE_FIELDS
+
+# --- 跨模式使用者檔案 ---
+# What a student has already told one mode is kept per user and reused by
+# the others: the exploration answers and report pre-fill the panoramic
+# profile form, the career chosen in panoramic or curriculum mode pre-fills
+# the family conversation, and so on. The user id lives in the Streamlit
+# session, and survives "返回主菜单". Only if the user opts in is it also put
+# in the ?uid= query parameter, so the profile survives a reload. Anyone who
+# has that link can read and change the profile. One JSON file per user,
+# written atomically like session_store.
+#
+# The profile holds short fields, never whole transcripts: long outputs such
+# as the exploration report are cut to a digest before they are stored, and
+# summary() renders the whole profile in at most SUMMARY_CHARS characters
+# for prompts.
+
+PROFILE_DIR = os.getenv("USER_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "advisor_profiles"))
+PROFILE_TTL = int(os.getenv("USER_PROFILE_TTL", str(90 * 86400)))
+DIGEST_CHARS = 400
+SUMMARY_CHARS = 1200  # all of summary(); with ten sections of DIGEST_CHARS it could reach ~4000
+LIST_LIMIT = 8  # most recent entries kept in list fields
+APPEND_KEYS = ("companies",)  # list fields that accumulate across visits; other lists are replaced
+
+
+def new_uid():
+    return uuid.uuid4().hex
+
+
+def valid_uid(uid):
+    return isinstance(uid, str) and re.fullmatch(r"[0-9a-f]{32}", uid) is not None
+
+
+def digest(text, limit=DIGEST_CHARS):
+    """Markdown stripped to plain text and cut at a sentence end within `limit` characters."""
+    text = re.sub(r"```.*?```", " ", text or "", flags=re.S)
+    text = re.sub(r"[#*>`|_-]+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    end = max(cut.rfind(mark) for mark in "。！？；")
+    return cut[:end + 1] if end > limit // 2 else cut + "…"
+
+
+def merge(profile, changes):
+    """Applies `changes` to `profile`: dicts merge, APPEND_KEYS lists grow, empty values are skipped."""
+    for key, value in changes.items():
+        if value in (None, "", [], {}):
+            continue
+        if isinstance(value, dict):
+            merge(profile.setdefault(key, {}), value)
+        elif isinstance(value, list):
+            kept = [item for item in profile.get(key, []) if item not in value] if key in APPEND_KEYS else []
+            profile[key] = (kept + value)[-LIST_LIMIT:]
+        else:
+            profile[key] = value.strip() if isinstance(value, str) else value
+    return profile
+
+
+class UserProfileStore:
+    def __init__(self, directory=PROFILE_DIR, ttl=PROFILE_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, uid):
+        # The uid comes from the URL; anything else is rejected before it reaches the filesystem.
+        if not valid_uid(uid):
+            raise ValueError(f"invalid user id: {uid!r}")
+        return os.path.join(self.directory, uid + ".json")
+
+    def load(self, uid):
+        """The stored profile, or an empty one if there is none or it has expired."""
+        try:
+            with open(self._path(uid), encoding="utf-8") as f:
+                profile = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if time.time() - profile.get("updated", 0) > self.ttl:
+            self.delete(uid)
+            return {}
+        return profile
+
+    def update(self, uid, **changes):
+        with self._lock:
+            profile = merge(self.load(uid), changes)
+            profile["updated"] = time.time()
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(profile, f, ensure_ascii=False)
+            os.replace(tmp, self._path(uid))
+        return profile
+
+    def delete(self, uid):
+        try:
+            os.remove(self._path(uid))
+        except FileNotFoundError:
+            pass
+
+
+# --- 預填與摘要 ---
+def competency_defaults(profile):
+    """Starting values for the panoramic five-dimension form."""
+    values = dict(profile.get("competency", {}))
+    exploration = profile.get("exploration", {})
+    # 探索模式「我」的第一题问的就是专业，可作为学历背景的初稿
+    if not values.get("education") and exploration.get("me"):
+        values["education"] = exploration["me"][0]
+    return {field: values.get(field, "") for field, _, _ in PANORAMIC_PROFILE_FIELDS}
+
+
+def summary(profile, exclude=()):
+    """A compact plain-text profile for prompts; `exclude` drops sections the prompt already carries."""
+    labels = dict((field, label) for field, label, _ in PANORAMIC_PROFILE_FIELDS)
+    exploration = profile.get("exploration", {})
+    # Short, decisive fields first: when the long ones run past SUMMARY_CHARS, they are the ones cut.
+    sections = {
+        "career": profile.get("career", ""),
+        "region": profile.get("region", ""),
+        "priorities": "、".join(profile.get("priorities", [])),
+        "action": exploration.get("action", ""),
+        "family_concern": profile.get("family_concern", ""),
+        "key_courses": "、".join(profile.get("key_courses", [])),
+        "companies": "、".join(profile.get("companies", [])),
+        "competency": "；".join(f"{labels[k]}: {v}" for k, v in profile.get("competency", {}).items() if k in labels),
+        "exploration": "；".join(part for part in (
+            "自我: " + " / ".join(exploration["me"]) if exploration.get("me") else "",
+            "社会: " + " / ".join(exploration["society"]) if exploration.get("society") else "",
+            "家庭: " + " / ".join(exploration["family"]) if exploration.get("family") else "") if part),
+        "report": exploration.get("report", ""),
+    }
+    titles = {"competency": "能力画像", "exploration": "探索回答", "report": "探索结论", "action": "已定行动",
+              "career": "意向职业", "region": "意向地区", "priorities": "择业偏好", "family_concern": "家人担忧",
+              "key_courses": "核心课程", "companies": "关注企业"}
+    lines, left = [], SUMMARY_CHARS
+    for name, text in sections.items():
+        if not text or name in exclude:
+            continue
+        prefix = f"- {titles[name]}: "
+        room = min(DIGEST_CHARS, left - len(prefix) - 2)  # digest() may add "…", the join a newline
+        if room < 20:
+            continue
+        lines.append(prefix + digest(text, room))
+        left -= len(lines[-1]) + 1
+    return "\n".join(lines)
@@ -1,15 +1,39 @@
 import os
 import re
+import hashlib
+import json
+import threading
+import time
+import uuid
 import streamlit as st
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_community.chat_message_histories import ChatMessageHistory
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.chat_history import InMemoryChatMessageHistory as ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage
-from streamlit_mermaid import st_mermaid
-from PIL import Image
 import platform
+from job_runner import PRESUBMIT_GRACE_PERIOD, JobRunner
+from artifact_store import ArtifactStore, make_artifact_key
+from company_index import canonical_company, get_company_index
+from curriculum_compare import MAX_DOCUMENTS, compare, extract_all, extract_text, format_comparison
+from pdf_extract import compact_text
+from course_extraction import KeyCourseStreamParser, extract_key_courses, request_key_courses
+from industry_chain_store import get_industry_chain_store, with_diagram
+from mermaid_repair import diagram_parts, repair_message, repair_stats
+from stream_render import coalesce_stream
+from session_spill import SessionSpiller
+from token_budget import BudgetExceeded, TokenBudget
+from user_profile_store import UserProfileStore, competency_defaults, digest, new_uid, summary, valid_uid
+from rerun_profiler import (PROFILE_ENV, PROFILE_PATH, debug_allowed, finish_rerun, mode_averages, new_recent,
+                            phase, profiling_active, start_rerun)
+from web_prompts import (EXPLORATION_INTERIM_PROMPTS, EXPLORATION_REPORT_PROMPT, DECISION_PROMPT,
+                         COMMUNICATION_ROLE_PROMPT, COMMUNICATION_DEBRIEF_PROMPT, COMPANY_INFO_PROMPT,
+                         PANORAMIC_PROMPT, PANORAMIC_CACHED_CHAIN_PROMPT, CURRICULUM_ANALYSIS_PROMPT, CURRICULUM_PATH_PROMPT,
+                         CURRICULUM_COURSES_PROMPT, CURRICULUM_COMPARE_PROMPT, EXPLORATION_WELCOME,
+                         EXPLORATION_QUESTIONS, EXPLORATION_ACTION_PROMPT, EXPLORATION_FINAL_MESSAGE, COMMUNICATION_OPENING,
+                         PANORAMIC_PROFILE_FIELDS, format_exploration_answers, format_user_profile)
 
 # --- 頁面設定 (必須是第一個 Streamlit 命令) ---
 st.set_page_config(
@@ -18,20 +42,26 @@ st.set_page_config(
     layout="wide"
 )
 
+# --- 重新執行剖析 (RERUN_PROFILE=1，或網址加上 ?debug=<RERUN_PROFILE_TOKEN> 時啟用) ---
+PROFILING = PROFILE_ENV or debug_allowed(st.query_params.get("debug"), st.secrets)
+start_rerun(PROFILING)
+
 # --- UI 美化 CSS 樣式 ---
-st.markdown("""
+APP_CSS = """
 <style>
-    /* 明確匯入所需的文字字型和圖示字型 */
-    @import url('https://fonts.googleapis.com/css2?family=Material+Symbols+Outlined:opsz,wght,FILL,GRAD@20..48,100..700,0..1,-50..200');
-    @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+SC:wght@400;500;700&display=swap');
-
     html, body {
-        font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", "Noto Sans SC", "Helvetica Neue", "PingFang SC", "Microsoft YaHei", sans-serif;
+        font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", "Helvetica Neue", "PingFang SC", "Microsoft YaHei", sans-serif;
         line-height: 1.65;
         background-color: #F8F9FA;
         color: #495057;
     }
 
+    /* 子集字型只含介面文字 (subset_fonts.py)，只用於介面本身；聊天內容與模型回答維持系統字型 */
+    h1, h2, h3, h4, h5, h6, .stButton>button, .stTabs [role="tab"], [data-testid="stSidebar"], [data-testid="stWidgetLabel"] {
+        font-family: "Noto Sans SC", -apple-system, BlinkMacSystemFont, "Segoe UI", "Helvetica Neue", "PingFang SC", "Microsoft YaHei", sans-serif;
+    }
+    .stChatMessage h1, .stChatMessage h2, .stChatMessage h3, .stChatMessage h4, .stChatMessage h5, .stChatMessage h6 { font-family: inherit; }
+
     h1, h2, h3, h4, h5, h6 { color: #212529; font-weight: 700; }
     h1 { font-size: 32px; }
     h2 { font-size: 28px; border-bottom: 2px solid #E9ECEF; padding-bottom: 0.4em; }
@@ -76,58 +106,307 @@ st.markdown("""
         box-shadow: 0 -4px 12px rgba(0,0,0,0.05);
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+# --- 字型 (自架子集字型，由 subset_fonts.py 產生；APP_FONTS=google 恢復舊的 Google Fonts 匯入) ---
+FONT_SOURCE = os.getenv("APP_FONTS", "local")
+FONT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "fonts", "manifest.json")
+GOOGLE_FONT_IMPORTS = """
+    @import url('https://fonts.googleapis.com/css2?family=Material+Symbols+Outlined:opsz,wght,FILL,GRAD@20..48,100..700,0..1,-50..200');
+    @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+SC:wght@400;500;700&display=swap');
+"""
+
+
+@st.cache_data
+def font_face_css(source):
+    """@font-face rules for the fonts; empty (system font stack only) until subset_fonts.py has been run."""
+    if source == "google":
+        return GOOGLE_FONT_IMPORTS
+    if source != "local" or not os.path.exists(FONT_MANIFEST):
+        return ""
+    with open(FONT_MANIFEST, encoding="utf-8") as f:
+        manifest = json.load(f)
+    # ?v= 帶內容雜湊，靜態檔案處理器因此回傳長期快取標頭
+    return "".join(
+        f"""
+    @font-face {{
+        font-family: "{manifest['family']}"; font-weight: {face['weight']}; font-display: swap;
+        src: url("app/static/fonts/{face['file']}?v={face['version']}") format("woff2");
+        unicode-range: {manifest['unicode_range']};
+    }}""" for face in manifest["faces"])
+
 
-# --- OCR路徑設定 (根據您的實際安裝路徑修改) ---
-try:
+with phase("css"):
+    # 每次重新執行都要輸出，否則 Streamlit 會移除上一輪的樣式元素；內容相同，前端不會重新載入字型
+    st.markdown(APP_CSS.replace("<style>", "<style>" + font_face_css(FONT_SOURCE), 1), unsafe_allow_html=True)
+
+# --- 延遲載入 (OCR / PDF / Mermaid 依賴只在使用它們的模式中載入) ---
+def load_pytesseract():
     import pytesseract
 
+    # OCR路徑設定 (根據您的實際安裝路徑修改)
     if platform.system() == "Windows":
         pytesseract.pytesseract.tesseract_cmd = r'E:\Tesseract at UB Mannheim\tesseract.exe'
-except ImportError:
-    pass
+    return pytesseract
+
+
+def st_mermaid(code, **kwargs):
+    from streamlit_mermaid import st_mermaid as _st_mermaid
+    return _st_mermaid(code, **kwargs)
+
 
 # --- 初始化 ---
 load_dotenv()
 os.environ["LANGCHAIN_TRACING_V2"] = "false"
 
-# --- 全域系統角色 (簡體中文) ---
-GLOBAL_PERSONA = "核心角色: 你是一位智慧、专业且富有同理心的职业发展教练与战略规划师。\n语言要求: 你的所有回答都必须使用简体中文。"
-
 
 # --- LLM 初始化 ---
 @st.cache_resource
 def get_llm_instance():
-    api_key = None;
-    key_name = "VOLCENGINE_API_KEY"
+    from llm_backends import BackendConfigError, create_llm
     try:
-        api_key = st.secrets[key_name]
-    except (KeyError, FileNotFoundError):
-        api_key = os.getenv(key_name)
-    if not api_key:
-        st.error(f"错误：未找到 {key_name}。请在 Streamlit Cloud Secrets 或本地 .env 文件中设置它。");
+        return create_llm(secrets=st.secrets)
+    except BackendConfigError as e:
+        st.error(f"错误：{e}");
         return None
-    try:
-        llm = ChatOpenAI(model="deepseek-r1-250528", temperature=0.7, api_key=api_key,
-                         base_url="https://ark.cn-beijing.volces.com/api/v3")
-        llm.invoke("Hello");
-        return llm
     except Exception as e:
         st.error(f"初始化模型时出错: {e}");
         return None
 
 
+@st.cache_resource
+def get_llm_health(_llm):
+    """Probes the model once in a background thread instead of blocking the first render."""
+    health = {"state": "checking", "latency": None, "error": None}
+    if getattr(_llm, "mode", None) == "replay":
+        # 重播模式不連網，無需探測
+        health.update(state="ok", latency=0.0)
+        return health
+
+    def probe():
+        started = time.monotonic()
+        try:
+            _llm.invoke("Hello")
+            health.update(state="ok", latency=time.monotonic() - started)
+        except Exception as e:
+            health.update(state="error", error=str(e))
+
+    threading.Thread(target=probe, name="llm-health", daemon=True).start()
+    return health
+
+
+def render_llm_health(llm):
+    health = get_llm_health(llm)
+    if health["state"] == "checking":
+        st.caption("⏳ 模型连接检查中...")
+    elif health["state"] == "ok":
+        st.caption(f"🟢 模型连接正常 ({health['latency']:.1f}s)")
+        from llm_backends import pool_stats
+        stats = pool_stats()
+        if stats["requests"]:
+            st.caption(f"🔗 连接复用 {stats['reused_requests']}/{stats['requests']}，TLS 握手 {stats['tls_handshakes']} 次")
+        render_key_pool()
+    else:
+        st.error(f"模型连接失败，请检查您的 API Key 设置: {health['error']}")
+
+
+def render_key_pool():
+    from api_key_pool import key_pool_stats
+    keys = key_pool_stats()
+    if len(keys) < 2:
+        return
+    throttled = sum(1 for k in keys if k["cooldown"])
+    st.caption(f"🔑 {len(keys)} 个 API Key，{throttled} 个冷却中")
+    if PROFILING:
+        with st.expander("🔑 API Key 用量 (调试)"):
+            st.dataframe([{"Key": k["key"], "请求": k["requests"], "错误": k["errors"], "429": k["throttled"],
+                           "请求/分": round(k["requests_per_min"], 1), "tokens/分": round(k["tokens_per_min"]),
+                           "平均耗时s": k["avg_latency"], "余量": k["headroom"], "冷却s": k["cooldown"]}
+                          for k in keys], hide_index=True)
+
+
+# --- Token 預算 ---
+@st.cache_resource
+def get_token_budget():
+    return TokenBudget()
+
+
+def budgeted_llm(llm):
+    """The model as this session may use it now: usage counted per mode, degraded past the soft limit."""
+    return get_token_budget().wrap(llm, st.session_state.session_id, st.session_state.get("current_mode", "menu"))
+
+
+def render_budget_notice():
+    if get_token_budget().level(st.session_state.session_id) != "ok":
+        st.caption("⚠️ AI使用量较高，回复已切换为精简模式。")
+
+
+def render_budget_panel():
+    with st.expander("🎟️ Token 用量 (调试)"):
+        stats = get_token_budget().snapshot()
+        st.caption(f"{stats['day']} 全站 {stats['global_tokens']:,} / {stats['global_hard']:,} tokens · "
+                   f"{stats['sessions']} 个会话 ({stats['sessions_over_soft']} 个超出软上限) · "
+                   f"降级 {stats['degraded_calls']} 次 · 拒绝 {stats['refusals']} 次 · "
+                   f"本会话 {get_token_budget().session_usage(st.session_state.session_id):,}")
+        if stats["by_mode"]:
+            st.dataframe([{"模式": mode, **counts} for mode, counts in stats["by_mode"].items()], hide_index=True)
+
+
+# --- 背景生成任務管理 ---
+@st.cache_resource
+def get_job_runner():
+    return JobRunner()
+
+
+def job_key(mode, *parts):
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:16]
+    return f"{st.session_state.session_id}:{mode}:{digest}"
+
+
+def shared_job_key(mode, *parts):
+    """A job key without the session id, so every session asking the same thing follows one generation."""
+    return "shared:" + make_artifact_key(mode, *parts)
+
+
+def build_chain(template, llm):
+    with phase("chain_build"):
+        return ChatPromptTemplate.from_template(template) | llm
+
+
+def stream_job(key, stream_factory, transform=None):
+    """Attaches to (or starts) the background job for `key` and streams its tokens into the page.
+
+    `transform` wraps the followed token stream on the script side, e.g. to parse structured output.
+    """
+    with phase("generation"):
+        runner = get_job_runner()
+        owner = st.session_state.session_id
+        job = runner.submit(key, stream_factory, owner)
+        tokens = job.follow()
+        if transform:
+            tokens = transform(tokens)
+        try:
+            response_content = st.write_stream(coalesce_stream(tokens))
+        except BudgetExceeded as e:
+            runner.release(key, owner)
+            if job.owner != owner:
+                # 被拒绝的是发起这次生成的会话的额度 (调用前即拒绝，尚未输出)，改用本会话自己的额度重新生成
+                return stream_job(key, stream_factory, transform)
+            st.warning(str(e))
+            st.stop()
+        runner.release(key, owner)
+    return response_content
+
+
+# --- 報告產物管理 ---
+@st.cache_resource
+def get_artifact_store():
+    return ArtifactStore()
+
+
+def render_artifact(artifact_key, title, file_name, stream_factory):
+    """Renders a final report from the artifact store, generating it only on the first request."""
+    store = get_artifact_store()
+    artifact = store.get(artifact_key)
+    st.subheader(title)
+    if artifact is None:
+        mode = artifact_key.split(":", 1)[0]
+        content = stream_job(shared_job_key(mode, artifact_key), stream_factory)
+        artifact = store.put(artifact_key, content, title, file_name)
+    else:
+        st.markdown(artifact["content"])
+    st.download_button(label="📥 下载报告 (.md)", data=artifact["content"].encode('utf-8'),
+                       file_name=artifact["file_name"], mime="text/markdown", key=f"download_{artifact_key}")
+
+
 # --- 會話狀態管理 ---
 def init_session_state():
+    if "session_id" not in st.session_state: st.session_state.session_id = uuid.uuid4().hex
     defaults = {"current_mode": "menu", "chat_history": {}, "exploration_stage": 1, "sim_started": False,
                 "debrief_requested": False, "panoramic_stage": 1, "user_profile": None, "chosen_professions": None,
                 "chosen_region": None, "curriculum_stage": 1, "curriculum_content": None, "chosen_career": None,
-                "key_courses_identified": None}
+                "key_courses_identified": None, "decision_inputs": None, "company_info_request": None}
     for key, value in defaults.items():
         if key not in st.session_state: st.session_state[key] = value
 
 
-init_session_state()
+# --- 跨模式使用者檔案 ---
+@st.cache_resource
+def get_user_profile_store():
+    return UserProfileStore()
+
+
+def current_uid():
+    """The user id: from ?uid= if the user keeps their profile in the link, else one per browser session."""
+    uid = st.query_params.get("uid")
+    if valid_uid(uid):
+        st.session_state.profile_uid = uid
+    elif not valid_uid(st.session_state.get("profile_uid")):
+        st.session_state.profile_uid = new_uid()
+    return st.session_state.profile_uid
+
+
+def load_profile():
+    return get_user_profile_store().load(current_uid())
+
+
+def remember(**changes):
+    """Adds what the user just entered (or a digest of what they got back) to their cross-mode profile."""
+    get_user_profile_store().update(current_uid(), **changes)
+
+
+def render_profile_panel():
+    profile = load_profile()
+    if not summary(profile):
+        return
+    with st.expander("👤 我的资料"):
+        st.caption("您在各模块填写的信息会保存在这里，用于预填其他模块的表单。")
+        st.markdown(summary(profile))
+        # ?uid= 就是讀寫這份資料的憑證，只在使用者明確同意後才放進網址
+        in_link = st.toggle("在链接中保存我的资料（刷新页面后仍可使用）", value=valid_uid(st.query_params.get("uid")))
+        if in_link:
+            st.query_params["uid"] = current_uid()
+            st.warning("当前网址包含您的资料凭证：任何拿到此链接的人都能查看和修改您的资料，请勿分享或在公共电脑上收藏。")
+        elif "uid" in st.query_params:
+            del st.query_params["uid"]
+        if st.button("清除我的资料", use_container_width=True):
+            get_user_profile_store().delete(current_uid())
+            st.rerun()
+
+
+# --- 閒置會話轉存 ---
+@st.cache_resource
+def get_session_spiller():
+    return SessionSpiller()
+
+
+def _session_state_store():
+    """The session's SessionState itself. ctx.session_state is a wrapper that every rerun creates anew,
+    so the spiller would take each rerun for a new session; the wrapped object lives as long as the tab."""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    return getattr(ctx.session_state, "_state", ctx.session_state)
+
+
+def resume_session():
+    """Marks this session active and loads back what was spilled while it sat idle; True if it was spilled."""
+    state = _session_state_store()
+    if state is None or "session_id" not in st.session_state:
+        return False
+    return get_session_spiller().resume(st.session_state.session_id, state)
+
+
+def record_session_memory():
+    state = _session_state_store()
+    if state is not None and "session_id" in st.session_state:
+        get_session_spiller().record(st.session_state.session_id, state)
+
+
+with phase("state_init"):
+    # 必須在 init_session_state 之前恢復，否則被轉存的鍵會被預設值覆蓋
+    if resume_session():
+        st.toast("已恢复您之前的会话。")
+    init_session_state()
 
 
 def get_session_history(session_id: str) -> ChatMessageHistory:
@@ -135,6 +414,63 @@ def get_session_history(session_id: str) -> ChatMessageHistory:
     return st.session_state.chat_history[session_id]
 
 
+# --- 對話歷史視窗化與片段重新執行 ---
+# Only the last HISTORY_WINDOW earlier messages are drawn, more on request.
+# The latest reply and the current stage's widgets (forms, chat input,
+# streaming) live in one st.fragment, so a turn reruns that fragment
+# instead of repainting the menu, CSS and every earlier message.
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "20"))
+
+
+def rerun_turn():
+    """Reruns only the chat fragment during a fragment rerun, the whole app otherwise."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+def render_history(key, messages, render_message):
+    shown_key = f"history_shown_{key}"
+    shown = st.session_state.get(shown_key, HISTORY_WINDOW)
+    hidden = max(0, len(messages) - shown)
+    if hidden and st.button(f"⬆️ 加载更早的消息 (还有 {hidden} 条)", key=f"load_earlier_{key}"):
+        st.session_state[shown_key] = shown + HISTORY_WINDOW
+        st.rerun()
+    with phase("history_render"):
+        for msg in messages[hidden:]:
+            render_message(msg)
+
+
+def render_chat(key, history_name, render_message, turn):
+    """Draws the windowed history, then the latest reply plus `turn(history)` (the stage's widgets) as a fragment."""
+    history = get_session_history(history_name)
+    start = max(len(history.messages) - 1, 0)
+    st.session_state[f"fragment_start_{key}"] = start
+    render_history(key, history.messages[:start], render_message)
+    chat_fragment(key, history_name, render_message, turn)
+
+
+@st.fragment
+def chat_fragment(key, history_name, render_message, turn):
+    # 片段只收到歷史名稱而非物件本身，閒置轉存時不會被片段參數留在記憶體中
+    if resume_session():
+        st.rerun()
+    # 片段重新執行時不會經過腳本頂端，在此單獨計時
+    own_profile = PROFILING and not profiling_active()
+    if own_profile:
+        start_rerun(True)
+    try:
+        history = get_session_history(history_name)
+        with phase("history_render"):
+            for msg in history.messages[st.session_state[f"fragment_start_{key}"]:]:
+                render_message(msg)
+        turn(history)
+    finally:
+        if own_profile:
+            record_rerun(scope="fragment")
+
+
 # --- UI 渲染函式 ---
 def render_menu():
     st.title("✨ 智慧化职业发展辅导系统")
@@ -169,98 +505,123 @@ def render_menu():
 # ----------------------------------------------------------------
 # --- 模式一至五 (完整程式碼) ---
 # ----------------------------------------------------------------
+def render_exploration_message(msg):
+    avatar = "🧑‍💻" if isinstance(msg, HumanMessage) else "🤖"
+    st.chat_message(msg.type, avatar=avatar).markdown(msg.content, unsafe_allow_html=True)
+
+
 def render_exploration_mode(llm):
     st.header("模式一: 职业目标探索")
     history = get_session_history("exploration_session")
+    if not history.messages:
+        history.add_ai_message(EXPLORATION_WELCOME)
+    render_chat("exploration", "exploration_session", render_exploration_message,
+                lambda history: exploration_turn(llm, history))
+
+
+def exploration_turn(llm, history):
     stage = st.session_state.get('exploration_stage', 1)
+    runner = get_job_runner()
+    owner = st.session_state.session_id
 
-    def generate_interim_response(user_input, prompt_template):
-        with st.chat_message("ai", avatar="🤖"):
-            chain = ChatPromptTemplate.from_template(prompt_template) | llm
-            with st.spinner("AI教练正在思考..."):
-                response_content = st.write_stream(chain.stream({"user_input": user_input}))
-            history.add_ai_message(response_content)
-        st.session_state.exploration_stage += 1
-        st.rerun()
+    # 階段 2/4/6 的教練回覆在背景生成，提交後下一階段的表單立即出現，回覆同時串流到表單上方
+    def interim_job(pending):
+        chain = build_chain(EXPLORATION_INTERIM_PROMPTS[pending["stage"]], llm)
+        return (job_key("exploration", pending["stage"], pending["input"]),
+                lambda: chain.stream({"user_input": pending["input"]}))
 
-    for msg in history.messages:
-        avatar = "🧑‍💻" if isinstance(msg, HumanMessage) else "🤖"
-        st.chat_message(msg.type, avatar=avatar).markdown(msg.content, unsafe_allow_html=True)
-    if stage == 1:
-        with st.chat_message("ai", avatar="🤖"):
-            if len(history.messages) == 0:
-                welcome_msg = "你好！我将引导你使用“职业目标缘起分析框架”，从“我”、“社会”、“家庭”三个核心维度，系统性地探索你的职业方向。\n\n首先，我们来分析“我”这个核心。请在下方回答："
-                st.markdown(welcome_msg)
-                history.add_ai_message(welcome_msg)
-        questions = ["1. 你的专业是什么？你对它的看法如何？", "2. 你的学校或过往经历，为你提供了怎样的平台与基础？"]
-        with st.form("stage1_form"):
-            st.markdown("> **第一阶段：分析“我”(可控因素)**")
-            responses = [st.text_area(q, height=100, key=f"s1_q{i}") for i, q in enumerate(questions)]
-            if st.form_submit_button("提交关于“我”的分析", use_container_width=True):
-                if all(responses):
-                    input_text = "### 关于“我”的回答\n\n" + "\n\n".join(
-                        [f"**{q}**\n{r}" for q, r in zip(questions, responses)])
-                    history.add_user_message(input_text)
-                    st.session_state.exploration_stage += 1
-                    st.rerun()
-                else:
-                    st.warning("请完整填写所有问题的回答。")
-    elif stage in [2, 4, 6]:
-        last_user_message = history.messages[-1].content
-        prompts = {
-            2: GLOBAL_PERSONA + "任务：作为职业教练，对用户刚才提供的关于“我”的信息，给予一段简短、积极的总结和肯定。然后，自然地引出我们下一个要探讨的“社会”维度。\n要求：语言要富有同理心，充满鼓励，不要超过100字。结尾必须是引出下一阶段的提问。\n用户的输入：{user_input}\n你的回应：",
-            4: GLOBAL_PERSONA + "任务：作为职业教练，对用户刚才提供的关于“社会”趋势的观察，给予一段简短、富有洞察力的总结。然后，自然地引出我们需要探讨的最后一个维度“家庭”。\n要求：肯定用户观察的价值，语言精炼，不要超过100字。结尾必须是引出下一阶段的提问。\n用户的输入：{user_input}\n你的回应：",
-            6: GLOBAL_PERSONA + "任务：作为职业教练，对用户刚才提供的关于“家庭”与环境影响的描述，给予一段富有同理心和理解的回应。然后告诉用户，现在信息已经收集完毕，你将为他整合所有信息并生成最终的分析报告。\n要求：表达理解和共情，语言温暖，不要超过100字。明确告知用户下一步是生成总报告。\n用户的输入：{user_input}\n你的回应："
-        }
-        generate_interim_response(last_user_message, prompts[stage])
-    elif stage in [3, 5]:
+    def report_job():
+        full_conversation = "\n\n".join([msg.content for msg in history.messages if isinstance(msg, HumanMessage)])
+        stage4_chain = build_chain(EXPLORATION_REPORT_PROMPT, llm)
+        return (job_key("exploration", 7, full_conversation),
+                lambda: stage4_chain.stream({"conversation_history": full_conversation}))
+
+    def settle_pending():
+        """Waits for a reply still generating, so it lands in the history before the next answers."""
+        pending = st.session_state.get("exploration_pending")
+        if not pending:
+            return
+        key, factory = interim_job(pending)
+        job = runner.submit(key, factory, owner)
+        with st.spinner("AI教练正在完成上一条回复..."):
+            job.wait()
+        if job.status == "done":
+            history.add_ai_message(job.text)
+        runner.release(key, owner)
+        st.session_state.exploration_pending = None
+
+    def stream_pending(slot):
+        pending = st.session_state.get("exploration_pending")
+        if not pending:
+            return
+        with slot, st.chat_message("ai", avatar="🤖"):
+            response_content = stream_job(*interim_job(pending))
+        history.add_ai_message(response_content)
+        st.session_state.exploration_pending = None
+
+    def submit_answers(responses):
+        settle_pending()
+        remember(exploration={{1: "me", 3: "society", 5: "family"}[stage]: responses})
+        input_text = format_exploration_answers(stage, responses)
+        history.add_user_message(input_text)
+        pending = {"stage": stage + 1, "input": input_text}
+        st.session_state.exploration_pending = pending
+        runner.submit(*interim_job(pending), owner)
+        if stage == 5:
+            # 最終報告只依賴使用者的回答，與最後一條教練回覆並行生成；
+            # 階段 7 才有人跟隨，在那之前不能被當成無人跟隨的任務回收
+            runner.submit(*report_job(), owner, grace_period=PRESUBMIT_GRACE_PERIOD)
+        st.session_state.exploration_stage = stage + 2
+        if stage < 5:
+            st.session_state.exploration_submitted_at = time.perf_counter()
+        rerun_turn()
+
+    def form_visible():
+        submitted_at = st.session_state.pop("exploration_submitted_at", None)
+        if submitted_at is not None:
+            st.session_state.setdefault("exploration_form_latency", []).append(time.perf_counter() - submitted_at)
+
+    reply_slot = st.container()
+    if stage in [1, 3, 5]:
         forms = {
-            3: ("stage3_form", "> **第二阶段：分析“社会”(外部机会)**", "提交关于“社会”的分析",
-                ["1. 你观察到当下有哪些你感兴趣的社会或科技趋势？（例如：AI、大健康、可持续发展等）",
-                 "2. 根据你的观察，这些趋势可能带来哪些新的行业或职位机会？",
-                 "3. 在你过往的经历中，有没有一些偶然的机缘或打工经验，让你对某个领域产生了特别的了解？"],
-                "### 关于“社会”的回答"),
-            5: ("stage5_form", "> **第三阶段：觉察“家庭”(环境影响)**", "提交关于“家庭”的分析",
-                ["1. 你的家庭或重要亲友，对你的职业有什么样的期待？", "2. 有没有哪位榜样对你的职业选择产生了影响？",
-                 "3. 你身边的“圈子”（例如朋友、同学）主要从事哪些工作？这对你有什么潜在影响？"],
-                "### 关于“家庭”的回答")
+            1: ("stage1_form", "> **第一阶段：分析“我”(可控因素)**", "提交关于“我”的分析"),
+            3: ("stage3_form", "> **第二阶段：分析“社会”(外部机会)**", "提交关于“社会”的分析"),
+            5: ("stage5_form", "> **第三阶段：觉察“家庭”(环境影响)**", "提交关于“家庭”的分析")
         }
-        form_key, title, button_text, questions, header = forms[stage]
+        form_key, title, button_text = forms[stage]
+        questions = EXPLORATION_QUESTIONS[stage][1]
         with st.form(form_key):
             st.markdown(title)
             responses = [st.text_area(q, height=100, key=f"s{stage}_q{i}") for i, q in enumerate(questions)]
             if st.form_submit_button(button_text, use_container_width=True):
                 if all(responses):
-                    input_text = f"{header}\n\n" + "\n\n".join([f"**{q}**\n{r}" for q, r in zip(questions, responses)])
-                    history.add_user_message(input_text)
-                    st.session_state.exploration_stage += 1
-                    st.rerun()
+                    submit_answers(responses)
                 else:
                     st.warning("请完整填写所有问题的回答。")
+        form_visible()
+        stream_pending(reply_slot)
     elif stage == 7:
+        stream_pending(reply_slot)
         st.markdown("> **第四阶段：AI 智慧整合与行动计划**")
         with st.chat_message("ai", avatar="🤖"):
-            full_conversation = "\n\n".join([msg.content for msg in history.messages if isinstance(msg, HumanMessage)])
-            stage4_prompt = ChatPromptTemplate.from_template(
-                GLOBAL_PERSONA + "作为一名智慧且富有洞察力的职业发展教练，请严格根据以下用户在“我”、“社会”、“家庭”三个阶段的完整回答，为用户生成一份结构清晰、富有洞见的整合分析与建议报告。报告必须包含以下三个核心部分：\n\n**1. 核心洞察总结：**\n   - **优势与机遇 (S&O):** 结合用户的“我”和“社会”，提炼出 2-3 个最关键的优势与外部机遇的结合点。\n   - **挑战与关注 (C&A):** 结合用户的“我”的潜在局限和“家庭/环境”的影响，指出 1-2 个需要特别关注和应对的挑战。\n\n**2. 职业方向建议 (探索象限):**\n   - 基于以上分析，提出 2-3 个具体的、可探索的职业方向建议。\n   - 对每个方向，用一句话点明它为什么与用户的“我-社会-家庭”分析相匹配。\n\n**3. 下一步行动清单 (Action Plan):**\n   - 提供一个包含 3-5 个具体、可执行的“轻量级”行动建议。\n\n**报告风格要求：**\n- 语言专业、积极、富有启发性，但也要实事求是。\n- 使用 Markdown 格式，条理清晰，重点突出。\n- 直接输出报告内容，无需重复用户的回答。\n\n---\n以下是用户的完整回答:\n{conversation_history}\n---")
-            stage4_chain = stage4_prompt | llm
             with st.spinner("AI教练正在全面分析您的回答，生成最终报告..."):
-                response_content = st.write_stream(stage4_chain.stream({"conversation_history": full_conversation}))
+                response_content = stream_job(*report_job())
             history.add_ai_message(response_content)
+        remember(exploration={"report": digest(response_content)})
         st.session_state.exploration_stage += 1
-        st.rerun()
+        rerun_turn()
     elif stage == 8:
         st.markdown(
-            "> AI教练已根据您的回答，为您提供了一份整合分析与建议。这份报告是为您量身打造的起点，而非终点。\n>\n> 请仔细阅读报告，然后回答最后一个、也是最重要的问题：\n> **您自己决定要采取的、下周可以完成的第一个具体行动是什么？**")
+            "> AI教练已根据您的回答，为您提供了一份整合分析与建议。这份报告是为您量身打造的起点，而非终点。\n>\n> 请仔细阅读报告，然后回答最后一个、也是最重要的问题：\n> " + EXPLORATION_ACTION_PROMPT)
         if user_input := st.chat_input("请在此输入您的最终行动计划..."):
             history.add_user_message(f"我的最终行动计划是：{user_input}")
+            remember(exploration={"action": user_input})
             st.session_state.exploration_stage += 1
-            st.rerun()
+            rerun_turn()
     elif stage == 9:
         with st.chat_message("ai", avatar="🤖"):
-            final_msg = "太棒了！明确的行动是推动一切改变的开始。预祝你行动顺利，在职业探索的道路上不断有新的发现和收获！"
-            st.markdown(final_msg)
-            history.add_ai_message(final_msg)
+            st.markdown(EXPLORATION_FINAL_MESSAGE)
+            history.add_ai_message(EXPLORATION_FINAL_MESSAGE)
         st.success("恭喜！您已完成本次探索的全过程。")
         st.session_state.exploration_stage += 1
 
@@ -269,8 +630,7 @@ def render_decision_mode(llm):
     st.header("模式二: Offer 决策分析")
     with st.container(border=True):
         st.info("请输入两个Offer的关键信息，AI将为您生成一份结构化的对比分析报告。")
-        chain = ChatPromptTemplate.from_template(
-            GLOBAL_PERSONA + "作为一名专业的职业顾问，你的任务是帮助用户对比两个Offer，并根据他们提供的个人偏好，生成一份结构化、逻辑清晰的分析报告。\n\n**输入信息:**\n- **Offer A 详情:** {offer_a_details}\n- **Offer B 详情:** {offer_b_details}\n- **用户的个人偏好 (按重要性排序):** {user_priorities_sorted_list}\n\n**输出报告要求:**\n1.  **开篇总结:** 首先，对两个Offer的核心亮点进行一句话总结。\n2.  **多维度对比分析:**\n    -   根据用户选择的偏好维度进行逐一对比。\n    -   如果用户未提供偏好，则使用默认的通用维度（如：薪酬、发展、稳定性、通勤、文化）进行分析。\n    -   在每个维度下，清晰地列出Offer A和Offer B各自的表现，并给出一个简短的小结。\n    -   使用Markdown的表格或项目符号，让对比一目了然。\n3.  **综合建议:**\n    -   基于前面的多维度分析，给出一个综合性的决策建议。\n    -   明确指出哪个Offer与用户的偏好更匹配，并解释原因。\n4.  **风格要求:** 语言客观、中立、富有逻辑，避免使用绝对化的词语。") | llm
+        chain = build_chain(DECISION_PROMPT, llm)
         st.subheader("第一步：请填写 Offer 的核心信息")
         col1, col2 = st.columns(2, gap="large");
         with col1:
@@ -281,18 +641,27 @@ def render_decision_mode(llm):
                                    placeholder="例如：\n公司: B集团\n职位: 管培生\n薪资: 13k * 16薪 + 2w签字费\n地点: 北京海淀...")
         st.subheader("第二步：(可选) 添加你的个人偏好")
         priorities_options = ["职业成长", "薪资福利", "工作生活平衡", "团队氛围", "公司稳定性"]
-        user_priorities = st.multiselect("请按重要性依次选择你的职业偏好：", options=priorities_options)
+        user_priorities = st.multiselect("请按重要性依次选择你的职业偏好：", options=priorities_options,
+                                         default=[p for p in load_profile().get("priorities", [])
+                                                  if p in priorities_options])
         if st.button("生成对比分析报告", use_container_width=True):
             if not offer_a or not offer_b:
                 st.warning("请输入两个Offer的信息。")
             else:
-                with st.spinner("正在为您生成Offer分析报告..."):
-                    priorities_text = ", ".join(user_priorities) if user_priorities else "用户未指定"
-                    response_stream = chain.stream({"offer_a_details": offer_a, "offer_b_details": offer_b,
-                                                    "user_priorities_sorted_list": priorities_text})
-                    st.markdown("---");
-                    st.subheader("📋 Offer对比分析报告");
-                    st.write_stream(response_stream)
+                priorities_text = ", ".join(user_priorities) if user_priorities else "用户未指定"
+                remember(priorities=user_priorities)
+                st.session_state.decision_inputs = {"offer_a_details": offer_a, "offer_b_details": offer_b,
+                                                    "user_priorities_sorted_list": priorities_text}
+        if inputs := st.session_state.get('decision_inputs'):
+            st.markdown("---");
+            with st.spinner("正在为您生成Offer分析报告..."):
+                render_artifact(make_artifact_key("decision", *inputs.values()), "📋 Offer对比分析报告",
+                                "Offer对比分析报告.md", lambda: chain.stream(inputs))
+
+
+def render_communication_message(msg):
+    avatar = "🧑‍💻" if isinstance(msg, HumanMessage) else "🧓"
+    st.chat_message(msg.type, avatar=avatar).markdown(msg.content)
 
 
 def render_communication_mode(llm):
@@ -300,147 +669,198 @@ def render_communication_mode(llm):
     if not st.session_state.get('sim_started', False):
         with st.container(border=True):
             st.info("在这里，AI可以扮演您的家人，帮助您练习如何沟通职业规划，并提供复盘建议。")
-            my_choice = st.text_input("你想和家人沟通的职业选择是？")
-            family_concern = st.text_area("你认为他们主要的担忧会是什么？",
+            profile = load_profile()
+            my_choice = st.text_input("你想和家人沟通的职业选择是？", value=profile.get("career", ""))
+            family_concern = st.text_area("你认为他们主要的担忧会是什么？", value=profile.get("family_concern", ""),
                                           placeholder="例如: 工作不稳定、不是铁饭碗、离家太远等")
             if st.button("开始模拟"):
                 if not my_choice or not family_concern:
                     st.warning("请输入您的职业选择和预想的家人担忧。")
                 else:
+                    remember(career=my_choice, family_concern=family_concern)
                     st.session_state.my_choice = my_choice;
                     st.session_state.family_concern = family_concern
                     st.session_state.sim_started = True;
                     st.session_state.debrief_requested = False
-                    initial_ai_prompt = f"孩子，关于你想做“{my_choice}”这个事，我有些担心。我主要是觉得它“{family_concern}”。我们能聊聊吗？"
+                    initial_ai_prompt = COMMUNICATION_OPENING.format(my_choice=my_choice, family_concern=family_concern)
                     get_session_history("communication_session").add_ai_message(initial_ai_prompt);
                     st.rerun()
     if st.session_state.get('sim_started', False):
         st.success(f"模拟开始！AI正在扮演担忧您选择 “{st.session_state.my_choice}” 的家人。")
-        history = get_session_history("communication_session")
-        with st.container():
-            for msg in history.messages:
-                avatar = "🧑‍💻" if isinstance(msg, HumanMessage) else "🧓";
-                st.chat_message(msg.type, avatar=avatar).markdown(msg.content)
-        if not st.session_state.get('debrief_requested', False):
-            communication_prompt = ChatPromptTemplate.from_messages([("system",
-                                                                      GLOBAL_PERSONA + f"现在，你将扮演一个关心孩子但思想略显传统的家人（父亲/母亲）。\n你的背景：你非常爱自己的孩子，但对新兴职业不太了解，更看重稳定、体面的工作。\n你的任务：\n1. 你的开场白已经由系统给出。\n2. 在接下来的对话中，持续表达你对孩子职业选择({st.session_state.my_choice})的担忧({st.session_state.family_concern})。\n3. 你的语气要真诚、关切，可以略带固执，但最终目的是希望孩子能过得好。\n4. 根据用户的回应进行追问。\n5. 保持你的角色，直到用户点击“结束模拟”。"),
+        render_chat("communication", "communication_session", render_communication_message,
+                    lambda history: communication_turn(llm, history))
+
+
+def communication_turn(llm, history):
+    if not st.session_state.get('debrief_requested', False):
+        with phase("chain_build"):
+            communication_prompt = ChatPromptTemplate.from_messages([("system", COMMUNICATION_ROLE_PROMPT),
                                                                      MessagesPlaceholder(variable_name="history"),
                                                                      ("human", "{input}")])
             chain_with_history = RunnableWithMessageHistory(communication_prompt | llm,
                                                             lambda s: get_session_history(s),
-                                                            input_messages_key="input", history_messages_key="history")
-            if user_input := st.chat_input("你的回应:"):
-                with st.spinner("..."): chain_with_history.invoke({"input": user_input}, config={
-                    "configurable": {"session_id": "communication_session"}}); st.rerun()
-            if len(history.messages) > 2:
-                if st.button("结束模拟并获取复盘建议"): st.session_state.debrief_requested = True; st.rerun()
-        else:
-            with st.container(border=True):
-                st.info("对话已结束。AI教练正在为您复盘刚才的沟通表现...")
-                full_conversation = "\n".join(
-                    [f"{'我' if isinstance(msg, HumanMessage) else '家人'}: {msg.content}" for msg in history.messages])
-                debrief_prompt = ChatPromptTemplate.from_template(
-                    GLOBAL_PERSONA + "你现在切换回职业发展教练的角色。\n任务：请对以下这段“我”与“家人”关于职业选择的沟通对话进行复盘，并生成一份结构化的沟通表现报告。\n\n**已知背景:**\n- 我的职业选择: {my_choice}\n- 家人预设的担忧: {family_concern}\n\n**沟通记录:**\n{conversation_history}\n\n**复盘报告要求:**\n1.  **沟通亮点 (做得好的地方):**\n    -   识别并表扬我在对话中使用的有效沟通技巧。\n2.  **可提升点 (可以做得更好的地方):**\n    -   建设性地指出沟通中可以改进的地方。\n3.  **核心策略建议:**\n    -   提供 2-3条具体的、可操作的沟通策略。\n\n报告风格需专业、客观、富有建设性。")
-                debrief_chain = debrief_prompt | llm
-                with st.spinner("正在生成沟通复盘报告..."):
-                    response_stream = debrief_chain.stream(
-                        {"my_choice": st.session_state.my_choice, "family_concern": st.session_state.family_concern,
-                         "conversation_history": full_conversation})
-                    st.subheader("📋 沟通表现复盘报告");
-                    st.write_stream(response_stream)
+                                                            input_messages_key="input",
+                                                            history_messages_key="history")
+        if user_input := st.chat_input("你的回应:"):
+            try:
+                with st.spinner("..."), phase("generation"): chain_with_history.invoke(
+                    {"input": user_input, "my_choice": st.session_state.my_choice,
+                     "family_concern": st.session_state.family_concern},
+                    config={"configurable": {"session_id": "communication_session"}})
+            except BudgetExceeded as e:
+                st.warning(str(e)); st.stop()
+            rerun_turn()
+        if len(history.messages) > 2:
+            if st.button("结束模拟并获取复盘建议"): st.session_state.debrief_requested = True; rerun_turn()
+    else:
+        with st.container(border=True):
+            st.info("对话已结束。AI教练正在为您复盘刚才的沟通表现...")
+            full_conversation = "\n".join(
+                [f"{'我' if isinstance(msg, HumanMessage) else '家人'}: {msg.content}" for msg in history.messages])
+            debrief_chain = build_chain(COMMUNICATION_DEBRIEF_PROMPT, llm)
+            with st.spinner("正在生成沟通复盘报告..."):
+                inputs = {"my_choice": st.session_state.my_choice,
+                          "family_concern": st.session_state.family_concern,
+                          "conversation_history": full_conversation}
+                render_artifact(make_artifact_key("communication", *inputs.values()), "📋 沟通表现复盘报告",
+                                "沟通表现复盘报告.md", lambda: debrief_chain.stream(inputs))
 
 
 def render_company_info_mode(llm):
     st.header("模式四: 企业信息速览")
     with st.container(border=True):
-        st.info("请输入公司全名，AI将为您综合网络信息，生成一份核心信息速览报告。")
-        chain = ChatPromptTemplate.from_template(
-            GLOBAL_PERSONA + "你是一位专业的商业分析师AI。\n任务：请为用户查询并生成一份关于 **{company_name}** 的核心信息速览报告。\n\n**报告必须包含以下部分:**\n1.  **一句话总结:** 用一句话精准概括该公司的核心业务和市场地位。\n2.  **公司简介:** 简要介绍公司的成立背景、主营业务、关键产品或服务。\n3.  **近期动态与新闻:**\n    -   总结 1-2 条该公司近期的重要动态、战略调整或相关的行业新闻。\n4.  **热招方向分析:**\n    -   分析该公司近期的招聘趋势，指出 2-3 个重点招聘的职能方向或岗位类型。\n5.  **SWOT分析 (简版):**\n    -   **优势(S):** 最主要的竞争优势是什么？\n    -   **劣势(W):** 面临的主要挑战或不足是什么？\n    -   **机会(O):** 外部环境带来了哪些发展机会？\n    -   **威胁(T):** 市场或竞争带来了哪些潜在威胁？\n\n请确保报告内容客观、信息凝练、条理清晰。") | llm
-        company_name = st.text_input("请输入公司名称:", placeholder="例如：阿里巴巴、腾讯、字节跳动")
+        st.info("请输入公司名称、简称或拼音首字母，AI将为您综合网络信息，生成一份核心信息速览报告。")
+        chain = build_chain(COMPANY_INFO_PROMPT, llm)
+        typed = st.text_input("请输入公司名称:", placeholder="例如：阿里巴巴、腾讯、字节跳动、zjtd")
+        company_index = get_company_index()
+        company = company_index.resolve(typed) if typed else None
+        if typed and company is None:
+            suggestions = company_index.complete(typed)
+            if suggestions:
+                company = st.pills("您是不是要找:", suggestions, format_func=lambda c: c.name, key="company_suggestion")
+        if company is not None:
+            aliases = "、".join(company.aliases[:4])
+            st.caption(f"✅ 已识别为：{company.name}" + (f" (又称 {aliases})" if aliases else ""))
         if st.button("生成速览报告", use_container_width=True):
-            if not company_name:
+            if not typed and company is None:
                 st.warning("请输入公司名称。")
             else:
-                with st.spinner(f"正在为您分析“{company_name}”..."):
-                    response_stream = chain.stream({"company_name": company_name})
-                    st.markdown("---");
-                    st.subheader(f"📄 {company_name} - 核心信息速览");
-                    st.write_stream(response_stream)
+                st.session_state.company_info_request = canonical_company(company.name if company else typed)
+                remember(companies=[st.session_state.company_info_request[1]])
+        if requested := st.session_state.get('company_info_request'):
+            # 同一家公司的不同叫法共用一个报告键
+            company_key, requested_name = requested
+            st.markdown("---");
+            with st.spinner(f"正在为您分析“{requested_name}”..."):
+                render_artifact(make_artifact_key("company_info", company_key),
+                                f"📄 {requested_name} - 核心信息速览", f"{requested_name}-核心信息速览.md",
+                                lambda: chain.stream({"company_name": requested_name}))
+
+
+def render_diagram_message(msg, title, unsafe_allow_html=False, **mermaid_kwargs):
+    """Renders an answer with its Mermaid block drawn as a diagram, after local syntax repair."""
+    avatar = "🧑‍💻" if isinstance(msg, HumanMessage) else "🤖"
+    with st.chat_message(msg.type, avatar=avatar):
+        parts = diagram_parts(msg.content) if msg.type == 'ai' else None
+        if parts is None:
+            st.markdown(msg.content, unsafe_allow_html=unsafe_allow_html)
+            return
+        before, mermaid_code, after = parts
+        st.markdown(before, unsafe_allow_html=unsafe_allow_html)
+        st.subheader(title)
+        with st.container(border=True):
+            st_mermaid(mermaid_code, **mermaid_kwargs)
+        if after.strip():
+            st.markdown(after, unsafe_allow_html=unsafe_allow_html)
+
+
+def render_panoramic_message(msg):
+    render_diagram_message(msg, "产业链可视化图表")
 
 
 def render_panoramic_mode(llm):
     st.header("模式五: 职业路径全景规划")
-    history = get_session_history("panoramic_session")
+    render_chat("panoramic", "panoramic_session", render_panoramic_message,
+                lambda history: panoramic_turn(llm, history))
+
+
+def panoramic_turn(llm, history):
     stage = st.session_state.get('panoramic_stage', 1)
-    for msg in history.messages:
-        avatar = "🧑‍💻" if isinstance(msg, HumanMessage) else "🤖"
-        with st.chat_message(msg.type, avatar=avatar):
-            if msg.type == 'ai' and "```mermaid" in msg.content:
-                parts = msg.content.split("```mermaid");
-                st.markdown(parts[0])
-                mermaid_section = "```mermaid" + parts[1];
-                mermaid_match = re.search("```mermaid\n(.*?)\n```", mermaid_section, re.DOTALL)
-                if mermaid_match:
-                    mermaid_code = mermaid_match.group(1);
-                    st.subheader("产业链可视化图表")
-                    with st.container(border=True): st_mermaid(mermaid_code.strip())
-                after_diagram_content = mermaid_section.split("```")[-1]
-                if after_diagram_content.strip(): st.markdown(after_diagram_content)
-            else:
-                st.markdown(msg.content)
-    meta_prompt_template = GLOBAL_PERSONA + "You are an expert career strategist, guiding the user through a multi-stage panoramic career path analysis. You are currently in Stage {current_stage}.\nUser's Core Competency Profile: {user_profile}\nUser's Chosen Profession(s): {chosen_professions}\nUser's Chosen Region(s): {chosen_region}\n\nYour Task is to execute the current stage's logic.\n--- STAGE-SPECIFIC INSTRUCTIONS ---\n**Stage 1:** Do not respond.\n**Stage 2 (Profession Concretization):** Based on the user's profile, present 3-5 concrete professions and prompt the user to select one or two.\n**Stage 3 (Enterprise & Region Targeting):** Based on the chosen profession, identify representative companies and primary geographic clusters in China. Prompt the user for their geographical preference.\n**Stage 4 (Final Comprehensive Report):** The user has provided all inputs. Generate a single, comprehensive report with the following sections:\n    1.  **产业链位置分析:** Explain the role's position in the industry chain. Then, generate a Mermaid flowchart (`graph TD`). **CRITICAL SYNTAX RULE:** To create a line break inside a node's text, you MUST use the `<br>` HTML tag, and the entire text MUST be enclosed in double quotes.\n    2.  **行业趋势与“365理论”定性:** Analyze industry trends and classify the industry as '战略型', '支柱型', or '趋势型'.\n    3.  **目标职能要求与差距分析:** List typical requirements and perform a gap analysis.\n    4.  **个人发展蓝图:** Provide 2-3 actionable suggestions.\n    5.  **总结与战略规划:** Provide a concluding summary.\n    6.  **【CRITICAL】战略性思考点:** Finally, conclude with this section, providing 2-3 introspective questions for the user's long-term reflection. **DO NOT ask the user to answer them now.**"
-    chain = ChatPromptTemplate.from_template(meta_prompt_template) | llm
+    chain = build_chain(PANORAMIC_PROMPT, llm)
     if stage == 1:
         st.markdown("> 你好！我是你的职业路径规划助手。让我们从认识你自己开始。")
+        profile = load_profile()
+        defaults = competency_defaults(profile)
         with st.form("profile_form"):
             st.subheader("请根据以下五个维度，描述你的“核心能力”：");
-            edu = st.text_area("学历背景", placeholder="你的专业、学位、以及相关的核心课程");
-            skills = st.text_area("核心技能", placeholder="你最擅长的3-5项硬技能或软技能");
-            exp = st.text_area("相关经验", placeholder="相关的实习、工作项目、或个人作品集");
-            char = st.text_area("品行特质", placeholder="你认为自己最重要的职业品行或工作风格");
-            motiv = st.text_area("内在动机", placeholder="在工作中，什么最能给你带来成就感？")
+            if any(defaults.values()):
+                st.caption("已根据您在其他模块填写的信息预填，可直接修改后提交。")
+            values = {field: st.text_area(label, value=defaults[field], placeholder=placeholder)
+                      for field, label, placeholder in PANORAMIC_PROFILE_FIELDS}
             if st.form_submit_button("提交我的能力画像", use_container_width=True):
-                if all([edu, skills, exp, char, motiv]):
-                    profile_text = f"学历背景: {edu}\n核心技能: {skills}\n相关经验: {exp}\n品行特质: {char}\n内在动机: {motiv}"
-                    st.session_state.user_profile = profile_text;
+                if all(values.values()):
+                    remember(competency=values)
+                    profile_text = format_user_profile(values)
+                    # 其他模块已知的结论以摘要形式附给模型，而不是让用户重新描述一遍
+                    context = summary(profile, exclude=("competency", "region"))
+                    st.session_state.user_profile = profile_text + (f"\n已知背景:\n{context}" if context else "");
                     history.add_user_message(f"这是我的能力画像：\n{profile_text}")
                     st.session_state.panoramic_stage = 2;
-                    st.rerun()
+                    rerun_turn()
                 else:
                     st.warning("请填写所有五个维度的信息。")
     elif stage in [2, 3]:
         if len(history.messages) % 2 != 0:
             with st.chat_message("ai", avatar="🤖"):
                 with st.spinner("AI 正在为您分析..."):
-                    response_stream = chain.stream(
-                        {"current_stage": stage, "user_profile": st.session_state.user_profile,
-                         "chosen_professions": st.session_state.get('chosen_professions', 'N/A'),
-                         "chosen_region": st.session_state.get('chosen_region', 'N/A')})
-                    response_content = st.write_stream(response_stream);
+                    inputs = {"current_stage": stage, "user_profile": st.session_state.user_profile,
+                              "chosen_professions": st.session_state.get('chosen_professions', 'N/A'),
+                              "chosen_region": st.session_state.get('chosen_region', 'N/A')}
+                    response_content = stream_job(job_key("panoramic", *inputs.values()),
+                                                  lambda: chain.stream(inputs));
                     history.add_ai_message(response_content)
-            st.rerun()
+            rerun_turn()
         st.info("👇 请在下方的输入框中输入您的选择或想法...", icon="💡")
         if user_input := st.chat_input("请在此输入您的选择或想法..."):
             history.add_user_message(user_input)
             if stage == 2:
                 st.session_state.chosen_professions = user_input
+                remember(career=user_input)
             elif stage == 3:
                 st.session_state.chosen_region = user_input
+                remember(region=user_input)
             st.session_state.panoramic_stage += 1;
-            st.rerun()
+            rerun_turn()
     elif stage == 4:
         if len(history.messages) % 2 != 0:
             with st.chat_message("ai", avatar="🤖"):
                 st.markdown("好的，已收到您的所有信息。现在，我将为您生成一份完整的综合分析报告...")
+                professions = st.session_state.get('chosen_professions') or ""
+                chain_store = get_industry_chain_store()
+                # 常见职业的产业链图已有审核过的存档: 先展示出来，模型只写个性化分析
+                stored_chain = chain_store.lookup(professions)
+                if stored_chain:
+                    st.subheader("产业链可视化图表")
+                    with st.container(border=True):
+                        st_mermaid(stored_chain["diagram"])
+                    chain = build_chain(PANORAMIC_CACHED_CHAIN_PROMPT, llm)
                 with st.spinner("AI 正在为您生成最终报告..."):
-                    response_stream = chain.stream({"current_stage": 4, "user_profile": st.session_state.user_profile,
-                                                    "chosen_professions": st.session_state.get('chosen_professions',
-                                                                                               'N/A'),
-                                                    "chosen_region": st.session_state.get('chosen_region', 'N/A')})
-                    response_content = st.write_stream(response_stream);
+                    inputs = {"current_stage": 4, "user_profile": st.session_state.user_profile,
+                              "chosen_professions": st.session_state.get('chosen_professions', 'N/A'),
+                              "chosen_region": st.session_state.get('chosen_region', 'N/A')}
+                    if stored_chain:
+                        inputs["industry_chain"] = stored_chain["outline"]
+                    response_content = stream_job(job_key("panoramic", *inputs.values()),
+                                                  lambda: chain.stream(inputs));
+                    if stored_chain:
+                        response_content = with_diagram(response_content, stored_chain)
+                    else:
+                        with phase("diagram_repair"):
+                            response_content = repair_message(response_content, llm)
+                        chain_store.record_reply(professions, response_content)
                     history.add_ai_message(response_content)
             st.session_state.panoramic_stage += 1;
-            st.rerun()
+            rerun_turn()
     elif stage == 5:
         st.success("恭喜！您已完成本次职业路径全景规划。")
         st.info("您可以向上滚动查看为您生成的完整报告。")
@@ -455,59 +875,91 @@ def render_panoramic_mode(llm):
 # ----------------------------------------------------------------
 # --- 模式六：专业培养方案解析 (整合OCR的最终版) ---
 # ----------------------------------------------------------------
+def render_curriculum_message(msg):
+    render_diagram_message(msg, "重点课程学习路径图", unsafe_allow_html=True, height="500px")
+
+
+def render_curriculum_compare(llm):
+    st.info(f"请上传 2-{MAX_DOCUMENTS} 份本科人才培养方案（PDF或TXT格式）。系统会在本地对齐课程表，只把差异摘要交给AI学业导师。")
+    files = st.file_uploader("上传培养方案", type=['pdf', 'txt'], accept_multiple_files=True,
+                             label_visibility="collapsed", key="curriculum_compare_files")
+    ready = bool(files) and 2 <= len(files) <= MAX_DOCUMENTS
+    if files and not ready:
+        st.warning(f"请上传 2 到 {MAX_DOCUMENTS} 份文件。")
+    if st.button("对比培养方案", use_container_width=True, type="primary", disabled=not ready):
+        with st.spinner(f"正在同时读取 {len(files)} 份文件..."), phase("file_extraction"):
+            try:
+                texts = extract_all([(f.name, f.getvalue()) for f in files], load_pytesseract)
+            except Exception as e:
+                st.error(f"处理文件时发生错误: {e}")
+                st.stop()
+        if unreadable := [f.name for f, text in zip(files, texts) if not text.strip()]:
+            st.error(f"无法从以下文件中提取文本: {'、'.join(unreadable)}")
+            st.stop()
+        labels = [os.path.splitext(f.name)[0][:20] for f in files]
+        st.session_state.curriculum_comparison = compare(list(zip(labels, texts)))
+
+    result = st.session_state.get("curriculum_comparison")
+    if not result:
+        return
+    st.markdown("---")
+    st.subheader("课程对齐结果")
+    st.dataframe([{"培养方案": d["label"], "课程数": d["courses"], "总学分": d["credits"],
+                   "核心/必修学分": d["core_credits"], "独有核心课": len(d["unique_core"])}
+                  for d in result["documents"]], hide_index=True, use_container_width=True)
+    st.dataframe([{"方案对比": pair, "重合课程": o["courses"], "重合学分": o["credits"],
+                   "占后者学分": f"{o['share_of_b']:.0%}" if o["share_of_b"] is not None else "-"}
+                  for pair, o in result["pairwise"].items()], hide_index=True, use_container_width=True)
+    if empty := [d["label"] for d in result["documents"] if not d["courses"]]:
+        # 沒有課程表的一方只會讓模型把「無重合」當成結論，不送去生成
+        st.error(f"未能从以下文件中识别出课程表（可能是扫描质量或表格格式问题），无法对比: {'、'.join(empty)}")
+        return
+    comparison = format_comparison(result)
+    with st.expander("发送给AI的对比摘要"):
+        st.code(comparison, language=None)
+    chain = build_chain(CURRICULUM_COMPARE_PROMPT, llm)
+    render_artifact(make_artifact_key("curriculum_compare", comparison), "📄 培养方案对比分析报告",
+                    "培养方案对比分析.md", lambda: chain.stream({"comparison": comparison}))
+
+
 def render_curriculum_mode(llm):
     st.header("模式六: 专业培养方案解析")
     st.markdown("---")
-    history = get_session_history("curriculum_session")
-    stage = st.session_state.get('curriculum_stage', 1)
+    if st.session_state.get('curriculum_stage', 1) == 1 and st.toggle("对比多份培养方案 (双学位 / 转专业)",
+                                                                    key="curriculum_compare_mode"):
+        render_curriculum_compare(llm)
+        return
+    render_chat("curriculum", "curriculum_session", render_curriculum_message,
+                lambda history: curriculum_turn(llm, history))
 
-    for msg in history.messages:
-        avatar = "🧑‍💻" if isinstance(msg, HumanMessage) else "🤖"
-        with st.chat_message(msg.type, avatar=avatar):
-            if msg.type == 'ai' and "```mermaid" in msg.content:
-                parts = msg.content.split("```mermaid")
-                st.markdown(parts[0], unsafe_allow_html=True)
-                mermaid_section = "```mermaid" + parts[1]
-                mermaid_match = re.search("```mermaid\n(.*?)\n```", mermaid_section, re.DOTALL)
-                if mermaid_match:
-                    mermaid_code = mermaid_match.group(1)
-                    st.subheader("重点课程学习路径图")
-                    with st.container(border=True):
-                        st_mermaid(mermaid_code.strip(), height="500px")
-                after_diagram_content = mermaid_section.split("```")[-1]
-                if after_diagram_content.strip():
-                    st.markdown(after_diagram_content, unsafe_allow_html=True)
-            else:
-                st.markdown(msg.content, unsafe_allow_html=True)
 
+def curriculum_turn(llm, history):
+    stage = st.session_state.get('curriculum_stage', 1)
     if stage == 1:
         st.info("请上传您专业的本科人才培养方案（PDF或TXT格式），AI学业导师将为您深度解析。")
         uploaded_file = st.file_uploader("点击此处上传文件...", type=['pdf', 'txt'], label_visibility="collapsed")
 
         if uploaded_file is not None:
             if st.button("第一步：分析人才培养方向", use_container_width=True, type="primary"):
-                content = ""
-                with st.spinner(f"正在读取文件 '{uploaded_file.name}'..."):
+                with st.spinner(f"正在读取文件 '{uploaded_file.name}'..."), phase("file_extraction"):
                     try:
-                        import PyPDF2
-                        uploaded_file.seek(0)
-                        pdf_reader = PyPDF2.PdfReader(uploaded_file)
-                        for page in pdf_reader.pages:
-                            page_text = page.extract_text()
-                            if page_text:
-                                content += page_text + "\n\n"
+                        # PDF 後端由 PDF_EXTRACTOR 決定 (pdf_extract.py)；TXT 直接解碼
+                        content = extract_text(uploaded_file.getvalue(), uploaded_file.name)
 
-                        if not content.strip():
+                        if not content.strip() and uploaded_file.name.lower().endswith(".pdf"):
                             st.info("快速读取失败，已自动切换至AI文字识别(OCR)模式，处理扫描件速度较慢，请稍候...")
-                            import pytesseract
+                            pytesseract = load_pytesseract()
                             from pdf2image import convert_from_bytes
+                            from ocr_preprocess import OCR_RENDER_DPI, ocr_pages
 
                             uploaded_file.seek(0)
-                            images = convert_from_bytes(uploaded_file.read())
+                            images = convert_from_bytes(uploaded_file.read(), dpi=OCR_RENDER_DPI, grayscale=True)
                             ocr_texts = []
-                            for i, image in enumerate(images):
+                            # 識別語言由第一頁決定，其餘頁面沿用，每頁只跑一次 OCR
+                            pages = ocr_pages(images, pytesseract)
+                            for i in range(len(images)):
                                 with st.spinner(f"正在识别第 {i + 1}/{len(images)} 页..."):
-                                    text = pytesseract.image_to_string(image, lang='chi_sim+eng')
+                                    text, _ = next(pages)
                                     ocr_texts.append(text)
                             content = "\n\n--- Page Break ---\n\n".join(ocr_texts)
 
@@ -515,29 +967,19 @@ def render_curriculum_mode(llm):
                             st.error("无法从文件中提取有效文本内容，即使尝试了OCR也失败了。请检查文件是否损坏或过于模糊。")
                             st.stop()
 
+                        # 版面模式的欄位填充空白約與正文等長，送入提示前壓縮
+                        content = compact_text(content)
                         st.session_state.curriculum_content = content
                         history.add_user_message("这是我的专业培养方案，请帮我分析。")
 
-                        prompt = ChatPromptTemplate.from_template(
-                            """
-                            核心角色: 你是一位资深的大学学业导师和职业规划专家。
-                            任务: 请严格按照以下结构，生成一份关于这份本科人才培养方案的分析报告。
-                            **第一部分：人才培养方向分析报告**
-                            1. **培养目标概括**: 精炼地总结该专业的核心培养目标。
-                            2. **核心能力要求**: 根据“毕业要求”，提炼出学生需要掌握的3-4项最核心的能力。
-                            **第二部分：建议的职业发展方向**
-                            - 基于上述分析，特别是培养目标中提到的就业领域，提出 3-5 个具体的职业发展方向建议。
-                            - 以项目符号列表的形式清晰呈现。
-                            最后，请明确引导用户：“请从以上方向中选择一个您最感兴趣的，我将为您生成专属的学习路径规划图。”
-                            培养方案全文如下: {curriculum_content}
-                            """
-                        )
-                        chain = prompt | llm
+                        chain = build_chain(CURRICULUM_ANALYSIS_PROMPT, llm)
                         with st.chat_message("ai", avatar="🤖"):
                             with st.spinner("AI导师正在深度分析培养方案..."):
-                                response = st.write_stream(chain.stream({"curriculum_content": content}))
+                                response = stream_job(shared_job_key("curriculum_analysis", 1, content),
+                                                      lambda: chain.stream({"curriculum_content": content}))
                                 history.add_ai_message(response)
                         st.session_state.curriculum_stage = 2
+                        # 對比開關在片段之外，需整頁重新執行才會隱藏
                         st.rerun()
 
                     except Exception as e:
@@ -551,87 +993,70 @@ def render_curriculum_mode(llm):
             st.button("第一步：分析人才培养方向", use_container_width=True, disabled=True)
 
     elif stage == 2:
+        if career := load_profile().get("career"):
+            st.caption(f"💡 您之前选择的职业方向是“{career}”，可直接输入或换一个方向。")
         if user_input := st.chat_input("请输入您选择的职业方向..."):
             st.session_state.chosen_career = user_input
+            remember(career=user_input)
             history.add_user_message(user_input)
-            prompt = ChatPromptTemplate.from_template(
-                """
-                核心角色: 你是一位资深的大学学业导师。
-                任务: 用户选择了 **“{career_path}”** 作为职业方向。请为他生成一份重点专业科目学习规划。
-                你的回答必须包含以下部分:
-                1.  **学习路径规划说明**: 首先，简要阐述针对“{career_path}”方向，学习的重点和建议的先后顺序。
-                2.  **学习路径关联图 (Mermaid)**:
-                    -   创建一个 `graph TD` 类型的Mermaid流程图。
-                    -   **【语法铁律】**: 如果课程名称（节点文本）中包含括号 `()` 或其他特殊符号，则**必须**将整个文本用双引号 `""` 括起来。例如：`C1["人际交往心理学(研讨课)"]`。
-                    -   **必须进行颜色标注**: 将 **核心专业课** 节点背景色设为 `#D1E8FF` (淡蓝色)，将 **相关基础课** 节点背景色设为 `#FFF2CC` (淡黄色)。
-                    -   在Mermaid代码块的 **最下方**，使用 `style` 命令来定义颜色。
-                    -   在图表下方，必须添加图例说明。
-                3.  **核心课程列表 (重要)**: 在图表和图例之后，请另起一行，并使用以下**一字不差的固定格式**列出所有被你识别为“核心专业课”（即淡蓝色节点）的课程名称。这是程序能否继续运行的关键。
-                    格式:
-                    ### 核心课程列表
-                    - 课程A
-                    - 课程B
-                    - 课程C
-                培养方案全文参考: {curriculum_content}
-                """
-            )
-            chain = prompt | llm
+            chain = build_chain(CURRICULUM_PATH_PROMPT, llm)
             with st.chat_message("ai", avatar="🤖"):
                 with st.spinner(f"正在为“{user_input}”方向规划学习路径..."):
-                    response = st.write_stream(chain.stream({
-                        "career_path": user_input,
-                        "curriculum_content": st.session_state.curriculum_content
-                    }))
+                    inputs = {"career_path": user_input, "curriculum_content": st.session_state.curriculum_content}
+                    parser = KeyCourseStreamParser()
+                    response = stream_job(job_key("curriculum_analysis", 2, *inputs.values()),
+                                          lambda: chain.stream(inputs), transform=parser.wrap)
+                    with phase("diagram_repair"):
+                        response = repair_message(response, llm)
                     history.add_ai_message(response)
 
-                    # --- 优化的核心课程提取逻辑 ---
-                    key_courses = []
-                    if "### 核心课程列表" in response:
-                        content_after_heading = response.split("### 核心课程列表")[1]
-                        matches = re.findall(r"^\s*[-*]\s+(.*)", content_after_heading, re.MULTILINE)
-                        if matches:
-                            key_courses = [course.strip() for course in matches]
-
-                    if key_courses:
-                        st.session_state.key_courses_identified = key_courses
-                    else:
-                        st.session_state.key_courses_identified = None  # 确保失败时状态为空
+                    # --- 核心课程提取: 结构化输出 -> 本地修复/回退 -> 仅针对列表的重试 ---
+                    key_courses = parser.courses or extract_key_courses(response)
+                    if not key_courses:
+                        with st.spinner("正在单独提取核心课程列表..."):
+                            try:
+                                with phase("generation"):
+                                    key_courses = request_key_courses(llm, response)
+                            except Exception:
+                                key_courses = None
+                    st.session_state.key_courses_identified = key_courses or None  # 确保失败时状态为空
+                    remember(key_courses=key_courses or [])
 
             st.session_state.curriculum_stage = 3
-            st.rerun()
+            rerun_turn()
 
     elif stage == 3:
         st.info("学习路径图已生成。现在，AI将为您详细解读其中的核心课程。")
+        if not st.session_state.get('key_courses_identified'):
+            st.warning("未能从上一步中识别出核心课程列表。您可以仅重新提取课程列表，无需重新生成整份学习规划。")
+            if st.button("重新提取核心课程列表", use_container_width=True):
+                last_ai_message = next((m.content for m in reversed(history.messages) if m.type == 'ai'), "")
+                with st.spinner("正在重新提取核心课程列表..."):
+                    try:
+                        with phase("generation"):
+                            key_courses = request_key_courses(llm, last_ai_message)
+                    except Exception as e:
+                        key_courses = None
+                        st.error(f"重新提取失败: {e}")
+                if key_courses:
+                    st.session_state.key_courses_identified = key_courses
+                    rerun_turn()
         if st.button("第二步：生成核心课程教学目的报告", use_container_width=True, type="primary"):
             key_courses = st.session_state.get('key_courses_identified')
             if not key_courses:
-                st.error("未能从上一步中识别出核心课程列表，请返回上一步重试。")
+                st.error("未能从上一步中识别出核心课程列表，请先重新提取核心课程列表。")
                 st.stop()
             history.add_user_message(f"请为我详细解读这些核心课程：{', '.join(key_courses)}")
-            prompt = ChatPromptTemplate.from_template(
-                """
-                核心角色: 你是一位专业的课程教学设计师。
-                任务: 请为以下 **核心专业课程** 生成一份详细的教学目的与要求报告。
-                核心课程列表: **{key_courses_list}**
-                请严格按照以下格式，为列表中的 **每一门** 课程进行阐述:
-                ### 课程名称：[例如：咨询心理学]
-                -   **📖 知识目标**: 学生通过本课程将掌握哪些核心理论、概念和知识体系。
-                -   **🛠️ 能力目标**: 本课程旨在培养学生的哪些具体技能。
-                -   **🌟 素养目标**: 本课程如何帮助学生建立正确的价值观、职业道德或科学精神。
-                你需要结合整个培养方案的上下文来进行推断和阐述。
-                培养方案全文参考: {curriculum_content}
-                """
-            )
-            chain = prompt | llm
+            chain = build_chain(CURRICULUM_COURSES_PROMPT, llm)
             with st.chat_message("ai", avatar="🤖"):
                 with st.spinner("正在生成核心课程的详细教学目的报告..."):
-                    response = st.write_stream(chain.stream({
-                        "key_courses_list": ", ".join(key_courses),
-                        "curriculum_content": st.session_state.curriculum_content
-                    }))
+                    inputs = {"key_courses_list": ", ".join(key_courses),
+                              "curriculum_content": st.session_state.curriculum_content}
+                    response = stream_job(job_key("curriculum_analysis", 3, *inputs.values()),
+                                          lambda: chain.stream(inputs))
                     history.add_ai_message(response)
             st.session_state.curriculum_stage = 4
-            st.rerun()
+            rerun_turn()
 
     elif stage == 4:
         st.success("🎉 专业培养方案解析已全部完成！希望这份详细的学业规划报告能为你的学习之旅点亮一盏明灯。")
@@ -642,13 +1067,27 @@ def main():
     if not llm:
         st.error("无法初始化语言模型，应用程序无法启动。请检查您的 API Key 设置。")
         st.stop()
-    with st.sidebar:
+    with st.sidebar, phase("sidebar"):
         if st.session_state.get("current_mode", "menu") != "menu":
             if st.button("↩️ 返回主菜单"):
+                # 保留 session_id，以便返回後能重新接上仍在背景執行的生成任務；跨模式檔案存在磁碟上，不受影響
+                session_id, profile_uid = st.session_state.session_id, st.session_state.get("profile_uid")
                 st.session_state.clear()
+                st.session_state.session_id = session_id
+                if profile_uid:
+                    st.session_state.profile_uid = profile_uid
                 st.session_state.current_mode = "menu"
                 st.rerun()
         st.markdown("---")
+        render_llm_health(llm)
+        render_budget_notice()
+        render_profile_panel()
+        if PROFILING:
+            render_profiler_panel()
+            render_memory_panel()
+            render_dedup_panel()
+            render_budget_panel()
+            render_diagram_panel()
         st.caption("© 2025 智慧职业辅导 V14.3 (稳定版)")
     modes = {
         "menu": render_menu,
@@ -660,11 +1099,93 @@ def main():
         "curriculum_analysis": render_curriculum_mode,
     }
     mode_func = modes.get(st.session_state.get("current_mode", "menu"), render_menu)
-    if st.session_state.get("current_mode", "menu") == 'menu':
-        mode_func()
-    else:
-        mode_func(llm)
+    with phase("widget_layout"):
+        if st.session_state.get("current_mode", "menu") == 'menu':
+            mode_func()
+        else:
+            mode_func(budgeted_llm(llm))
+
+
+# --- 剖析結果 ---
+STAGE_KEYS = {"exploration": "exploration_stage", "panoramic": "panoramic_stage",
+              "curriculum_analysis": "curriculum_stage"}
+
+
+def record_rerun(scope="app"):
+    mode = st.session_state.get("current_mode", "menu")
+    history = st.session_state.get("chat_history") or {}
+    finish_rerun(st.session_state.setdefault("rerun_profiles", new_recent()), mode=mode, scope=scope,
+                 stage=st.session_state.get(STAGE_KEYS.get(mode, ""), None),
+                 history_messages=sum(len(h.messages) for h in history.values()),
+                 session=st.session_state.get("session_id", "")[:8])
+
+
+def render_dedup_panel():
+    with st.expander("🔁 重复请求合并 (调试)"):
+        stats = get_job_runner().dedup_stats()
+        started = sum(row["started"] for row in stats.values())
+        coalesced = sum(row["coalesced"] for row in stats.values())
+        st.caption(f"模型生成 {started} 次，合并相同请求 {coalesced} 次 (即节省的调用次数)")
+        if stats:
+            st.dataframe([{"模式": mode, "生成": row["started"], "合并": row["coalesced"],
+                           "节省比例": f"{row['saved']:.0%}"} for mode, row in stats.items()], hide_index=True)
+
+
+def render_memory_panel():
+    with st.expander("🧠 会话内存 (调试)"):
+        stats = get_session_spiller().snapshot()
+        resident_col, spilled_col = st.columns(2)
+        resident_col.metric("内存中的会话", stats["resident_sessions"], f"{stats['resident_bytes'] / 1024:.0f} KB",
+                            delta_color="off")
+        spilled_col.metric("已转存到磁盘", stats["spilled_sessions"], f"{stats['spilled_bytes'] / 1024:.0f} KB",
+                           delta_color="off")
+        st.caption(f"转存 {stats['spills']} 次，恢复 {stats['rehydrations']} 次；"
+                   f"报告缓存 {len(get_artifact_store())} 份，{get_artifact_store().content_bytes() / 1024:.0f} KB (所有会话共用)")
+        if stats["by_mode"]:
+            st.dataframe([{"模式": mode, "KB": round(size / 1024, 1)} for mode, size in stats["by_mode"].items()],
+                         hide_index=True)
+
+
+def render_diagram_panel():
+    with st.expander("🧩 图表修复 (调试)"):
+        stats = repair_stats()
+        if not stats["diagrams"]:
+            st.caption("暂无数据，生成一次含图表的回答后显示。")
+        else:
+            rates = stats["rates"]
+            st.caption(f"共 {stats['diagrams']} 张图: 直接可用 {rates['valid']:.0%} · 本地修复 {rates['local']:.0%} · "
+                       f"模型修复 {rates['model']:.0%} · 仍然失败 {rates['failed']:.0%}")
+        if stats["issues"]:
+            st.dataframe([{"问题": kind, "次数": count} for kind, count in stats["issues"].items()], hide_index=True)
+        chains = get_industry_chain_store().stats()
+        hit_rate = f"{chains['hit_rate']:.0%}" if chains["hit_rate"] is not None else "-"
+        st.caption(f"产业链图谱: 查询 {chains['lookups']} 次，命中 {chains['hit']} 次 ({hit_rate})，"
+                   f"未能识别职业 {chains['unresolved']} 次；存档 {chains['entries']}")
+
+
+def render_profiler_panel():
+    with st.expander("🛠️ 页面重新执行耗时 (调试)"):
+        recent = st.session_state.get("rerun_profiles")
+        if not recent:
+            st.caption("暂无数据，进行一次操作后显示。")
+            return
+        last = recent[-1]
+        st.caption(f"上一次: {last['mode']} ({last['scope']}) · 脚本 {last['script_ms']:.0f} ms · 模型 "
+                   f"{last['phases'].get('generation', 0):.0f} ms · 历史消息 {last['history_messages']} 条")
+        st.dataframe([{"阶段": name, "ms": ms} for name, ms in
+                      sorted(last["phases"].items(), key=lambda item: -item[1])], hide_index=True)
+        if latencies := st.session_state.get("exploration_form_latency"):
+            st.caption(f"职业探索: 提交到下一表单出现 {latencies[-1] * 1000:.0f} ms (共 {len(latencies)} 次)")
+        st.markdown("**最近各模式平均 (ms)**")
+        st.dataframe(mode_averages(recent), hide_index=True)
+        st.caption(f"完整记录: {PROFILE_PATH}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        # st.rerun()/st.stop() end the script with an exception; the rerun is still recorded.
+        record_session_memory()
+        if PROFILING:
+            record_rerun()
\ No newline at end of file